@@ -0,0 +1,67 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark embeddings per second for each skill embedder
+
+Backends that cannot be loaded, for example without TensorFlow installed,
+are skipped. Run from the repository root with: python -m benchmarks.embedding
+"""
+
+import random
+import timeit
+
+from lsgraph.services.embedding import EMBEDDERS
+
+WORDS = (
+    "data analysis software engineering python statistics design project "
+    "management communication leadership cloud security machine learning "
+    "writing research testing databases networking marketing finance"
+).split()
+
+
+def skill_paths(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        ", ".join(
+            " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+            for _ in range(rng.randint(1, 4))
+        )
+        for _ in range(count)
+    ]
+
+
+def run(count=10000, batch_size=256):
+    texts = skill_paths(count)
+    batches = [texts[i : i + batch_size] for i in range(0, count, batch_size)]
+    for name, embedder_class in EMBEDDERS.items():
+        try:
+            start = timeit.default_timer()
+            embedder = embedder_class()
+            embedder(texts[:1])
+            load_time = timeit.default_timer() - start
+        except Exception as e:
+            print(f"{name:<28} unavailable ({e.__class__.__name__}: {e})")
+            continue
+        elapsed = min(
+            timeit.repeat(lambda: [embedder(i) for i in batches], number=1, repeat=3)
+        )
+        print(
+            f"{name:<28} load {load_time:8.2f} s"
+            f"   {count / elapsed:12.0f} embeddings/s"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,80 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark loading embeddings stored as float8 arrays and packed float32
+
+Uses the configured database with a temporary table. Run from the
+repository root with: python -m benchmarks.embedding_storage
+"""
+
+import timeit
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from lsgraph import create_app
+from lsgraph.models import db
+from lsgraph.models._shared import Float32Vector
+
+
+def run(count=10000, dimensions=512):
+    app = create_app()
+    vectors = np.random.default_rng(0).standard_normal((count, dimensions))
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        metadata = sa.MetaData()
+        table = sa.Table(
+            "benchmark_embedding",
+            metadata,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("float_array", ARRAY(sa.Float)),
+            sa.Column("float32", Float32Vector),
+            prefixes=["TEMPORARY"],
+        )
+        metadata.create_all(connection)
+        connection.execute(
+            table.insert(),
+            [
+                {"id": i, "float_array": v.tolist(), "float32": v}
+                for i, v in enumerate(vectors)
+            ],
+        )
+        for column, to_array in [
+            ("float_array", lambda rows: [np.array(i) for i, in rows]),
+            ("float32", lambda rows: [i for i, in rows]),
+        ]:
+            query = sa.select(table.c[column])
+            elapsed = min(
+                timeit.repeat(
+                    lambda: to_array(connection.execute(query).all()),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            size = connection.execute(
+                sa.select(sa.func.sum(sa.func.pg_column_size(table.c[column])))
+            ).scalar()
+            print(
+                f"{column:<12} load {elapsed * 1000:8.1f} ms"
+                f"   {size / 2**20:8.1f} MiB stored"
+            )
+        transaction.rollback()
+        connection.close()
+
+
+if __name__ == "__main__":
+    run()
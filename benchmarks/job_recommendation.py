@@ -0,0 +1,134 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark job recommendation for one user against many target profiles
+
+Compares the previous per skill loop with the distance matrix engine
+used by JobRecommendation, and with its top 10 mode. Run from the repository root with:
+python -m benchmarks.job_recommendation
+"""
+
+from collections import namedtuple
+import timeit
+import uuid
+
+import numpy as np
+
+from lsgraph.api_v1.views.users import JobRecommendation
+
+LEVELS = [("Beginner", 1), ("Intermediate", 2), ("Advanced", 3)]
+
+Profile = namedtuple("Profile", ["id", "name", "description", "user_id", "type"])
+ProfileSkill = namedtuple("ProfileSkill", ["profile_id", "skill_id", "level"])
+Skill = namedtuple("Skill", ["id", "skill_embedding"])
+
+
+def loop_learning_speed(rec, embed1, embed2):
+    d = np.linalg.norm(embed1 - embed2)
+    if d > rec.multiplier_threshold:
+        return rec.multiplier_baseline
+    return ((rec.multiplier_offset - d) / rec.multiplier_offset) ** rec.multiplier_power
+
+
+def loop_job_by_distance(rec, skills, source_skills, target_skills):
+    """Per skill loop as previously used by JobRecommendation.job_by_distance"""
+    total_distance = 0
+    profile_sum = 0
+    for t_id, t_level in target_skills.items():
+        profile_sum += t_level
+        s_level = source_skills.get(t_id, 0)
+        if s_level >= t_level:
+            continue
+        all_multipliers = [
+            (loop_learning_speed(rec, skills[t_id], skills[i]), j)
+            for i, j in source_skills.items()
+            if (t_id != i)
+        ]
+        all_multipliers.sort(key=lambda x: x[0], reverse=True)
+        d = t_level - s_level
+        for multiplier, level in all_multipliers[: rec.max_skills]:
+            level_multiplier = min(t_level, level) - min(s_level, level)
+            level_multiplier /= rec.max_skill_gap
+            d -= multiplier * d * level_multiplier
+        total_distance += d
+    fit = 100 * (profile_sum - total_distance) / profile_sum
+    return round(total_distance, 2), round(fit, 2)
+
+
+def build_data(num_profiles=500, num_skills=200, skills_per_profile=20, seed=0):
+    rng = np.random.default_rng(seed)
+    skill_ids = [uuid.uuid4() for _ in range(num_skills)]
+    # Clustered embeddings so that many skills fall within the threshold
+    centres = rng.standard_normal((10, 512))
+    embeddings = centres[rng.integers(0, 10, num_skills)]
+    embeddings += 0.03 * rng.standard_normal((num_skills, 512))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    skills = [Skill(i, j) for i, j in zip(skill_ids, embeddings)]
+    profiles = [
+        Profile(uuid.uuid4(), f"Profile {i}", "", None, "job_profile")
+        for i in range(num_profiles + 1)
+    ]
+    profile_skills = [
+        ProfileSkill(p.id, skill_ids[i], float(rng.integers(1, 4)))
+        for p in profiles
+        for i in rng.choice(num_skills, skills_per_profile, replace=False)
+    ]
+    return profiles[0], profiles[1:], profile_skills, skills
+
+
+def run():
+    source, targets, profile_skills, skills = build_data()
+    embeddings = {i.id: i.skill_embedding for i in skills}
+
+    def loop():
+        rec = JobRecommendation(LEVELS)
+        for i in profile_skills:
+            rec.profile_skills[i.profile_id][i.skill_id] = i.level
+        return [
+            loop_job_by_distance(
+                rec,
+                embeddings,
+                rec.profile_skills[source.id],
+                rec.profile_skills[t.id],
+            )
+            for t in targets
+        ]
+
+    def matrix():
+        rec = JobRecommendation(LEVELS)
+        return rec.multiple_jobs_by_distance(source, targets, profile_skills, skills)
+
+    def top():
+        rec = JobRecommendation(LEVELS)
+        return rec.multiple_jobs_by_distance(
+            source, targets, profile_skills, skills, limit=10
+        )
+
+    expected = dict(zip([t.id for t in targets], loop()))
+    for result in matrix():
+        assert (result["distance"], result["fit"]) == expected[result["profile"]["id"]]
+    assert top() == matrix()[:10]
+    print(f"{len(targets)} target profiles, {len(skills)} skills")
+    for label, f in [
+        ("per skill loop", loop),
+        ("distance matrix", matrix),
+        ("top 10", top),
+    ]:
+        elapsed = min(timeit.repeat(f, number=1, repeat=3))
+        print(f"  {label:<20} {elapsed * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,103 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark descendant collection on wide and deep skill trees
+
+Compares the previous recursive collection with the single pass
+traversal used by SkillTree. Run from the repository root with:
+python -m benchmarks.skill_traversal
+"""
+
+import timeit
+
+from lsgraph.services.skill_tree import SkillTree, collect_descendants
+
+
+def recursive_descendants(children, skill_ids):
+    """Recursive collection as previously used by get_descendant_skills"""
+
+    def collect(skill_id):
+        output = []
+        if skill_id not in children:
+            return output
+        output.extend(children[skill_id])
+        for s_id in children[skill_id]:
+            output.extend(collect(s_id))
+        return output
+
+    return {s_id: collect(s_id) for s_id in skill_ids}
+
+
+def wide_tree(width=10000):
+    return {0: list(range(1, width + 1))}
+
+
+def deep_tree(depth=2000):
+    return {i: [i + 1] for i in range(depth)}
+
+
+def balanced_tree(branching=4, depth=7):
+    children = {}
+    level = [0]
+    next_id = 1
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            children[parent] = list(range(next_id, next_id + branching))
+            next_level.extend(children[parent])
+            next_id += branching
+        level = next_level
+    return children
+
+
+def time_call(f, repeat=3):
+    try:
+        return min(timeit.repeat(f, number=1, repeat=repeat))
+    except RecursionError:
+        return None
+
+
+def run():
+    cases = [
+        ("wide (10k children)", wide_tree()),
+        ("deep (2k levels)", deep_tree()),
+        ("balanced (21k skills, 7 levels)", balanced_tree()),
+    ]
+    for name, children in cases:
+        all_ids = [0] + [i for v in children.values() for i in v]
+        timings = [
+            ("recursive, root only", lambda: recursive_descendants(children, [0])),
+            (
+                "recursive, every skill",
+                lambda: recursive_descendants(children, all_ids),
+            ),
+            ("single pass, root only", lambda: collect_descendants(children, [0])),
+            (
+                "single pass, every skill",
+                lambda: collect_descendants(children, all_ids),
+            ),
+            ("SkillTree build", lambda: SkillTree(0, children)),
+        ]
+        print(name)
+        for label, f in timings:
+            elapsed = time_call(f)
+            if elapsed is None:
+                print(f"  {label:<28} RecursionError")
+            else:
+                print(f"  {label:<28} {elapsed * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,66 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark workforce planning over many employees and target profiles
+
+Compares the greedy pruning with the optimal assignment used by
+WorkforcePlanner on random distance matrices. Run from the repository
+root with:
+python -m benchmarks.workforce_assignment
+"""
+
+import time
+
+import numpy as np
+
+from lsgraph.services.assignment import greedy_pairs, min_cost_assignment
+
+
+def build_distances(num_employees, num_targets, seed=0):
+    """Distances with employee and target effects, rounded like job fits"""
+    rng = np.random.default_rng(seed)
+    distances = rng.random(num_employees)[:, None] * 30
+    distances = distances + rng.random(num_targets) * 30
+    distances += rng.random((num_employees, num_targets)) * 5
+    return np.round(distances, 2)
+
+
+def run(num_employees=10000, num_targets=500):
+    distances = build_distances(num_employees, num_targets)
+    print(f"{num_employees} employees, {num_targets} target profiles")
+    for quantile, number_needed in [(0.05, 30), (0.2, 10), (1, 10), (0.5, 30)]:
+        max_training = np.quantile(distances, quantile)
+        allowed = distances <= max_training
+        needed = np.full(num_targets, number_needed)
+        print(f"  max_training {max_training:.2f}, number_needed {number_needed}")
+        start = time.perf_counter()
+        employees, targets = greedy_pairs(distances, allowed, needed)
+        elapsed = time.perf_counter() - start
+        print(
+            f"    {'greedy':<10} {elapsed * 1000:10.2f} ms {len(employees):10} options"
+        )
+        start = time.perf_counter()
+        assigned = min_cost_assignment(distances, allowed, needed)
+        elapsed = time.perf_counter() - start
+        employees = np.nonzero(assigned >= 0)[0]
+        total = distances[employees, assigned[employees]].sum()
+        print(
+            f"    {'optimal':<10} {elapsed * 1000:10.2f} ms {len(employees):10} "
+            f"assigned, {total:.2f} total distance"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,85 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark the distance matrices used for workforce planning
+
+Compares one multiple_jobs_by_distance call per employee, as previously
+used by workforce_plan, with the batched distance_matrices. Run from
+the repository root with:
+python -m benchmarks.workforce_planning
+"""
+
+import time
+import uuid
+
+import numpy as np
+
+from lsgraph.api_v1.views.users import JobRecommendation
+from benchmarks.job_recommendation import LEVELS, Profile, ProfileSkill, Skill
+
+
+def build_data(
+    num_employees=5000, num_targets=100, num_skills=1000, skills_per_profile=20, seed=0
+):
+    rng = np.random.default_rng(seed)
+    skill_ids = [uuid.uuid4() for _ in range(num_skills)]
+    centres = rng.standard_normal((20, 512))
+    embeddings = centres[rng.integers(0, 20, num_skills)]
+    embeddings += 0.03 * rng.standard_normal((num_skills, 512))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    skills = [Skill(i, j) for i, j in zip(skill_ids, embeddings)]
+    profiles = [
+        Profile(uuid.uuid4(), f"Profile {i}", "", None, "job_profile")
+        for i in range(num_employees + num_targets)
+    ]
+    profile_skills = [
+        ProfileSkill(p.id, skill_ids[i], float(rng.integers(1, 4)))
+        for p in profiles
+        for i in rng.choice(num_skills, skills_per_profile, replace=False)
+    ]
+    return profiles[:num_employees], profiles[num_employees:], profile_skills, skills
+
+
+def run():
+    employees, targets, profile_skills, skills = build_data()
+    print(f"{len(employees)} employees, {len(targets)} target profiles")
+
+    start = time.perf_counter()
+    rec = JobRecommendation(LEVELS)
+    rec.add_profiles(profile_skills, skills)
+    distances, fits = rec.distance_matrices(employees, targets)
+    matrix_time = time.perf_counter() - start
+
+    # The per employee loop is timed on a sample and scaled up
+    sample = employees[:200]
+    start = time.perf_counter()
+    rec = JobRecommendation(LEVELS)
+    target_index = {j.id: i for i, j in enumerate(targets)}
+    for row, employee in enumerate(sample):
+        results = rec.multiple_jobs_by_distance(
+            employee, targets, profile_skills, skills
+        )
+        for result in results:
+            column = target_index[result["profile"]["id"]]
+            assert result["distance"] == distances[row, column]
+            assert result["fit"] == fits[row, column]
+    loop_time = (time.perf_counter() - start) * len(employees) / len(sample)
+
+    print(f"  {'per employee loop':<20} {loop_time:10.2f} s (estimated)")
+    print(f"  {'distance matrices':<20} {matrix_time:10.2f} s")
+
+
+if __name__ == "__main__":
+    run()
@@ -13,8 +13,17 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from celery.signals import worker_process_init
+
 from lsgraph import create_app, ext_celery
+from lsgraph.services.embedding import get_embedder
 
 app = create_app()
 app.app_context().push()
 celery = ext_celery.celery
+
+
+@worker_process_init.connect
+def preload_embedder(**kwargs):
+    """Load the skill embedder before the worker receives tasks"""
+    get_embedder()
@@ -14,13 +14,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from flask import current_app, g, request
+from flask import g, request
 from flask_smorest import abort, Blueprint
 import pdb
 from werkzeug.exceptions import default_exceptions
 
-from lsgraph.utils.access_key import AccessKey
-from lsgraph import models
+from lsgraph.services.credentials import authenticate
 
 api = Blueprint("api_v1", __name__, url_prefix="/api/v1", description="API version 1")
 
@@ -31,21 +30,16 @@ def require_access_headers():
     if request.path in []:
         # List of paths that do not require access headers
         return
-    ak = AccessKey(current_app.config["SECRET_KEY"])
     access_id = request.headers.get("X-API-Key")
     access_secret = request.headers.get("X-Auth-Token")
     if not access_id or not access_secret:
         abort(403)
-    # if not ak.validate_pair(access_id, access_secret):
-    #    abort(403)
-    # Check that credentials exist
-    record = models.AccessKey.query.filter_by(access_key=access_id).all()
-    if not record or record[0].secret_key != access_secret:
+    credentials = authenticate(access_id, access_secret)
+    if credentials is None:
         abort(403)
-    customer = models.Customer.query.filter_by(id=record[0].customer_id).one()
-    g.customer = customer
-    organizations = models.Organization.query.filter_by(customer_id=customer.id).all()
-    g.organizations = {str(i.id): i for i in organizations}
+    g.access_key = access_id
+    g.customer = credentials.customer
+    g.organizations = credentials.organizations
 
 
 from .views import *
@@ -16,7 +16,13 @@
 
 from marshmallow import ValidationError
 
-from .skill import SkillQuerySchema, SkillSchema, SkillManySchema
+from .skill import (
+    SkillQuerySchema,
+    SkillSchema,
+    SkillManySchema,
+    SkillImportNodeSchema,
+    SkillImportSchema,
+)
 from .user import UserSchema, UserManySchema
 from .organization import OrganizationSchema, OrganizationManySchema
 from .profile import (
@@ -30,6 +36,8 @@ from .job_recommendation import (
     JobRecommendationQuerySchema,
     JobRecommendationSchema,
     JobRecommendationManySchema,
+    GroupJobRecommendationSchema,
+    GroupJobRecommendationManySchema,
 )
 from .workforce_planning import (
     WorkforcePlanningTargetSchema,
@@ -40,6 +48,7 @@ from .workforce_planning import (
     WorkforcePlanningUserResultSchema,
     WorkforcePlanningSchema,
 )
+from .job import JobSchema
 from .resource import (
     ResourceQuerySchema,
     NewResourceSchema,
@@ -14,7 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from marshmallow import fields, ValidationError
+from marshmallow import fields, validate, ValidationError
 
 from .shared import OrderedBaseSchema
 from .profile import ProfileSchema
@@ -23,6 +23,11 @@ from .profile import ProfileSchema
 class JobRecommendationQuerySchema(OrderedBaseSchema):
     profiles = fields.List(fields.UUID())
     profile_types = fields.List(fields.String())
+    # Only the limit best profiles with a fit of at least min_fit
+    limit = fields.Integer(validate=validate.Range(min=1))
+    min_fit = fields.Float()
+    # Serve precomputed fits up to max_age seconds old when all are fresh
+    max_age = fields.Integer(validate=validate.Range(min=0))
 
 
 class JobRecommendationSchema(OrderedBaseSchema):
@@ -33,3 +38,12 @@ class JobRecommendationSchema(OrderedBaseSchema):
 
 class JobRecommendationManySchema(OrderedBaseSchema):
     recommendations = fields.List(fields.Nested(lambda: JobRecommendationSchema()))
+
+
+class GroupJobRecommendationSchema(OrderedBaseSchema):
+    user = fields.UUID()
+    recommendations = fields.List(fields.Nested(lambda: JobRecommendationSchema()))
+
+
+class GroupJobRecommendationManySchema(OrderedBaseSchema):
+    users = fields.List(fields.Nested(lambda: GroupJobRecommendationSchema()))
@@ -14,9 +14,9 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from marshmallow import fields, ValidationError
+from marshmallow import fields, validate, ValidationError
 
-from .shared import OrderedBaseSchema
+from .shared import Cursor, OrderedBaseSchema
 from .offering import OfferingSchema
 from .platform import PlatformSchema
 from .provider import ProviderSchema
@@ -26,6 +26,12 @@ class ResourceQuerySchema(OrderedBaseSchema):
     query = fields.String()
     user = fields.UUID()
     skill = fields.UUID()
+    # Resources per page, RESOURCE_PAGE_SIZE by default
+    limit = fields.Integer(validate=validate.Range(min=1, max=1000))
+    # next_cursor of the previous page
+    cursor = Cursor()
+    # Add highlighted matches of the query to search results
+    highlight = fields.Boolean(missing=False)
 
 
 class NewResourceSchema(OrderedBaseSchema):
@@ -59,7 +65,12 @@ class ResourceSchema(OrderedBaseSchema):
     prerequisite_knowledge = fields.String()
     retired = fields.Boolean(missing=False)
     offerings = fields.List(fields.Nested(lambda: OfferingSchema()))
+    # Search results only
+    rank = fields.Float()
+    headline = fields.String()
 
 
 class ResourceManySchema(OrderedBaseSchema):
     resources = fields.List(fields.Nested(lambda: ResourceSchema()))
+    # Cursor of the next page, null on the last page
+    next_cursor = Cursor(allow_none=True)
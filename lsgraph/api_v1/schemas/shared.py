@@ -14,9 +14,34 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from marshmallow import Schema
+import base64
+import binascii
+import json
+
+from marshmallow import fields, Schema, ValidationError
 
 
 class OrderedBaseSchema(Schema):
     class Meta:
         ordered = True
+
+
+class Cursor(fields.Field):
+    """Opaque page cursor holding the sort key of the last item of a page
+
+    Serialized as URL-safe base64 of the JSON list of key values"""
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        text = json.dumps(list(value), default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            output = json.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise ValidationError("Invalid cursor")
+        if not isinstance(output, list):
+            raise ValidationError("Invalid cursor")
+        return output
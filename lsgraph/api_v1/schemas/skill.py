@@ -14,7 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from marshmallow import fields, ValidationError
+from marshmallow import fields, validates_schema, ValidationError
 
 from .shared import OrderedBaseSchema
 from .user import UserSchema
@@ -40,3 +40,26 @@ class SkillSchema(OrderedBaseSchema):
 
 class SkillManySchema(OrderedBaseSchema):
     skills = fields.List(fields.Nested(lambda: SkillSchema))
+
+
+class SkillImportNodeSchema(OrderedBaseSchema):
+    id = fields.UUID(dump_only=True)
+    key = fields.String(required=True)
+    parent = fields.String(missing=None, allow_none=True)
+    name = fields.String(required=True)
+    description = fields.String(missing="")
+
+
+class SkillImportSchema(OrderedBaseSchema):
+    parent = fields.UUID(required=True, load_only=True)
+    graph = fields.Dict(keys=fields.String(), load_only=True)
+    skills = fields.List(fields.Nested(lambda: SkillImportNodeSchema()))
+    count = fields.Integer(dump_only=True)
+
+    @validates_schema
+    def validate_source(self, data, **kwargs):
+        filled = 0
+        filled += 1 if "graph" in data else 0
+        filled += 1 if "skills" in data else 0
+        if filled != 1:
+            raise ValidationError("Nested graph *or* skills list must be set")
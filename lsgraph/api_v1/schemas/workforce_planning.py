@@ -14,7 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from marshmallow import fields, ValidationError
+from marshmallow import fields, validate, ValidationError
 
 from .shared import OrderedBaseSchema
 
@@ -29,6 +29,9 @@ class WorkforcePlanningQuerySchema(OrderedBaseSchema):
     users = fields.List(fields.UUID())
     groups = fields.List(fields.UUID())
     targets = fields.List(fields.Nested(lambda: WorkforcePlanningTargetSchema()))
+    mode = fields.String(
+        validate=validate.OneOf(["optimal", "greedy"]), missing="optimal"
+    )
 
 
 class WorkforcePlanningProfileRecommendationSchema(OrderedBaseSchema):
@@ -22,14 +22,20 @@ from .organizations import (
 )
 
 # from .graphs import GraphsAPI, GraphsDetailAPI
-from .skills import SkillsAPI, SkillsDetailAPI
+from .skills import SkillsAPI, SkillsImportAPI, SkillsDetailAPI
 
 from .resources import ResourcesAPI, ResourcesDetailAPI, ResourceOfferingsAPI
 from .platforms import PlatformsAPI, PlatformsDetailAPI
 from .formats import FormatsAPI, FormatsDetailAPI
 from .providers import ProvidersAPI, ProvidersDetailAPI
 
-from .groups import GroupsAPI, GroupsDetailAPI, GroupMembersAPI, GroupMembersDetailAPI
+from .groups import (
+    GroupsAPI,
+    GroupsDetailAPI,
+    GroupMembersAPI,
+    GroupMembersDetailAPI,
+    GroupJobRecommendationAPI,
+)
 
 from .collections import (
     CollectionsAPI,
@@ -18,14 +18,22 @@ import pdb
 from flask import g
 from flask_smorest import abort
 
+from lsgraph.services.credentials import reload_credentials
+
 
 def authorized_org(f):
     """Checks whether customer is authorized to operate on organization"""
 
     def decorator(*args, **kwargs):
-        if kwargs["org_uuid"] not in g.organizations:
-            pdb.set_trace()
-            abort(401)
+        org_uuid = kwargs["org_uuid"]
+        if org_uuid not in g.organizations:
+            # The organization may have been added by another process
+            # since the credentials were cached
+            credentials = reload_credentials(g.access_key)
+            if credentials is None or org_uuid not in credentials.organizations:
+                abort(401)
+            g.customer = credentials.customer
+            g.organizations = credentials.organizations
         return f(*args, **kwargs)
 
     return decorator
@@ -27,6 +27,13 @@ from lsgraph.api_v1.schemas import (
     CollectionResourcesSchema,
     CollectionMembersSchema,
 )
+from lsgraph.services.resource_access import (
+    add_collection_access,
+    get_collection_users,
+    lock_resource_access,
+    refresh_user_access,
+    remove_collection_access,
+)
 from ._shared import authorized_org
 
 
@@ -77,6 +84,7 @@ def update_resources(resource_data, org_uuid, collection_uuid):
         db.session.add(
             models.CollectionResource(collection_id=collection_uuid, resource_id=i)
         )
+    add_collection_access(org_uuid, collection_uuid, to_add)
     db.session.commit()
     return [{"resource_id": i} for i in to_add]
 
@@ -150,6 +158,7 @@ def update_members(member_data, org_uuid, collection_uuid):
                 )
         db.session.add(m)
         to_return.append(m)
+    refresh_user_access(org_uuid, user_ids, group_ids)
     db.session.commit()
     return [build_member(i) for i in to_return]
 
@@ -203,12 +212,15 @@ class CollectionsDetailAPI(MethodView):
         collection = models.Collection.query.filter_by(
             id=collection_uuid, organization_id=org_uuid
         ).one()
+        lock_resource_access(org_uuid)
+        user_ids = get_collection_users([collection.id])
         # Delete resources
         models.CollectionResource.query.filter_by(collection_id=collection.id).delete()
         # Delete members
         models.CollectionMember.query.filter_by(collection_id=collection.id).delete()
         # Delete collection
         db.session.delete(collection)
+        refresh_user_access(org_uuid, user_ids)
         db.session.commit()
 
 
@@ -258,6 +270,7 @@ class CollectionResourcesDetailAPI(MethodView):
         models.CollectionResource.query.filter_by(
             resource_id=resource_uuid, collection_id=collection.id
         ).delete()
+        remove_collection_access(org_uuid, collection.id, [resource_uuid])
         db.session.commit()
 
 
@@ -310,4 +323,6 @@ class CollectionMembersDetailAPI(MethodView):
                 models.CollectionMember.group_id == member_uuid,
             )
         ).delete()
+        # The member is a user or a group
+        refresh_user_access(org_uuid, [member_uuid], [member_uuid])
         db.session.commit()
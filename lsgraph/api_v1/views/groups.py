@@ -15,7 +15,7 @@
 
 
 from flask.views import MethodView
-from flask import g
+from flask import g, Response, stream_with_context
 from flask_smorest import abort
 from marshmallow import ValidationError
 import pdb
@@ -23,7 +23,19 @@ import pdb
 from lsgraph import models
 from lsgraph.models import db
 from lsgraph.api_v1 import api
-from lsgraph.api_v1.schemas import GroupSchema, GroupManySchema, GroupMembersSchema
+from lsgraph.api_v1.schemas import (
+    GroupSchema,
+    GroupManySchema,
+    GroupMembersSchema,
+    JobRecommendationQuerySchema,
+    GroupJobRecommendationManySchema,
+)
+from lsgraph.api_v1.views.users import group_job_recommendations
+from lsgraph.services.resource_access import (
+    get_group_users,
+    lock_resource_access,
+    refresh_user_access,
+)
 from ._shared import authorized_org
 
 
@@ -74,6 +86,7 @@ def add_members(org_id, group_id, user_ids):
     for user_id in to_add:
         new_member = models.GroupMember(user_id=user_id, group_id=group_id)
         db.session.add(new_member)
+    refresh_user_access(org_id, to_add)
     db.session.commit()
     return to_add
 
@@ -147,10 +160,13 @@ class GroupsDetailAPI(MethodView):
         group = models.Group.query.filter_by(
             organization_id=org_uuid, id=group_uuid
         ).one()
+        lock_resource_access(org_uuid)
+        user_ids = get_group_users([group.id])
         # Delete members
         models.GroupMember.query.filter_by(group_id=group.id).delete()
         # Delete group
         db.session.delete(group)
+        refresh_user_access(org_uuid, user_ids)
         db.session.commit()
 
 
@@ -195,4 +211,21 @@ class GroupMembersDetailAPI(MethodView):
             abort(404, message="Member not found")
         for i in member:
             db.session.delete(i)
+        refresh_user_access(org_uuid, [i.user_id for i in member])
         db.session.commit()
+
+
+@api.route("organizations/<org_uuid>/groups/<group_uuid>/job_recommendations/")
+class GroupJobRecommendationAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.arguments(JobRecommendationQuerySchema, location="json")
+    @api.response(200, GroupJobRecommendationManySchema)
+    def post(self, job_rec, org_uuid, group_uuid):
+        """Get group job recommendations
+
+        Generate job recommendations for every member of the group in one
+        call. Shared data is loaded once and the response is streamed as
+        members are processed"""
+        chunks = group_job_recommendations(job_rec, org_uuid, group_uuid)
+        return Response(stream_with_context(chunks), mimetype="application/json")
@@ -13,11 +13,14 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from celery import chord, shared_task
 from flask.views import MethodView
-from flask import g
+from flask import current_app, g
 from flask_smorest import abort
 from marshmallow import ValidationError
+import numpy as np
 import pdb
+import uuid
 
 from lsgraph import models
 from lsgraph.models import db
@@ -27,14 +30,30 @@ from lsgraph.api_v1.schemas import (
     OrganizationManySchema,
     WorkforcePlanningQuerySchema,
     WorkforcePlanningSchema,
+    JobSchema,
 )
-from lsgraph.api_v1.views.users import JobRecommendation
+from lsgraph.api_v1.views.users import profile_distance_matrices
+from lsgraph.services.assignment import greedy_pairs, min_cost_assignment
+from lsgraph.services.jobs import (
+    advance_job,
+    decompress_result,
+    finish_job,
+    get_job,
+    recording_failure,
+    start_job,
+    submit_job,
+)
+from lsgraph.services.organization import get_skill_data_version
+from lsgraph.services.skill import add_skill_closure
+from lsgraph.services.workforce import load_cached_distances, store_cached_distances
 from ._shared import authorized_org
 
 
 def create_root_skill():
     root = models.Skill(name="Root", description="")
     db.session.add(root)
+    db.session.flush()
+    add_skill_closure(None, root.id)
     db.session.commit()
     return root.id
 
@@ -91,28 +110,36 @@ def get_source_profiles(query_data, org_id):
     return user_profiles
 
 
-def collect_profile_information(query_data, source_profiles, org_id):
-    """Get all needed profile information"""
+def get_target_profiles(query_data, org_id):
+    """Get the target profiles in the order of the query targets"""
     target_profile_ids = [i["profile"] for i in query_data["targets"]]
     target_profiles = (
         models.Profile.query.filter(models.Profile.organization_id == org_id)
         .filter(models.Profile.id.in_(target_profile_ids))
         .all()
     )
-    profile_ids = [i.id for i in target_profiles]
+    profiles = {i.id: i for i in target_profiles}
     # Check that profiles belong to organization
     for i in target_profile_ids:
-        if i not in profile_ids:
+        if i not in profiles:
             abort(403)
-    profile_ids.extend([i.id for i in source_profiles])
-    profile_ids = list(set(profile_ids))
-    profile_skills = models.ProfileSkill.query.filter(
-        models.ProfileSkill.profile_id.in_(profile_ids)
-    ).all()
-    skill_ids = [i.skill_id for i in profile_skills]
-    skill_ids = list(set(skill_ids))
-    skills = models.Skill.query.filter(models.Skill.id.in_(skill_ids)).all()
-    return target_profiles, profile_skills, skills
+    return [profiles[i] for i in target_profile_ids]
+
+
+def cached_workforce_distances(org_id, source_profiles, target_profiles):
+    """Distance and fit matrices, reusing those cached for the skill data version"""
+    version = get_skill_data_version(org_id)
+    source_ids = [i.id for i in source_profiles]
+    target_ids = [i.id for i in target_profiles]
+    cached = load_cached_distances(org_id, version, source_ids, target_ids)
+    if cached is not None:
+        return cached
+    distances, fits = profile_distance_matrices(
+        org_id, source_profiles, target_profiles
+    )
+    store_cached_distances(org_id, version, source_ids, target_ids, distances, fits)
+    db.session.commit()
+    return distances, fits
 
 
 class WorkforcePlanner:
@@ -129,36 +156,25 @@ class WorkforcePlanner:
     def add_target(self, target):
         self.targets.append(target)
 
-    def plan(self, job_rec):
-        """Plan best target profiles for each employee"""
-        distances = []
-        employee_options = [0 for _ in range(len(self.employees))]
-        target_options = [0 for _ in range(len(self.targets))]
-        # Get distances
-        distance_lookup = {}
-        fit_lookup = {}
-        for e_idx, e in enumerate(self.employees):
-            distance_lookup[e] = {i["profile"]["id"]: i["distance"] for i in job_rec[e]}
-            fit_lookup[e.user_id] = {i["profile"]["id"]: i["fit"] for i in job_rec[e]}
-
-            for t_idx, t in enumerate(self.targets):
-                d = distance_lookup[e][t["profile"]]
-                if d > t["max_training"]:
-                    continue
-                distances.append((e_idx, t_idx, d))
-                employee_options[e_idx] += 1
-                target_options[t_idx] += 1
-        distances.sort(key=lambda x: x[2], reverse=True)
-        # Prune connections
-        preserved_distances = []
-        for d in distances:
-            if (employee_options[d[0]] > len(self.targets)) and (
-                target_options[d[1]] > self.targets[d[1]]["number_needed"]
-            ):
-                employee_options[d[0]] -= 1
-                target_options[d[1]] -= 1
-                continue
-            preserved_distances.append(d)
+    def plan(self, distances, fits, mode="optimal"):
+        """Plan best target profiles for each employee
+
+        distances and fits are (employees, targets) matrices. The optimal
+        mode assigns each employee to at most one target, filling as many
+        of the needed places as possible with the least total training
+        distance. The greedy mode keeps every option not pruned by
+        greedy_pairs."""
+        max_training = np.array([i["max_training"] for i in self.targets], dtype=float)
+        number_needed = np.array([i["number_needed"] for i in self.targets])
+        allowed = distances <= max_training
+        if mode == "greedy":
+            e_idx, t_idx = greedy_pairs(distances, allowed, number_needed)
+        else:
+            assigned = min_cost_assignment(distances, allowed, number_needed)
+            e_idx = np.nonzero(assigned >= 0)[0]
+            t_idx = assigned[e_idx]
+        pair_distances = distances[e_idx, t_idx]
+        pair_fits = fits[e_idx, t_idx]
         # Build results
         employee_targets = {
             i.user_id: {"user": i.user_id, "recommendations": []}
@@ -168,47 +184,184 @@ class WorkforcePlanner:
             i["profile"]: {"profile": i["profile"], "recommendations": []}
             for i in self.targets
         }
-        for e_idx, t_idx, d in preserved_distances:
-            e_id = self.employees[e_idx].user_id
-            t_id = self.targets[t_idx]["profile"]
+        for i in np.lexsort((pair_distances, e_idx)):
+            e_id = self.employees[e_idx[i]].user_id
             employee_targets[e_id]["recommendations"].append(
-                {"profile": t_id, "distance": d, "fit": fit_lookup[e_id][t_id]}
+                {
+                    "profile": self.targets[t_idx[i]]["profile"],
+                    "distance": float(pair_distances[i]),
+                    "fit": float(pair_fits[i]),
+                }
             )
+        for i in np.lexsort((pair_distances, t_idx)):
+            t_id = self.targets[t_idx[i]]["profile"]
             target_employees[t_id]["recommendations"].append(
-                {"user": e_id, "distance": d, "fit": fit_lookup[e_id][t_id]}
+                {
+                    "user": self.employees[e_idx[i]].user_id,
+                    "distance": float(pair_distances[i]),
+                    "fit": float(pair_fits[i]),
+                }
             )
-        for i in employee_targets:
-            employee_targets[i]["recommendations"].sort(key=lambda x: x["distance"])
-        for i in target_employees:
-            target_employees[i]["recommendations"].sort(key=lambda x: x["distance"])
         return {
             "targets_by_user": employee_targets.values(),
             "users_by_target": target_employees.values(),
         }
 
 
+def plan_workforce(source_profiles, targets, distances, fits, mode):
+    """Assign source profiles to targets from their distance matrices"""
+    workforce_planner = WorkforcePlanner()
+    for source in source_profiles:
+        workforce_planner.add_employee(source)
+    for target in targets:
+        workforce_planner.add_target(target)
+    return workforce_planner.plan(distances, fits, mode)
+
+
 def workforce_plan(query_data, org_id):
     """Create a workforce reskilling plan"""
     source_profiles = get_source_profiles(query_data, org_id)
-    profiles, profile_skills, skills = collect_profile_information(
-        query_data, source_profiles, org_id
+    target_profiles = get_target_profiles(query_data, org_id)
+    distances, fits = cached_workforce_distances(
+        org_id, source_profiles, target_profiles
     )
-    levels = models.Level.query.filter_by(organization_id=org_id).all()
-    levels = [(i.name, i.cutoff) for i in levels]
-    levels.sort(key=lambda x: x[1])
-    recommendation = JobRecommendation(levels)
-    results = {}
-    for source in source_profiles:
-        results[source] = recommendation.multiple_jobs_by_distance(
-            source, profiles, profile_skills, skills
+    return plan_workforce(
+        source_profiles, query_data["targets"], distances, fits, query_data["mode"]
+    )
+
+
+def workforce_replan(query_data, org_id):
+    """Re-run the assignment of a workforce plan with new target constraints
+
+    Only the cached distance matrices of an earlier plan for the same
+    source population and target profiles are used, so the plan is
+    rejected once the skill data has changed since."""
+    source_profiles = get_source_profiles(query_data, org_id)
+    target_profiles = get_target_profiles(query_data, org_id)
+    cached = load_cached_distances(
+        org_id,
+        get_skill_data_version(org_id),
+        [i.id for i in source_profiles],
+        [i.id for i in target_profiles],
+    )
+    if cached is None:
+        abort(409, message="No current distances cached, create a workforce plan")
+    distances, fits = cached
+    return plan_workforce(
+        source_profiles, query_data["targets"], distances, fits, query_data["mode"]
+    )
+
+
+def get_profiles(profile_ids):
+    """Get profiles in the order of profile_ids"""
+    profile_ids = [uuid.UUID(i) for i in profile_ids]
+    profiles = models.Profile.query.filter(models.Profile.id.in_(profile_ids)).all()
+    profiles = {i.id: i for i in profiles}
+    return [profiles[i] for i in profile_ids]
+
+
+@shared_task
+def workforce_distances_chunk(job_id, org_id, source_ids, target_ids, share):
+    """Distance and fit matrices for one chunk of a workforce plan job"""
+    with recording_failure(job_id):
+        start_job(job_id)
+        distances, fits = profile_distance_matrices(
+            org_id, get_profiles(source_ids), get_profiles(target_ids)
         )
-    workforce_planner = WorkforcePlanner()
-    for source in source_profiles:
-        workforce_planner.add_employee(source)
-    for target in query_data["targets"]:
-        workforce_planner.add_target(target)
-    output_plan = workforce_planner.plan(results)
-    return output_plan
+        advance_job(job_id, share)
+    return {"distances": distances.tolist(), "fits": fits.tolist()}
+
+
+@shared_task
+def workforce_plan_chunks(chunks, job_id, org_id, source_ids, targets, mode, version):
+    """Merge chunked distance matrices and store the assignment as the result
+
+    The merged matrices are cached for the skill data version the job was
+    submitted with. Without chunks the cached matrices are used."""
+    with recording_failure(job_id):
+        start_job(job_id)
+        for target in targets:
+            target["profile"] = uuid.UUID(target["profile"])
+        source_profiles = get_profiles(source_ids)
+        target_ids = [i["profile"] for i in targets]
+        cached = None
+        if chunks is None:
+            cached = load_cached_distances(org_id, version, source_ids, target_ids)
+        if cached is not None:
+            distances, fits = cached
+        elif chunks is None:
+            # Evicted or stale since submission
+            distances, fits = cached_workforce_distances(
+                org_id, source_profiles, get_profiles(target_ids)
+            )
+        else:
+            empty = np.zeros((0, len(targets)))
+            distances = np.concatenate(
+                [empty] + [np.array(i["distances"]) for i in chunks]
+            )
+            fits = np.concatenate([empty] + [np.array(i["fits"]) for i in chunks])
+            store_cached_distances(
+                org_id, version, source_ids, target_ids, distances, fits
+            )
+        plan = plan_workforce(source_profiles, targets, distances, fits, mode)
+        finish_job(job_id, WorkforcePlanningSchema().dump(plan))
+
+
+def submit_workforce_plan(query_data, org_id):
+    """Queue a workforce plan job split into chunks of source profiles
+
+    Each chunk's distance matrices are computed by a separate task and a
+    chord merges them for the assignment step, which runs alone when the
+    distances are already cached. A recent job with the same query is
+    returned instead of queueing the plan again, a job whose tasks cannot
+    be queued is marked as failed."""
+    parameters = WorkforcePlanningQuerySchema().dump(query_data)
+    # Profiles are checked before a job is created, so that a rejected
+    # query does not leave a pending job behind
+    source_profiles = get_source_profiles(query_data, org_id)
+    target_profiles = get_target_profiles(query_data, org_id)
+    job, created = submit_job(org_id, "workforce_planning", parameters)
+    if not created:
+        return job
+    source_ids = [str(i.id) for i in source_profiles]
+    target_ids = [str(i.id) for i in target_profiles]
+    with recording_failure(job.id):
+        version = get_skill_data_version(org_id)
+        body = workforce_plan_chunks.s(
+            str(job.id),
+            str(org_id),
+            source_ids,
+            parameters["targets"],
+            query_data["mode"],
+            version,
+        )
+        if load_cached_distances(org_id, version, source_ids, target_ids) is not None:
+            body.apply_async(args=(None,))
+            return job
+        chunk_size = current_app.config["WORKFORCE_PLANNING_CHUNK_SIZE"]
+        chunks = [
+            source_ids[i : i + chunk_size]
+            for i in range(0, len(source_ids), chunk_size)
+        ]
+        # The assignment step takes the share of the progress left over
+        share = 1 / (len(chunks) + 1)
+        header = [
+            workforce_distances_chunk.s(str(job.id), str(org_id), i, target_ids, share)
+            for i in chunks
+        ]
+        if header:
+            chord(header)(body)
+        else:
+            body.apply_async(args=([],))
+    return job
+
+
+def get_workforce_plan_job(job_id, org_id):
+    """Get a workforce plan job of the organization"""
+    job = get_job(job_id, org_id, "workforce_planning")
+    if job is None:
+        abort(404)
+    return job
 
 
 @api.route("organizations/")
@@ -268,6 +421,67 @@ class WorkforcePlanningAPI(MethodView):
         """Workforce plan
 
         Create a workforce plan optimizing job recommendations
-        across the organization"""
+        across the organization. Submit plans for large groups as a
+        workforce planning job instead"""
         plan = workforce_plan(workforce_planning, org_uuid)
         return plan
+
+
+@api.route("organizations/<org_uuid>/workforce_planning/replan/")
+class WorkforceReplanningAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.arguments(WorkforcePlanningQuerySchema, location="json")
+    @api.response(200, WorkforcePlanningSchema)
+    def post(self, workforce_planning, org_uuid):
+        """Workforce re-plan
+
+        Re-plan with new number_needed or max_training constraints for
+        the same users or groups and target profiles as an earlier
+        workforce plan. Only the assignment step is rerun on the cached
+        distances, which are discarded whenever profile skills or skill
+        embeddings change. Returns 409 when no current distances are
+        cached"""
+        return workforce_replan(workforce_planning, org_uuid)
+
+
+@api.route("organizations/<org_uuid>/workforce_planning/jobs/")
+class WorkforcePlanningJobsAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.arguments(WorkforcePlanningQuerySchema, location="json")
+    @api.response(202, JobSchema)
+    def post(self, workforce_planning, org_uuid):
+        """Submit workforce plan job
+
+        Queue a workforce plan for large groups. Distances are computed
+        in chunks of source profiles across Celery workers, poll the job
+        for its status and progress and fetch the plan from its result
+        once it has succeeded. Submitting the same query again returns
+        the recent job rather than queueing a new one"""
+        return submit_workforce_plan(workforce_planning, org_uuid)
+
+
+@api.route("organizations/<org_uuid>/workforce_planning/jobs/<job_uuid>/")
+class WorkforcePlanningJobAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.response(200, JobSchema)
+    def get(self, org_uuid, job_uuid):
+        """Get workforce plan job status"""
+        return get_workforce_plan_job(job_uuid, org_uuid)
+
+
+@api.route("organizations/<org_uuid>/workforce_planning/jobs/<job_uuid>/result/")
+class WorkforcePlanningJobResultAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.response(200, WorkforcePlanningSchema)
+    def get(self, org_uuid, job_uuid):
+        """Get workforce plan job result
+
+        Get the plan of a job that has succeeded"""
+        job = get_workforce_plan_job(job_uuid, org_uuid)
+        if job.status != "success":
+            abort(409, message=f"Workforce plan job is {job.status}")
+        return decompress_result(job.result)
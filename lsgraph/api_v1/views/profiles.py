@@ -14,7 +14,6 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from collections import defaultdict
 from flask.views import MethodView
 from flask import g
 from flask_smorest import abort
@@ -26,6 +25,12 @@ from lsgraph.models import db
 from lsgraph.api_v1 import api
 from lsgraph.api_v1.schemas import ProfileSchema, ProfileManySchema, ProfileSkillsSchema
 from lsgraph.api_v1.views.skills import get_root_id
+from lsgraph.services.job_recommendation_fit import (
+    delete_profile_fits,
+    mark_profiles_stale,
+)
+from lsgraph.services.organization import bump_skill_data_version
+from lsgraph.services.profile_matrix import get_profile_matrix
 from ._shared import authorized_org
 
 
@@ -49,7 +54,9 @@ def get_level_name(levels, val):
 
 
 def build_output(profile, skills, levels):
-    """Convert output to dict"""
+    """Convert output to dict
+
+    skills maps skill IDs to levels"""
     output = {
         "id": profile.id,
         "name": profile.name,
@@ -60,11 +67,11 @@ def build_output(profile, skills, levels):
     }
     output["skills"] = [
         {
-            "skill": i.skill_id,
-            "level_name": get_level_name(levels, i.level),
-            "level": i.level,
+            "skill": skill_id,
+            "level_name": get_level_name(levels, level),
+            "level": level,
         }
-        for i in skills
+        for skill_id, level in skills.items()
     ]
     return output
 
@@ -73,9 +80,9 @@ def get_profile(org_uuid, profile_uuid):
     """Get detailed information on one profile"""
     levels = get_levels(org_uuid)
     profile = models.Profile.query.filter_by(
-        organization_uuid=org_uuid, id=profile_uuid
+        organization_id=org_uuid, id=profile_uuid
     ).one()
-    skills = models.ProfileSkill.query.filter_by(profile_uuid=profile.id).all()
+    skills = get_profile_matrix(org_uuid).skills(profile.id)
     return build_output(profile, skills, levels)
 
 
@@ -97,13 +104,8 @@ def get_profiles(org_uuid, types=None, user=False):
     else:
         profiles_query = profiles_query.filter(models.Profile.user_id.is_(None))
     profiles = profiles_query.all()
-    skills = models.ProfileSkill.query.filter(
-        models.ProfileSkill.profile_id.in_([i.id for i in profiles])
-    ).all()
-    grouped_skills = defaultdict(list)
-    for i in skills:
-        grouped_skills[i.profile_id].append(i)
-    return [build_output(p, grouped_skills[p.id], levels) for p in profiles]
+    matrix = get_profile_matrix(org_uuid)
+    return [build_output(p, matrix.skills(p.id), levels) for p in profiles]
 
 
 def create_new_profile(org_uuid, profile_data):
@@ -166,6 +168,8 @@ def add_skills(org_id, profile_id, skill_map):
         )
         db.session.add(new_profile_skill)
         new_profile_skills.append(new_profile_skill)
+    bump_skill_data_version([org_id])
+    mark_profiles_stale([profile_id])
     db.session.commit()
     output = [
         {
@@ -222,8 +226,10 @@ class ProfilesDetailAPI(MethodView):
         ).one()
         # Delete skills
         models.ProfileSkill.query.filter_by(profile_id=profile.id).delete()
+        delete_profile_fits([profile.id])
         # Delete profile
         db.session.delete(profile)
+        bump_skill_data_version([org_uuid])
         db.session.commit()
 
 
@@ -271,4 +277,6 @@ class ProfileSkillsDetailAPI(MethodView):
             abort(404, message="Skill not found")
         for i in skill:
             db.session.delete(i)
+        bump_skill_data_version([org_uuid])
+        mark_profiles_stale([profile_uuid])
         db.session.commit()
@@ -15,11 +15,12 @@
 
 from collections import defaultdict
 from flask.views import MethodView
-from flask import g
+from flask import current_app, g
 from flask_smorest import abort
 from marshmallow import ValidationError
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, cast, func, REAL, tuple_
 import pdb
+import uuid
 
 from lsgraph import models
 from lsgraph.models import db
@@ -222,28 +223,145 @@ def apply_user_to_query(db_query, query_data, org_uuid):
             != 1
         ):
             abort(403)
+        access = models.UserResourceAccess
         return db_query.filter(
-            or_(
-                models.CollectionMember.user_id == user_id,
-                and_(
-                    models.GroupMember.user_id == user_id,
-                    models.GroupMember.group_id == models.CollectionMember.group_id,
-                ),
-            ),
-            models.CollectionMember.collection_id
-            == models.CollectionResource.collection_id,
-            models.CollectionResource.resource_id == models.Resource.id,
+            access.resource_id == models.Resource.id, access.user_id == user_id
         )
     return db_query.filter_by(organization_id=org_uuid)
 
 
+def search_query(query_data):
+    """Text search query of a web search style query string"""
+    return func.websearch_to_tsquery("english", query_data["query"])
+
+
 def apply_search_to_query(db_query, query_data, org_uuid):
     if "query" in query_data:
-        query = query_data["query"]
-        return db_query.filter(models.Resource.__ts_vector__.match(query))
+        return db_query.filter(
+            models.Resource.__ts_vector__.op("@@")(search_query(query_data))
+        )
     return db_query
 
 
+def search_rank(query_data):
+    """Rank of resources for the search query
+
+    Matches are weighted by field, name above short description above
+    description"""
+    return func.ts_rank_cd(models.Resource.__ts_vector__, search_query(query_data))
+
+
+def parse_cursor(cursor, kind):
+    """Get the sort value and resource ID of a cursor
+
+    Cursors are [kind, value, resource ID] where kind names the ordering
+    they were made for, "name" or "rank". Cursors of the other ordering
+    or with values of the wrong type are rejected."""
+    if len(cursor) != 3 or cursor[0] != kind:
+        abort(422, message="Invalid cursor")
+    _, value, resource_id = cursor
+    if kind == "rank":
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        valid = value is None or isinstance(value, str)
+    if not valid or not isinstance(resource_id, str):
+        abort(422, message="Invalid cursor")
+    try:
+        return value, uuid.UUID(resource_id)
+    except ValueError:
+        abort(422, message="Invalid cursor")
+
+
+def apply_page_to_query(db_query, cursor, limit):
+    """Order by (name, id) and keep the limit resources after cursor
+
+    Resources without a name come last"""
+    resource = models.Resource
+    if cursor is not None:
+        name, resource_id = parse_cursor(cursor, "name")
+        if name is None:
+            db_query = db_query.filter(
+                resource.name.is_(None), resource.id > resource_id
+            )
+        else:
+            db_query = db_query.filter(
+                or_(
+                    tuple_(resource.name, resource.id) > tuple_(name, resource_id),
+                    resource.name.is_(None),
+                )
+            )
+    order = (resource.name.asc().nullslast(), resource.id)
+    return db_query.order_by(*order).limit(limit)
+
+
+def apply_rank_page_to_query(db_query, cursor, limit, rank):
+    """Order by descending rank then id and keep the limit resources after
+    cursor
+
+    Rows are (resource, rank)"""
+    resource = models.Resource
+    if cursor is not None:
+        cursor_rank, resource_id = parse_cursor(cursor, "rank")
+        # Ranks are real, compared at that precision
+        cursor_rank = cast(float(cursor_rank), REAL)
+        db_query = db_query.filter(
+            or_(
+                rank < cursor_rank,
+                and_(rank == cursor_rank, resource.id > resource_id),
+            )
+        )
+    db_query = db_query.add_columns(rank)
+    return db_query.order_by(rank.desc(), resource.id).limit(limit)
+
+
+def get_headlines(query_data, resource_ids):
+    """Search query matches highlighted in the text of resources"""
+    resource = models.Resource
+    text = func.concat_ws(
+        " ", resource.name, resource.short_description, resource.description
+    )
+    rows = (
+        db.session.query(
+            resource.id, func.ts_headline("english", text, search_query(query_data))
+        )
+        .filter(resource.id.in_(resource_ids))
+        .all()
+    )
+    return dict(rows)
+
+
+def get_resource_page(db_query, query_data, org_uuid):
+    """Get a page of resources and the cursor of the next page
+
+    Searches are ordered by rank, other listings by name"""
+    limit = query_data.get("limit", current_app.config["RESOURCE_PAGE_SIZE"])
+    cursor = query_data.get("cursor")
+    # One more resource than the page shows whether a next page exists
+    if "query" in query_data:
+        rank = search_rank(query_data)
+        rows = apply_rank_page_to_query(db_query, cursor, limit + 1, rank).all()
+        resources = [i for i, _ in rows]
+        ranks = [i for _, i in rows]
+    else:
+        resources = apply_page_to_query(db_query, cursor, limit + 1).all()
+    next_cursor = None
+    if len(resources) > limit:
+        resources = resources[:limit]
+        if "query" in query_data:
+            next_cursor = ["rank", ranks[limit - 1], resources[-1].id]
+        else:
+            next_cursor = ["name", resources[-1].name, resources[-1].id]
+    output = get_resources(org_uuid, resources)
+    if "query" in query_data:
+        for resource, resource_rank in zip(output, ranks):
+            resource["rank"] = resource_rank
+        if query_data["highlight"]:
+            headlines = get_headlines(query_data, [i.id for i in resources])
+            for resource in output:
+                resource["headline"] = headlines[resource["id"]]
+    return {"resources": output, "next_cursor": next_cursor}
+
+
 @api.route("organizations/<org_uuid>/resources/")
 class ResourcesAPI(MethodView):
     decorators = [authorized_org]
@@ -253,15 +371,16 @@ class ResourcesAPI(MethodView):
     def get(self, query_data, org_uuid):
         """Get resources
 
-        Get a list of all resources for an organization
+        Get a page of the resources of an organization ordered by name, or
+        by rank when searching with query. Pass next_cursor of a page as
+        cursor to get the following page. With highlight, search results
+        include a headline with the matches highlighted.
 
         """
         resources = models.Resource.query
         resources = apply_user_to_query(resources, query_data, org_uuid)
         resources = apply_search_to_query(resources, query_data, org_uuid)
-        resources = resources.all()
-        resources = get_resources(org_uuid, resources)
-        return {"resources": resources}
+        return get_resource_page(resources, query_data, org_uuid)
 
     @api.arguments(NewResourceSchema, location="json")
     @api.response(200, ResourceSchema)
@@ -15,21 +15,32 @@
 
 from collections import defaultdict
 from flask.views import MethodView
-from flask import g
+from flask import current_app, g
 from flask_smorest import abort
 from marshmallow import ValidationError
 import pdb
+import uuid
 
 from lsgraph import models
 from lsgraph.models import db
 from lsgraph.services.skill import (
+    count_descendant_skills,
+    get_child_skills,
     get_descendant_skills,
     get_ancestor_skills,
     get_root_id,
-    skill_embedding,
+    add_skill_closure,
+    bulk_add_skill_closure,
+    embed_pending_skills,
 )
+from lsgraph.services.skill_tree import euler_tour, skill_tree_cache
 from lsgraph.api_v1 import api
-from lsgraph.api_v1.schemas import SkillQuerySchema, SkillSchema, SkillManySchema
+from lsgraph.api_v1.schemas import (
+    SkillQuerySchema,
+    SkillSchema,
+    SkillManySchema,
+    SkillImportSchema,
+)
 from ._shared import authorized_org
 
 
@@ -54,18 +65,107 @@ def create_new_skill(skill_data):
         creator_id=creator_id,
     )
     db.session.add(new_skill)
-    db.session.commit()
+    db.session.flush()
     db.session.add(
         models.SkillInclude(child_id=new_skill.id, parent_id=skill_data["parent"])
     )
+    add_skill_closure(skill_data["parent"], new_skill.id)
     db.session.commit()
-    skill_embedding.delay(new_skill.id)
+    # Delayed so that skills created close together share one batch
+    embed_pending_skills.apply_async(
+        countdown=current_app.config["SKILL_EMBEDDING_COUNTDOWN"]
+    )
     return new_skill
 
 
+def flatten_skill_graph(graph):
+    """Convert a nested {name: {child name: {...}}} graph to import nodes
+
+    Each node is keyed by the "|" separated names leading to it"""
+    nodes = []
+    stack = [(None, name, children) for name, children in reversed(graph.items())]
+    while stack:
+        parent_key, name, children = stack.pop()
+        key = name if parent_key is None else f"{parent_key}|{name}"
+        nodes.append(
+            {"key": key, "parent": parent_key, "name": name, "description": ""}
+        )
+        if not children:
+            continue
+        if not isinstance(children, dict):
+            abort(403, message=f"Unrecognized skill graph entry: {key}")
+        stack.extend((key, n, c) for n, c in reversed(children.items()))
+    return nodes
+
+
+def import_skill_graph(import_data, org_uuid):
+    """Add a whole skill graph below an existing skill in one transaction"""
+    parent_id = import_data["parent"]
+    root_skill_id = g.organizations[org_uuid].root_skill_id
+    if (parent_id != root_skill_id) and get_root_id(parent_id).get(
+        parent_id, False
+    ) != root_skill_id:
+        abort(403, message="Skill is not valid for organization")
+    if "graph" in import_data:
+        nodes = flatten_skill_graph(import_data["graph"])
+    else:
+        nodes = import_data["skills"]
+    # Order skills so that parents come before their children
+    by_key = {}
+    children = defaultdict(list)
+    roots = []
+    for node in nodes:
+        if node["key"] in by_key:
+            abort(403, message=f"Duplicate skill key: {node['key']}")
+        by_key[node["key"]] = node
+    for node in nodes:
+        if node["parent"] is None:
+            roots.append(node["key"])
+        elif node["parent"] in by_key:
+            children[node["parent"]].append(node["key"])
+        else:
+            abort(403, message=f"Unrecognized parent skill: {node['parent']}")
+    keys, _, parent_positions, _, _ = euler_tour(children, roots)
+    if len(keys) != len(nodes):
+        abort(403, message="Skill graph contains a cycle")
+    skill_ids = [uuid.uuid4() for _ in keys]
+    skill_rows = []
+    include_rows = []
+    for key, skill_id, parent_position in zip(keys, skill_ids, parent_positions):
+        node = by_key[key]
+        node["id"] = skill_id
+        skill_rows.append(
+            {
+                "id": skill_id,
+                "name": node["name"],
+                "description": node["description"],
+                "personal": False,
+            }
+        )
+        include_rows.append(
+            {
+                "parent_id": (
+                    skill_ids[parent_position] if parent_position >= 0 else parent_id
+                ),
+                "child_id": skill_id,
+            }
+        )
+    if skill_rows:
+        db.session.execute(models.Skill.__table__.insert(), skill_rows)
+        db.session.execute(models.SkillInclude.__table__.insert(), include_rows)
+        bulk_add_skill_closure(parent_id, skill_ids, parent_positions)
+    db.session.commit()
+    skill_tree_cache.invalidate_skills([parent_id])
+    batch_size = current_app.config["SKILL_EMBEDDING_BATCH_SIZE"]
+    for i in range(0, len(skill_ids), batch_size):
+        embed_pending_skills.delay([str(j) for j in skill_ids[i : i + batch_size]])
+    return {"count": len(skill_ids), "skills": [by_key[i] for i in keys]}
+
+
 def get_skill_details(skill_ids):
     """Get path, parent, child skills and number of descendants"""
-    descendants, children = get_descendant_skills(skill_ids)
+    children = get_child_skills(skill_ids)
+    num_descendants = count_descendant_skills(skill_ids)
     ancestors = get_ancestor_skills(skill_ids)
     # Get skill details
     to_lookup = skill_ids[:]
@@ -91,9 +191,9 @@ def get_skill_details(skill_ids):
         output[i]["path"] = "|".join([skills[j].name for j in reversed(ancestors[i])])
         output[i]["parent"] = ancestors[i][0] if ancestors[i] else None
         output[i]["child_skills"] = [
-            {"id": skills[j].id, "name": skills[j].name} for j in children.get(i, [])
+            {"id": skills[j].id, "name": skills[j].name} for j in children[i]
         ]
-        output[i]["num_descendants"] = len(descendants[i])
+        output[i]["num_descendants"] = num_descendants[i]
     return output
 
 
@@ -145,6 +245,20 @@ class SkillsAPI(MethodView):
         return new_skill
 
 
+@api.route("organizations/<org_uuid>/skills/import/")
+class SkillsImportAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.arguments(SkillImportSchema, location="json")
+    @api.response(200, SkillImportSchema)
+    def post(self, import_data, org_uuid):
+        """Import a skill graph
+
+        Add a nested skill graph, or a flat list of skills with parent
+        keys, below an existing skill of the organization"""
+        return import_skill_graph(import_data, org_uuid)
+
+
 @api.route("organizations/<org_uuid>/skills/<skill_uuid>/")
 class SkillsDetailAPI(MethodView):
     decorators = [authorized_org]
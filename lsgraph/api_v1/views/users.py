@@ -14,8 +14,11 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from collections import defaultdict
+from datetime import datetime
+import json
+from celery import shared_task
 from flask.views import MethodView
-from flask import g
+from flask import current_app, g
 from flask_smorest import abort
 from marshmallow import ValidationError
 import numpy as np
@@ -25,12 +28,40 @@ from lsgraph import models
 from lsgraph.models import db
 from lsgraph.api_v1 import api
 from lsgraph.api_v1.schemas import (
+    ProfileSchema,
     UserSchema,
     UserManySchema,
     JobRecommendationQuerySchema,
     JobRecommendationManySchema,
+    JobSchema,
+)
+from lsgraph.api_v1.views.profiles import get_level_name, get_levels
+from lsgraph.services.jobs import (
+    decompress_result,
+    finish_job,
+    get_job,
+    recording_failure,
+    start_job,
+    submit_job,
+)
+from lsgraph.services.job_recommendation_fit import (
+    delete_other_fits,
+    get_fit_profiles,
+    get_fresh_fits,
+    get_stale_fits,
+    store_fits,
+)
+from lsgraph.services.embedding_store import get_embedding_store
+from lsgraph.services.profile_matrix import get_profile_matrix
+from lsgraph.services.resource_access import refresh_user_access
+from lsgraph.services.skill import get_skill_neighbors, get_truncated_skills
+from lsgraph.services.job_recommendation import (
+    embedding_matrix,
+    learning_multipliers,
+    pairwise_distances,
+    reduce_gaps,
+    top_k_positions,
 )
-from lsgraph.api_v1.views.profiles import get_level_name
 from ._shared import authorized_org
 
 
@@ -58,6 +89,7 @@ def create_new_user(user_data, org_uuid):
     for group in whole_org_group:
         new_member = models.GroupMember(user_id=new_user.id, group_id=group.id)
         db.session.add(new_member)
+    refresh_user_access(org_uuid, [new_user.id])
     db.session.commit()
     output = {
         "id": new_user.id,
@@ -68,26 +100,20 @@ def create_new_user(user_data, org_uuid):
     return output
 
 
-def collect_profile_information(job_rec, org_uuid, user_uuid):
-    """Collect information needed for job recommendation"""
+def get_target_profiles(job_rec, org_uuid):
+    """Get the target profiles of a job recommendation"""
+    query = models.Profile.query.filter_by(organization_id=org_uuid)
+    if job_rec.get("profiles"):
+        return query.filter(models.Profile.id.in_(job_rec["profiles"])).all()
+    return query.filter(models.Profile.type.in_(job_rec["profile_types"])).all()
+
+
+def get_recommendation_profiles(job_rec, org_uuid, user_uuid):
+    """Get the user profile and the target profiles of a job recommendation"""
     user_profile = models.Profile.query.filter_by(
         organization_id=org_uuid, user_id=user_uuid
     ).one()
-    query = models.Profile.query.filter_by(organization_id=org_uuid)
-    if job_rec.get("profiles"):
-        profiles = query.filter(models.Profile.id.in_(job_rec["profiles"])).all()
-    else:
-        profiles = query.filter(models.Profile.type.in_(job_rec["profile_types"])).all()
-    profile_ids = [i.id for i in profiles]
-    profile_ids.append(user_profile.id)
-    profile_ids = list(set(profile_ids))
-    profile_skills = models.ProfileSkill.query.filter(
-        models.ProfileSkill.profile_id.in_(profile_ids)
-    ).all()
-    skill_ids = [i.skill_id for i in profile_skills]
-    skill_ids = list(set(skill_ids))
-    skills = models.Skill.query.filter(models.Skill.id.in_(skill_ids)).all()
-    return user_profile, profiles, profile_skills, skills
+    return user_profile, get_target_profiles(job_rec, org_uuid)
 
 
 class JobRecommendation:
@@ -128,46 +154,348 @@ class JobRecommendation:
 
         self.profile_skills = defaultdict(dict)
         self.skills = {}
+        self.embedding_index = {}
+        self.embedding_rows = None
+        self.embedding_store = None
+        self.neighbors = None
+        self.truncated = set()
 
     def job_by_distance(self, source_profile, target_profile):
         """Convert a skill gap to a distance considering how
         skills are related"""
+        return self.jobs_by_distance(source_profile, [target_profile])[0]
+
+    def jobs_by_distance(self, source_profile, target_profiles):
+        """Evaluate distance to each target profile in one pass"""
+        distances, fits = self._job_distances(source_profile, target_profiles)
+        return [
+            self._build_result(target_profile, distance, fit)
+            for target_profile, distance, fit in zip(target_profiles, distances, fits)
+        ]
+
+    def top_jobs_by_distance(
+        self, source_profile, target_profiles, limit=None, min_fit=None
+    ):
+        """Target profiles by descending fit, at most limit of them
+
+        Targets whose fit cannot reach min_fit, or cannot beat the lower
+        bounds of limit other targets, are skipped before their distances
+        are computed. Output is only built for the returned targets."""
+        # Margin for the rounding of returned fits
+        margin = 0.01
+        lower, upper = self.fit_bounds(source_profile, target_profiles)
+        keep = np.ones(len(target_profiles), dtype=bool)
+        if min_fit is not None:
+            keep &= upper >= min_fit - margin
+            lower = lower[lower >= min_fit]
+        if limit is not None and len(lower) >= limit:
+            threshold = -np.partition(-lower, limit - 1)[limit - 1]
+            keep &= upper >= threshold - margin
+        candidates = [target_profiles[i] for i in np.nonzero(keep)[0]]
+        distances, fits = self._job_distances(source_profile, candidates)
+        scored = [
+            (target_profile, round(distance, 2), round(fit, 2))
+            for target_profile, distance, fit in zip(candidates, distances, fits)
+        ]
+        if min_fit is not None:
+            scored = [i for i in scored if i[2] >= min_fit]
+        scored.sort(key=lambda x: x[2], reverse=True)
+        return [self._build_result(*i) for i in scored[:limit]]
+
+    def fit_bounds(self, source_profile, target_profiles):
+        """Lower and upper bounds on the fit to each target profile
+
+        Only skill levels are used. The lower bound takes the raw level
+        gaps. The upper bound reduces each gap as far as the max_skills
+        highest source levels could with the largest possible multiplier,
+        without computing any multipliers."""
         source_skills = self.profile_skills[source_profile.id]
-        target_skills = self.profile_skills[target_profile.id]
-        total_distance = 0
-        profile_sum = 0
-        for t_id, t_level in target_skills.items():
-            profile_sum += t_level
-            s_level = source_skills.get(t_id, 0)
-            if s_level >= t_level:
-                continue
-            all_multipliers = [
-                (
-                    self._get_learning_speed(self.skills[t_id], self.skills[i]),
-                    j,
-                )
-                for i, j in source_skills.items()
-                if (t_id != i)
-            ]
-            all_multipliers.sort(key=lambda x: x[0], reverse=True)
-            d = t_level - s_level
-            for multiplier, level in all_multipliers[: self.max_skills]:
-                level_multiplier = min(t_level, level) - min(s_level, level)
-                level_multiplier /= self.max_skill_gap
-                d -= multiplier * d * level_multiplier
-            total_distance += d
-        if profile_sum == 0:
-            fit = 100
+        target_levels = []
+        target_rows = []
+        levels = []
+        for row, target_profile in enumerate(target_profiles):
+            for t_id, t_level in self.profile_skills[target_profile.id].items():
+                target_levels.append(t_level)
+                target_rows.append(row)
+                levels.append(source_skills.get(t_id, 0))
+        target_levels = np.array(target_levels, dtype=float)
+        target_rows = np.array(target_rows, dtype=np.intp)
+        levels = np.array(levels, dtype=float)
+        gaps = np.maximum(target_levels - levels, 0)
+        num_targets = len(target_profiles)
+        profile_sums = np.bincount(
+            target_rows, weights=target_levels, minlength=num_targets
+        )
+        max_distances = np.bincount(target_rows, weights=gaps, minlength=num_targets)
+        offset = self.multiplier_offset
+        max_multiplier = max(
+            self.multiplier_baseline,
+            1.0,
+            ((offset - self.multiplier_threshold) / offset) ** self.multiplier_power,
+        )
+        if self.max_skill_gap > 0 and max_multiplier <= 1:
+            close_levels = np.sort(np.array(list(source_skills.values()), dtype=float))
+            close_levels = close_levels[::-1][: self.max_skills]
+            level_multipliers = np.minimum(target_levels[:, None], close_levels)
+            level_multipliers -= np.minimum(levels[:, None], close_levels)
+            level_multipliers /= self.max_skill_gap
+            shares = np.prod(
+                np.maximum(1 - max_multiplier * level_multipliers, 0), axis=1
+            )
+            min_distances = np.bincount(
+                target_rows, weights=gaps * shares, minlength=num_targets
+            )
         else:
-            fit = 100 * (profile_sum - total_distance) / profile_sum
-        fit = round(fit, 2)
-        total_distance = round(total_distance, 2)
+            min_distances = np.full(num_targets, -np.inf)
+        lower = np.full(num_targets, 100.0)
+        upper = np.full(num_targets, 100.0)
+        nonzero = profile_sums != 0
+        sums = profile_sums[nonzero]
+        lower[nonzero] = 100 * (sums - max_distances[nonzero]) / sums
+        upper[nonzero] = 100 * (sums - min_distances[nonzero]) / sums
+        return lower, upper
+
+    def _job_distances(self, source_profile, target_profiles):
+        """Distance and fit to each target profile
+
+        Multipliers between every required target skill and every source
+        skill come from a single distance matrix. Each target skill's
+        close skills are picked once and the gaps of all target profiles
+        are then reduced together."""
+        source_skills = self.profile_skills[source_profile.id]
+        source_ids = list(source_skills)
+        source_levels = np.array(list(source_skills.values()), dtype=float)
+        target_ids = []
+        target_levels = []
+        target_rows = []
+        for row, target_profile in enumerate(target_profiles):
+            for t_id, t_level in self.profile_skills[target_profile.id].items():
+                target_ids.append(t_id)
+                target_levels.append(t_level)
+                target_rows.append(row)
+        target_levels = np.array(target_levels, dtype=float)
+        target_rows = np.array(target_rows, dtype=np.intp)
+        levels = np.array([source_skills.get(i, 0) for i in target_ids], dtype=float)
+        gaps = target_levels - levels
+        distances = np.zeros(len(target_ids))
+        needed = np.nonzero(gaps > 0)[0]
+        if len(needed) and source_ids:
+            unique_ids = list(dict.fromkeys(target_ids[i] for i in needed))
+            unique_index = {j: i for i, j in enumerate(unique_ids)}
+            multipliers = learning_multipliers(
+                self._distances(unique_ids, source_ids),
+                self.multiplier_threshold,
+                self.multiplier_baseline,
+                self.multiplier_offset,
+                self.multiplier_power,
+            )
+            # A skill does not speed up learning itself
+            source_index = {j: i for i, j in enumerate(source_ids)}
+            for i, skill_id in enumerate(unique_ids):
+                if skill_id in source_index:
+                    multipliers[i, source_index[skill_id]] = -np.inf
+            close = top_k_positions(multipliers, self.max_skills)
+            close_multipliers = np.take_along_axis(multipliers, close, axis=1)
+            close_multipliers[close_multipliers == -np.inf] = 0
+            rows = np.array([unique_index[target_ids[i]] for i in needed])
+            distances[needed] = reduce_gaps(
+                gaps[needed],
+                target_levels[needed],
+                levels[needed],
+                close_multipliers[rows],
+                source_levels[close[rows]],
+                self.max_skill_gap,
+            )
+        elif len(needed):
+            distances[needed] = gaps[needed]
+        total_distances = np.bincount(
+            target_rows, weights=distances, minlength=len(target_profiles)
+        )
+        profile_sums = np.bincount(
+            target_rows, weights=target_levels, minlength=len(target_profiles)
+        )
+        fits = np.full(len(target_profiles), 100.0)
+        nonzero = profile_sums != 0
+        sums = profile_sums[nonzero]
+        fits[nonzero] = 100 * (sums - total_distances[nonzero]) / sums
+        return total_distances, fits
+
+    def profile_output(self, profile):
+        """Output of a loaded profile"""
+        return self._build_profile_output(profile, self.profile_skills[profile.id])
+
+    def _build_result(self, target_profile, distance, fit):
         return {
-            "profile": self._build_profile_output(target_profile, target_skills),
-            "distance": total_distance,
-            "fit": fit,
+            "profile": self.profile_output(target_profile),
+            "distance": round(distance, 2),
+            "fit": round(fit, 2),
         }
 
+    def distance_matrices(self, source_profiles, target_profiles, chunk_size=None):
+        """Distance and fit from every source to every target profile
+
+        Returns (sources, targets) arrays matching jobs_by_distance for
+        each source, without building output dicts. Multipliers between
+        all target skills and all source skills are computed once. Source
+        skills are padded to a common width so that sources are handled
+        in chunks of chunk_size with array operations."""
+        target_ids = []
+        target_levels = []
+        target_rows = []
+        for row, target_profile in enumerate(target_profiles):
+            for t_id, t_level in self.profile_skills[target_profile.id].items():
+                target_ids.append(t_id)
+                target_levels.append(t_level)
+                target_rows.append(row)
+        unique_ids = list(dict.fromkeys(target_ids))
+        unique_index = {j: i for i, j in enumerate(unique_ids)}
+        target_columns = np.array([unique_index[i] for i in target_ids], dtype=np.intp)
+        target_levels = np.array(target_levels, dtype=float)
+        target_rows = np.array(target_rows, dtype=np.intp)
+        num_targets = len(target_profiles)
+        profile_sums = np.bincount(
+            target_rows, weights=target_levels, minlength=num_targets
+        )
+        # Source skills padded to the widest source profile
+        all_source_skills = [self.profile_skills[i.id] for i in source_profiles]
+        source_ids = list(dict.fromkeys(i for j in all_source_skills for i in j))
+        source_index = {j: i for i, j in enumerate(source_ids)}
+        width = max((len(i) for i in all_source_skills), default=0)
+        num_sources = len(source_profiles)
+        columns = np.zeros((num_sources, width), dtype=np.intp)
+        source_levels = np.zeros((num_sources, width))
+        padding = np.ones((num_sources, width), dtype=bool)
+        for row, source_skills in enumerate(all_source_skills):
+            size = len(source_skills)
+            columns[row, :size] = [source_index[i] for i in source_skills]
+            source_levels[row, :size] = list(source_skills.values())
+            padding[row, :size] = False
+        # Position of each source skill among the target skills
+        source_targets = np.array(
+            [unique_index.get(i, -1) for i in source_ids], dtype=np.intp
+        )
+        if unique_ids and source_ids:
+            multipliers = learning_multipliers(
+                self._distances(unique_ids, source_ids),
+                self.multiplier_threshold,
+                self.multiplier_baseline,
+                self.multiplier_offset,
+                self.multiplier_power,
+            )
+        else:
+            multipliers = np.zeros((len(unique_ids), len(source_ids)))
+        # A skill does not speed up learning itself
+        for i, skill_id in enumerate(unique_ids):
+            if skill_id in source_index:
+                multipliers[i, source_index[skill_id]] = -np.inf
+        num_close = min(self.max_skills, width)
+        if chunk_size is None:
+            size = max(len(unique_ids) * width, len(target_ids) * self.max_skills, 1)
+            chunk_size = max(1, 2**22 // size)
+        distances = np.empty((num_sources, num_targets))
+        for start in range(0, num_sources, chunk_size):
+            stop = min(start + chunk_size, num_sources)
+            rows = np.arange(stop - start)
+            chunk_columns = columns[start:stop]
+            chunk_levels = source_levels[start:stop]
+            # Source level of every target skill
+            levels = np.zeros((len(rows), len(unique_ids)))
+            positions = source_targets[chunk_columns]
+            present = ~padding[start:stop] & (positions >= 0)
+            levels[np.nonzero(present)[0], positions[present]] = chunk_levels[present]
+            # Close skills of every target skill for every source
+            chunk_multipliers = multipliers[:, chunk_columns].transpose(1, 0, 2)
+            chunk_multipliers[
+                np.broadcast_to(padding[start:stop, None], chunk_multipliers.shape)
+            ] = -np.inf
+            close = top_k_positions(
+                chunk_multipliers.reshape(len(rows) * len(unique_ids), width),
+                self.max_skills,
+            ).reshape(len(rows), len(unique_ids), num_close)
+            close_multipliers = np.take_along_axis(chunk_multipliers, close, axis=2)
+            close_multipliers[close_multipliers == -np.inf] = 0
+            close_levels = chunk_levels[rows[:, None, None], close]
+            gap_levels = levels[:, target_columns]
+            gaps = target_levels - gap_levels
+            needed = gaps > 0
+            reduced = reduce_gaps(
+                gaps[needed],
+                np.broadcast_to(target_levels, gaps.shape)[needed],
+                gap_levels[needed],
+                close_multipliers[:, target_columns][needed],
+                close_levels[:, target_columns][needed],
+                self.max_skill_gap,
+            )
+            gap_distances = np.zeros(gaps.shape)
+            gap_distances[needed] = reduced
+            flat_rows = rows[:, None] * num_targets + target_rows
+            distances[start:stop] = np.bincount(
+                flat_rows.ravel(),
+                weights=gap_distances.ravel(),
+                minlength=len(rows) * num_targets,
+            ).reshape(len(rows), num_targets)
+        fits = np.full(distances.shape, 100.0)
+        nonzero = profile_sums != 0
+        fits[:, nonzero] = (
+            100
+            * (profile_sums[nonzero] - distances[:, nonzero])
+            / profile_sums[nonzero]
+        )
+        return np.round(distances, 2), np.round(fits, 2)
+
+    def add_neighbors(self, rows, truncated=()):
+        """Take skill distances from stored neighbor lists
+
+        rows are (skill_id, neighbor_id, distance) and must include every
+        pair closer than multiplier_threshold in at least one direction,
+        except pairs of truncated skills whose lists were cut. Distances
+        between truncated skills come from embeddings, other pairs are
+        given the baseline multiplier without loading embeddings"""
+        if self.neighbors is None:
+            self.neighbors = defaultdict(dict)
+        for skill_id, neighbor_id, distance in rows:
+            self.neighbors[skill_id][neighbor_id] = distance
+            self.neighbors[neighbor_id][skill_id] = distance
+        self.truncated.update(truncated)
+
+    def _distances(self, target_ids, source_ids):
+        """Distances between target and source skill embeddings"""
+        if self.neighbors is None:
+            return pairwise_distances(
+                self._embeddings(target_ids), self._embeddings(source_ids)
+            )
+        source_index = {j: i for i, j in enumerate(source_ids)}
+        output = np.full((len(target_ids), len(source_ids)), np.nan)
+        for row, skill_id in enumerate(target_ids):
+            for neighbor_id, distance in self.neighbors.get(skill_id, {}).items():
+                column = source_index.get(neighbor_id)
+                if column is not None:
+                    output[row, column] = distance
+        rows = [i for i, j in enumerate(target_ids) if j in self.truncated]
+        columns = [i for i, j in enumerate(source_ids) if j in self.truncated]
+        if rows and columns:
+            output[np.ix_(rows, columns)] = pairwise_distances(
+                self._embeddings([target_ids[i] for i in rows]),
+                self._embeddings([source_ids[i] for i in columns]),
+            )
+        return output
+
+    def _embeddings(self, skill_ids):
+        """Embedding matrix for skill_ids, kept for repeated lookups"""
+        missing = [i for i in skill_ids if i not in self.embedding_index]
+        if missing:
+            offset = len(self.embedding_index)
+            self.embedding_index.update({j: offset + i for i, j in enumerate(missing)})
+            if self.embedding_store is None:
+                rows = embedding_matrix([self.skills.get(i) for i in missing])
+            else:
+                rows = self.embedding_store.rows(missing)
+            if self.embedding_rows is None:
+                self.embedding_rows = rows
+            else:
+                self.embedding_rows = np.vstack([self.embedding_rows, rows])
+        return self.embedding_rows[[self.embedding_index[i] for i in skill_ids]]
+
     def _build_profile_output(self, profile, skills):
         """Convert profile details to schema"""
         output = {
@@ -188,44 +516,281 @@ class JobRecommendation:
         ]
         return output
 
-    def _get_learning_speed(self, embed1, embed2):
-        """From two embeddings generate a training speed multiplier"""
-        if (embed1 is None) or (embed2 is None):
-            return self.multiplier_baseline
-        d = np.linalg.norm(embed1 - embed2)
-        if d > self.multiplier_threshold:
-            return self.multiplier_baseline
-        y = (self.multiplier_offset - d) / self.multiplier_offset
-        y = y ** self.multiplier_power
-        return y
+    def add_profile_matrix(self, matrix, profiles):
+        """Load the skill levels of profiles from a ProfileSkillMatrix"""
+        for profile in profiles:
+            self.profile_skills[profile.id] = matrix.skills(profile.id)
 
-    def multiple_jobs_by_distance(
-        self, user_profile, target_profiles, profile_skills, skills
-    ):
-        """Evaluate distance for multiple target skill profiles"""
+    def add_embedding_store(self, store):
+        """Take skill embeddings from an EmbeddingStore"""
+        self.embedding_store = store
+
+    def add_profiles(self, profile_skills, skills):
+        """Load profile skill levels and skill embeddings"""
         for i in profile_skills:
             self.profile_skills[i.profile_id][i.skill_id] = i.level
-        self.skills.update({i.id: np.array(i.skill_embedding) for i in skills})
-        results = []
-        for ts in target_profiles:
-            results.append(self.job_by_distance(user_profile, ts))
-        results.sort(key=lambda x: x["fit"], reverse=True)
-        return results
+        self.skills.update({i.id: i.skill_embedding for i in skills})
 
+    def jobs_from_fits(self, target_profiles, fits, limit=None, min_fit=None):
+        """Build results from precomputed fits
 
-def job_recommendation(job_rec, org_uuid, user_uuid):
-    """Generate job recommendations"""
-    user_profile, profiles, profile_skills, skills = collect_profile_information(
-        job_rec, org_uuid, user_uuid
+        fits maps each target profile ID to its (distance, fit). Output
+        is only built for the returned targets."""
+        scored = [
+            (target_profile, *fits[target_profile.id])
+            for target_profile in target_profiles
+        ]
+        if min_fit is not None:
+            scored = [i for i in scored if i[2] >= min_fit]
+        scored.sort(key=lambda x: x[2], reverse=True)
+        return [self._build_result(*i) for i in scored[:limit]]
+
+    def multiple_jobs_by_distance(
+        self,
+        user_profile,
+        target_profiles,
+        profile_skills,
+        skills,
+        limit=None,
+        min_fit=None,
+    ):
+        """Evaluate distance for multiple target skill profiles
+
+        Returns the targets with a fit of at least min_fit by descending
+        fit, at most limit of them"""
+        self.add_profiles(profile_skills, skills)
+        return self.top_jobs_by_distance(user_profile, target_profiles, limit, min_fit)
+
+
+def add_skill_neighbors(recommendation, skill_ids):
+    """Use the skill neighbor table when it covers the multiplier threshold"""
+    threshold = current_app.config["SKILL_NEIGHBOR_THRESHOLD"]
+    if recommendation.multiplier_threshold <= threshold:
+        recommendation.add_neighbors(
+            get_skill_neighbors(skill_ids), get_truncated_skills(skill_ids)
+        )
+
+
+def load_recommendation(org_id, profiles, embeddings=True):
+    """JobRecommendation with the skill levels of profiles loaded
+
+    Levels come from the organization's cached profile skill matrix. With
+    embeddings, skill distances come from the skill neighbor table when
+    it covers the multiplier threshold and from the organization's
+    embedding store otherwise, or between skills with truncated neighbor
+    lists."""
+    matrix = get_profile_matrix(org_id)
+    recommendation = JobRecommendation(get_levels(org_id))
+    recommendation.add_profile_matrix(matrix, profiles)
+    if embeddings:
+        skill_ids = matrix.profile_skill_ids([i.id for i in profiles])
+        add_skill_neighbors(recommendation, skill_ids)
+        if recommendation.neighbors is None or recommendation.truncated:
+            recommendation.add_embedding_store(get_embedding_store(org_id))
+    return recommendation
+
+
+def profile_distance_matrices(org_id, source_profiles, target_profiles):
+    """Distance and fit matrices from source to target profiles"""
+    recommendation = load_recommendation(org_id, source_profiles + target_profiles)
+    return recommendation.distance_matrices(source_profiles, target_profiles)
+
+
+def get_group_profiles(org_id, group_id):
+    """Get the user profiles of the members of a group"""
+    group = models.Group.query.filter_by(id=group_id, organization_id=org_id).first()
+    if group is None:
+        abort(404, message="Group not found")
+    member = models.GroupMember
+    return (
+        models.Profile.query.filter(models.Profile.user_id == member.user_id)
+        .filter(member.group_id == group.id)
+        .filter(models.Profile.organization_id == org_id)
+        .all()
+    )
+
+
+def group_job_recommendations(job_rec, org_id, group_id):
+    """Job recommendations for every member of a group as JSON chunks
+
+    Target profiles, profile skills, skill neighbors and levels are loaded
+    once. Distances and fits are computed as (users, profiles) matrices
+    for JOB_RECOMMENDATION_CHUNK_SIZE users at a time, and the output of
+    each chunk is yielded as soon as it is ready. Precomputed fits are not
+    used."""
+    user_profiles = get_group_profiles(org_id, group_id)
+    profiles = get_target_profiles(job_rec, org_id)
+    recommendation = load_recommendation(org_id, user_profiles + profiles)
+    # Profile output is shared by every user
+    outputs = ProfileSchema(many=True).dump(
+        [recommendation.profile_output(i) for i in profiles]
+    )
+    chunk_size = current_app.config["JOB_RECOMMENDATION_CHUNK_SIZE"]
+    limit = job_rec.get("limit")
+    min_fit = job_rec.get("min_fit")
+
+    def generate():
+        yield '{"users": ['
+        for start in range(0, len(user_profiles), chunk_size):
+            chunk = user_profiles[start : start + chunk_size]
+            distances, fits = recommendation.distance_matrices(chunk, profiles)
+            users = []
+            for row, user_profile in enumerate(chunk):
+                columns = np.arange(len(profiles))
+                if min_fit is not None:
+                    columns = columns[fits[row, columns] >= min_fit]
+                order = np.argsort(-fits[row, columns], kind="stable")
+                columns = columns[order][:limit]
+                recommendations = [
+                    {
+                        "distance": float(distances[row, i]),
+                        "fit": float(fits[row, i]),
+                        "profile": outputs[i],
+                    }
+                    for i in columns
+                ]
+                users.append(
+                    json.dumps(
+                        {
+                            "user": str(user_profile.user_id),
+                            "recommendations": recommendations,
+                        }
+                    )
+                )
+            yield ("," if start else "") + ",".join(users)
+        yield "]}"
+
+    return generate()
+
+
+def precomputed_job_recommendation(job_rec, org_uuid, user_uuid):
+    """Job recommendations from the fit table
+
+    Returns None unless every target profile has a fresh fit within the
+    job_rec max_age"""
+    user_profile, profiles = get_recommendation_profiles(job_rec, org_uuid, user_uuid)
+    fits = get_fresh_fits(user_profile.id, [i.id for i in profiles], job_rec["max_age"])
+    if fits is None:
+        return None
+    recommendation = load_recommendation(org_uuid, profiles, embeddings=False)
+    return recommendation.jobs_from_fits(
+        profiles, fits, job_rec.get("limit"), job_rec.get("min_fit")
     )
-    levels = models.Level.query.filter_by(organization_id=org_uuid).all()
-    levels = [(i.name, i.cutoff) for i in levels]
-    levels.sort(key=lambda x: x[1])
-    recommendation = JobRecommendation(levels)
-    results = recommendation.multiple_jobs_by_distance(
-        user_profile, profiles, profile_skills, skills
+
+
+def job_recommendation(job_rec, org_uuid, user_uuid):
+    """Generate job recommendations
+
+    With a max_age the precomputed fits are used when all are fresh"""
+    if job_rec.get("max_age") is not None:
+        results = precomputed_job_recommendation(job_rec, org_uuid, user_uuid)
+        if results is not None:
+            return results
+    user_profile, profiles = get_recommendation_profiles(job_rec, org_uuid, user_uuid)
+    recommendation = load_recommendation(org_uuid, [user_profile] + profiles)
+    return recommendation.top_jobs_by_distance(
+        user_profile, profiles, job_rec.get("limit"), job_rec.get("min_fit")
     )
-    return results
+
+
+@shared_task
+def run_job_recommendation(job_id):
+    """Compute job recommendations for a job and store them as its result"""
+    with recording_failure(job_id):
+        start_job(job_id)
+        job = models.Job.query.filter_by(id=job_id).one()
+        parameters = dict(job.parameters)
+        user_id = parameters.pop("user")
+        job_rec = JobRecommendationQuerySchema().load(parameters)
+        recommendations = job_recommendation(job_rec, job.organization_id, user_id)
+        finish_job(
+            job_id,
+            JobRecommendationManySchema().dump({"recommendations": recommendations}),
+        )
+
+
+def compute_fits(org_id, user_profiles, target_profiles):
+    """Store the fits of user profiles to target profiles in chunks"""
+    chunk_size = current_app.config["JOB_RECOMMENDATION_CHUNK_SIZE"]
+    profile_ids = [i.id for i in target_profiles]
+    for start in range(0, len(user_profiles), chunk_size):
+        chunk = user_profiles[start : start + chunk_size]
+        computed_at = datetime.utcnow()
+        distances, fits = profile_distance_matrices(org_id, chunk, target_profiles)
+        store_fits(
+            org_id, [i.id for i in chunk], profile_ids, distances, fits, computed_at
+        )
+        db.session.commit()
+
+
+@shared_task
+def precompute_job_recommendations(org_id=None):
+    """Recompute the fits of every user profile to every target profile
+
+    Run nightly by celery beat for every organization"""
+    if org_id is None:
+        org_ids = [i for i, in db.session.query(models.Organization.id)]
+    else:
+        org_ids = [org_id]
+    for org_id in org_ids:
+        user_profiles, target_profiles = get_fit_profiles(org_id)
+        delete_other_fits(
+            org_id, [i.id for i in user_profiles], [i.id for i in target_profiles]
+        )
+        db.session.commit()
+        compute_fits(org_id, user_profiles, target_profiles)
+
+
+@shared_task
+def refresh_job_recommendations(org_id=None):
+    """Recompute only the stale fits
+
+    Run periodically by celery beat for every organization. Fits are
+    recomputed for every user profile with a stale fit to every target
+    profile with a stale fit"""
+    if org_id is None:
+        fit = models.JobRecommendationFit
+        org_ids = [
+            i
+            for i, in db.session.query(fit.organization_id)
+            .filter(fit.stale_at.isnot(None))
+            .distinct()
+        ]
+    else:
+        org_ids = [org_id]
+    for org_id in org_ids:
+        stale = get_stale_fits(org_id)
+        user_ids = set(i for i, _ in stale)
+        target_ids = set(i for _, i in stale)
+        user_profiles, target_profiles = get_fit_profiles(org_id)
+        compute_fits(
+            org_id,
+            [i for i in user_profiles if i.id in user_ids],
+            [i for i in target_profiles if i.id in target_ids],
+        )
+
+
+def submit_job_recommendation(job_rec, org_id, user_id):
+    """Queue job recommendations for a user unless a recent job matches"""
+    user_profile = models.Profile.query.filter_by(
+        organization_id=org_id, user_id=user_id
+    ).first()
+    if user_profile is None:
+        abort(404, message="User profile not found")
+    parameters = JobRecommendationQuerySchema().dump(job_rec)
+    parameters["user"] = str(user_id)
+    job, created = submit_job(org_id, "job_recommendation", parameters)
+    if created:
+        run_job_recommendation.delay(str(job.id))
+    return job
+
+
+def get_job_recommendation_job(job_id, org_id, user_id):
+    """Get a job recommendation job for a user of the organization"""
+    job = get_job(job_id, org_id, "job_recommendation")
+    if job is None or job.parameters["user"] != str(user_id):
+        abort(404)
+    return job
 
 
 def get_user_details(org_id, user_id=None):
@@ -303,3 +868,48 @@ class JobRecommendationAPI(MethodView):
         Generate job recommendations for the user"""
         recommendations = job_recommendation(job_rec, org_uuid, user_uuid)
         return {"recommendations": recommendations}
+
+
+@api.route("organizations/<org_uuid>/users/<user_uuid>/job_recommendations/jobs/")
+class JobRecommendationJobsAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.arguments(JobRecommendationQuerySchema, location="json")
+    @api.response(202, JobSchema)
+    def post(self, job_rec, org_uuid, user_uuid):
+        """Submit job recommendation job
+
+        Queue job recommendations for the user, poll the job for its
+        status and fetch the recommendations from its result once it has
+        succeeded. Submitting the same query again returns the recent job
+        rather than queueing a new one"""
+        return submit_job_recommendation(job_rec, org_uuid, user_uuid)
+
+
+@api.route(
+    "organizations/<org_uuid>/users/<user_uuid>/job_recommendations/jobs/<job_uuid>/"
+)
+class JobRecommendationJobAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.response(200, JobSchema)
+    def get(self, org_uuid, user_uuid, job_uuid):
+        """Get job recommendation job status"""
+        return get_job_recommendation_job(job_uuid, org_uuid, user_uuid)
+
+
+@api.route(
+    "organizations/<org_uuid>/users/<user_uuid>/job_recommendations/jobs/<job_uuid>/result/"
+)
+class JobRecommendationJobResultAPI(MethodView):
+    decorators = [authorized_org]
+
+    @api.response(200, JobRecommendationManySchema)
+    def get(self, org_uuid, user_uuid, job_uuid):
+        """Get job recommendation job result
+
+        Get the recommendations of a job that has succeeded"""
+        job = get_job_recommendation_job(job_uuid, org_uuid, user_uuid)
+        if job.status != "success":
+            abort(409, message=f"Job recommendation job is {job.status}")
+        return decompress_result(job.result)
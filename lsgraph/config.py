@@ -14,6 +14,9 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import tempfile
+
+from celery.schedules import crontab
 
 # Environment config
 ENV = "development"
@@ -25,6 +28,24 @@ SQLALCHEMY_DATABASE_URI = os.environ.get(
 )
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Task queue config, chords need a result backend shared by all workers
+CELERY_RESULT_BACKEND = os.environ.get(
+    "CELERY_RESULT_BACKEND", "db+" + SQLALCHEMY_DATABASE_URI
+)
+# Keep job results when tasks run eagerly, as in tests
+CELERY_TASK_STORE_EAGER_RESULT = True
+# Periodic tasks run by celery beat
+CELERY_BEAT_SCHEDULE = {
+    "precompute-job-recommendations": {
+        "task": "lsgraph.api_v1.views.users.precompute_job_recommendations",
+        "schedule": crontab(hour=2, minute=0),
+    },
+    "refresh-job-recommendations": {
+        "task": "lsgraph.api_v1.views.users.refresh_job_recommendations",
+        "schedule": 300,
+    },
+}
+
 # Documentation config
 API_TITLE = "Learnershape lsgraph API"
 API_VERSION = "1"
@@ -39,3 +60,65 @@ OPENAPI_SWAGGER_UI_PATH = "/swagger-ui"
 OPENAPI_SWAGGER_UI_URL = "https://cdn.jsdelivr.net/npm/swagger-ui-dist/"
 OPENAPI_RAPIDOC_PATH = "/rapidoc"
 OPENAPI_RAPIDOC_URL = "https://unpkg.com/rapidoc/dist/rapidoc-min.js"
+
+# Authentication config
+# Seconds for which an access key's customer and organizations are cached
+ACCESS_KEY_CACHE_TTL = 60
+# Minimum age in seconds of cached credentials before a request for an
+# organization missing from them reloads them
+ACCESS_KEY_RELOAD_INTERVAL = 5
+# Unknown access keys remembered to reject repeated requests without a
+# query, and for how many seconds
+ACCESS_KEY_REJECTED_CACHE_SIZE = 10000
+ACCESS_KEY_REJECTED_CACHE_TTL = 60
+
+# Skill graph config
+SKILL_TREE_CACHE_TTL = 60
+SKILL_EMBEDDING_BATCH_SIZE = 256
+SKILL_EMBEDDING_COUNTDOWN = 5
+# One of lsgraph.services.embedding.EMBEDDERS, "hashing" runs offline
+SKILL_EMBEDDER = os.environ.get("SKILL_EMBEDDER", "universal-sentence-encoder")
+# Skill path embeddings kept in the memory of each process
+SKILL_EMBEDDING_CACHE_SIZE = 10000
+# Largest embedding distance stored in the skill neighbor table, rebuild
+# with rebuild_skill_neighbors after changing it or SKILL_NEIGHBOR_LIMIT
+SKILL_NEIGHBOR_THRESHOLD = 1.0
+# Nearest neighbors stored for each skill, so that the table grows
+# linearly with the skills however close they are. Distances between
+# skills with more neighbors come from the embedding store
+SKILL_NEIGHBOR_LIMIT = 100
+# Skill embedding stores shared by the worker processes of a host, in
+# shared memory where available. Used for skills with more neighbors
+# than SKILL_NEIGHBOR_LIMIT, or when SKILL_NEIGHBOR_THRESHOLD is below the
+# job recommendation multiplier threshold of 1.0
+SKILL_EMBEDDING_STORE_DIR = os.environ.get(
+    "SKILL_EMBEDDING_STORE_DIR",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        "lsgraph-embeddings",
+    ),
+)
+
+# Workforce planning config
+# Source profiles per distance task of a workforce planning job
+WORKFORCE_PLANNING_CHUNK_SIZE = 500
+# Distance matrices kept per organization for re-planning
+WORKFORCE_DISTANCE_CACHE_SIZE = 20
+
+# Job recommendation config
+# Organizations whose profile skill matrix is kept in the memory of each
+# process
+PROFILE_MATRIX_CACHE_SIZE = 50
+# Target profile types of the precomputed job recommendation fit table
+JOB_RECOMMENDATION_FIT_PROFILE_TYPES = ["job role"]
+# User profiles per distance computation when precomputing fits or
+# recommending jobs for a group
+JOB_RECOMMENDATION_CHUNK_SIZE = 500
+
+# Resource config
+# Resources per page when listing resources without a limit
+RESOURCE_PAGE_SIZE = 100
+
+# Job config
+# Seconds for which a job is reused by submissions with the same parameters
+JOB_REUSE_TTL = 600
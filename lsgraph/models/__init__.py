@@ -36,7 +36,14 @@ __all__ = [
     "QualityValue",
     "Skill",
     "SkillInclude",
+    "SkillClosure",
+    "SkillNeighbor",
+    "EmbeddingCache",
+    "Job",
+    "WorkforceDistances",
+    "JobRecommendationFit",
     "User",
+    "UserResourceAccess",
     "Customer",
     "AccessKey",
     "Profile",
@@ -61,7 +68,14 @@ from .quality_attribute import QualityAttribute
 from .quality_value import QualityValue
 from .skill import Skill
 from .skill_include import SkillInclude
+from .skill_closure import SkillClosure
+from .skill_neighbor import SkillNeighbor
+from .embedding_cache import EmbeddingCache
+from .job import Job
+from .workforce_distances import WorkforceDistances
+from .job_recommendation_fit import JobRecommendationFit
 from .user import User
+from .user_resource_access import UserResourceAccess
 from .customer import Customer
 from .access_key import AccessKey
 from .profile import Profile
@@ -13,9 +13,55 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import numpy as np
 import sqlalchemy as sa
+from sqlalchemy import event
 from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Session, object_session
 
 
 class TSVECTOR(sa.types.TypeDecorator):
     impl = TSVECTOR
+
+
+class Float32Vector(sa.types.TypeDecorator):
+    """Vector stored as packed little-endian float32 bytes
+
+    Values are read back as read-only numpy arrays over the fetched buffer"""
+
+    impl = sa.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return np.asarray(value, dtype="<f4").tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype="<f4")
+
+
+def run_after_commit(target, callback, rollback=False):
+    """Run callback once the session flushing target commits
+
+    For caches derived from target, invalidating at flush would let a
+    concurrent request cache the old rows again before the change is
+    visible to other transactions. With rollback the callback also runs
+    when the transaction is rolled back, otherwise it is discarded."""
+    session = object_session(target)
+    session.info.setdefault("after_commit", []).append((callback, rollback))
+
+
+@event.listens_for(Session, "after_commit")
+def apply_after_commit(session):
+    for callback, _ in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def apply_after_rollback(session):
+    for callback, rollback in session.info.pop("after_commit", []):
+        if rollback:
+            callback()
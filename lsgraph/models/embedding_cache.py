@@ -0,0 +1,28 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from . import db
+from ._shared import Float32Vector
+
+
+class EmbeddingCache(db.Model):
+    """Embeddings of previously encoded texts
+
+    Keyed by the SHA-256 of the embedder version and the input text, so
+    identical skill paths are only encoded once per model"""
+
+    key = db.Column(db.String(64), primary_key=True)
+    embedding = db.Column(Float32Vector, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
@@ -0,0 +1,54 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+import uuid
+
+from . import db
+
+
+class Job(db.Model):
+    """A queued analysis and its compressed result
+
+    Jobs with the same kind and parameters hash within an organization
+    compute the same result, so a recent job is reused rather than run
+    again"""
+
+    id = db.Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        nullable=False,
+    )
+    organization_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("organization.id"), nullable=False
+    )
+    kind = db.Column(db.String(64), nullable=False)
+    parameters = db.Column(JSONB, nullable=False)
+    parameters_hash = db.Column(db.String(64), nullable=False)
+    # One of pending, running, success or failure
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    progress = db.Column(db.Float, nullable=False, default=0)
+    # zlib compressed JSON
+    result = db.Column(db.LargeBinary)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        Index("ix_job_parameters", organization_id, kind, parameters_hash),
+    )
@@ -0,0 +1,42 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy.dialects.postgresql import UUID
+
+from . import db
+
+
+class JobRecommendationFit(db.Model):
+    """Precomputed distance and fit of a user profile to a target profile
+
+    Rows are recomputed nightly. When the skills or skill embeddings
+    behind a row change, stale_at is set until the row is refreshed"""
+
+    user_profile_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("profile.id"), primary_key=True
+    )
+    profile_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("profile.id"), primary_key=True, index=True
+    )
+    organization_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey("organization.id"),
+        nullable=False,
+        index=True,
+    )
+    distance = db.Column(db.Float, nullable=False)
+    fit = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+    stale_at = db.Column(db.DateTime)
@@ -33,3 +33,8 @@ class Organization(db.Model):
     name = db.Column(db.String(128))
     customer_id = db.Column(UUID(as_uuid=True), db.ForeignKey("customer.id"))
     root_skill_id = db.Column(UUID(as_uuid=True), db.ForeignKey("skill.id"))
+    # Incremented whenever profile skills or skill embeddings change, so
+    # results derived from them can be checked for staleness
+    skill_data_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
@@ -14,11 +14,11 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from sqlalchemy import Index
-from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
 from . import db
-from ._shared import TSVECTOR
+from ._shared import Float32Vector, TSVECTOR
 
 
 class Resource(db.Model):
@@ -47,18 +47,23 @@ class Resource(db.Model):
     learning_outcomes = db.Column(db.Text)
     prerequisite_knowledge = db.Column(db.Text)
     retired = db.Column(db.Boolean)
-    resource_recommendation_vector = db.Column(ARRAY(db.Float))
+    resource_recommendation_vector = db.Column(Float32Vector)
     organization_id = db.Column(
         UUID(as_uuid=True), db.ForeignKey("organization.id"), index=True
     )
+    # Name matches rank above short description and description matches
     __ts_vector__ = db.Column(
         TSVECTOR(),
         db.Computed(
-            "to_tsvector('english', name || ' ' || short_description || ' ' || description)",
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(short_description, '')), 'B')"
+            " || setweight(to_tsvector('english', coalesce(description, '')), 'C')",
             persisted=True,
         ),
     )
 
     __table_args__ = (
         Index("ix_name_desc_ts_vector__", __ts_vector__, postgresql_using="gin"),
+        # Resource pages are ordered by (name, id) within an organization
+        Index("ix_resource_organization_name", organization_id, name, id),
     )
@@ -14,11 +14,11 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from sqlalchemy import Index
-from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
 from . import db
-from ._shared import TSVECTOR
+from ._shared import Float32Vector, TSVECTOR
 
 
 class Skill(db.Model):
@@ -35,8 +35,12 @@ class Skill(db.Model):
     description = db.Column(db.Text)
     personal = db.Column(db.Boolean)
     creator_id = db.Column(UUID(as_uuid=True), db.ForeignKey("user.id"))
-    skill_embedding = db.Column(ARRAY(db.Float))
-    resource_recommendation_vector = db.Column(ARRAY(db.Float))
+    skill_embedding = db.Column(Float32Vector)
+    # More neighbors were within SKILL_NEIGHBOR_THRESHOLD than listed
+    neighbors_truncated = db.Column(
+        db.Boolean, nullable=False, default=False, server_default="false"
+    )
+    resource_recommendation_vector = db.Column(Float32Vector)
     __ts_vector__ = db.Column(
         TSVECTOR(),
         db.Computed(
@@ -47,4 +51,9 @@ class Skill(db.Model):
 
     __table_args__ = (
         Index("ix_skill_name__ts_vector__", __ts_vector__, postgresql_using="gin"),
+        Index(
+            "ix_skill_pending_embedding",
+            id,
+            postgresql_where=skill_embedding.is_(None),
+        ),
     )
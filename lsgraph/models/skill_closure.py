@@ -0,0 +1,39 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import UUID
+
+from . import db
+
+
+class SkillClosure(db.Model):
+    """Transitive closure of the skills graph
+
+    One row links every skill to each of its ancestors, including a row
+    linking the skill to itself at depth 0. Maintained alongside
+    SkillInclude so that subtree and path lookups avoid recursive queries"""
+
+    ancestor_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("skill.id"), primary_key=True
+    )
+    descendant_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("skill.id"), primary_key=True
+    )
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_skill_closure_descendant_id_depth", descendant_id, depth),
+    )
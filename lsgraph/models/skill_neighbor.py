@@ -0,0 +1,35 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy.dialects.postgresql import UUID
+
+from . import db
+
+
+class SkillNeighbor(db.Model):
+    """Pairs of skills with embeddings within SKILL_NEIGHBOR_THRESHOLD
+
+    Each skill lists its nearest SKILL_NEIGHBOR_LIMIT neighbors within
+    its organization, so a pair may be listed in one direction only.
+    Pairs listed in neither direction are beyond the threshold, unless
+    both skills are marked neighbors_truncated"""
+
+    skill_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("skill.id"), primary_key=True
+    )
+    neighbor_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("skill.id"), primary_key=True, index=True
+    )
+    distance = db.Column(db.Float, nullable=False)
@@ -0,0 +1,31 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy.dialects.postgresql import UUID
+
+from . import db
+
+
+class UserResourceAccess(db.Model):
+    """Resources a user can access through collections
+
+    Maintained from collection members, group members and collection
+    resources, a user has access through collections they are a member
+    of directly or through a group"""
+
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("user.id"), primary_key=True)
+    resource_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("resource.id"), primary_key=True
+    )
@@ -0,0 +1,34 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy.dialects.postgresql import UUID
+
+from . import db
+
+
+class WorkforceDistances(db.Model):
+    """Cached distance and fit matrices of a workforce plan
+
+    Keyed by the SHA-256 of the source and target profile IDs and only
+    valid for the organization's skill data version they were computed
+    from. The matrices are stored as a compressed NumPy archive"""
+
+    organization_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("organization.id"), primary_key=True
+    )
+    key = db.Column(db.String(64), primary_key=True)
+    skill_data_version = db.Column(db.Integer, nullable=False)
+    matrices = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
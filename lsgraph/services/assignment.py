@@ -0,0 +1,137 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+
+def min_cost_assignment(costs, allowed, capacities, scale=100):
+    """Assign each person to at most one target at minimum total cost
+
+    costs and allowed are (persons, targets) arrays and target j takes at
+    most capacities[j] persons. The assignment first maximizes the number
+    of persons assigned, then minimizes their total cost. Costs are
+    rounded to 1 / scale, for which the result is exactly optimal.
+
+    Solved as a min-cost flow by successive shortest paths. Paths run
+    over targets only: a step from target a to target b moves the person
+    at a with the smallest cost(b) - cost(a), so each search is a dense
+    Dijkstra over the targets using potentials from the previous search.
+    All person-disjoint shortest paths found by a search are applied
+    together. Returns the target of each person, -1 where unassigned."""
+    num_persons, num_targets = costs.shape
+    output = np.full(num_persons, -1, dtype=np.intp)
+    capacities = np.minimum(np.asarray(capacities, dtype=np.intp), allowed.sum(0))
+    if num_persons == 0 or num_targets == 0:
+        return output
+    costs = np.where(allowed, np.rint(costs * scale), np.inf)
+    targets = np.arange(num_targets)
+    # Persons by increasing cost for each target, the first free person
+    # in each row is the cheapest way into that target
+    order = np.argsort(costs.T, axis=1, kind="stable")
+    pointer = np.zeros(num_targets, dtype=np.intp)
+    head = order[:, 0]
+    counts = np.zeros(num_targets, dtype=np.intp)
+    members = [[] for _ in targets]
+    moves = np.full((num_targets, num_targets), np.inf)
+    move_person = np.full((num_targets, num_targets), -1, dtype=np.intp)
+    potential = np.zeros(num_targets)
+    while True:
+        for t in np.nonzero((pointer < num_persons) & (output[head] >= 0))[0]:
+            while pointer[t] < num_persons:
+                free = output[order[t, pointer[t] : pointer[t] + 64]] < 0
+                if free.any():
+                    pointer[t] += np.argmax(free)
+                    break
+                pointer[t] += len(free)
+        has_source = pointer < num_persons
+        head = order[targets, np.minimum(pointer, num_persons - 1)]
+        dist = np.full(num_targets, np.inf)
+        dist[has_source] = costs[head[has_source], targets[has_source]]
+        dist -= potential
+        parent = np.full(num_targets, -1, dtype=np.intp)
+        unsettled = np.isfinite(dist)
+        open_targets = counts < capacities
+        while True:
+            shortest = np.min(dist[open_targets], initial=np.inf)
+            if not unsettled.any():
+                break
+            nearest = dist[unsettled].min()
+            if nearest >= shortest:
+                break
+            settled = np.nonzero(unsettled & (dist == nearest))[0]
+            unsettled[settled] = False
+            through = moves[settled] + (nearest + potential[settled, None] - potential)
+            best = np.argmin(through, axis=0)
+            candidate = through[best, targets]
+            improved = candidate < dist
+            dist[improved] = candidate[improved]
+            parent[improved] = settled[best[improved]]
+            unsettled |= improved
+        if not np.isfinite(shortest):
+            return output
+        potential += np.minimum(dist, shortest)
+        used = set()
+        changed = set()
+        for end in np.nonzero(open_targets & (dist == shortest))[0]:
+            path = []
+            t = end
+            while parent[t] >= 0:
+                path.append((move_person[parent[t], t], t))
+                t = parent[t]
+            path.append((head[t], t))
+            if any(p in used for p, _ in path):
+                continue
+            for p, t in path:
+                used.add(p)
+                if output[p] >= 0:
+                    members[output[p]].remove(p)
+                    changed.add(output[p])
+                output[p] = t
+                members[t].append(p)
+                changed.add(t)
+            counts[end] += 1
+        for t in changed:
+            persons = np.array(members[t], dtype=np.intp)
+            change = costs[persons] - costs[persons, t][:, None]
+            best = np.argmin(change, axis=0)
+            moves[t] = change[best, targets]
+            move_person[t] = persons[best]
+            moves[t, t] = np.inf
+
+
+def greedy_pairs(distances, allowed, number_needed):
+    """Employee and target pairs kept by pruning the longest options
+
+    Options are visited from the longest distance down and dropped while
+    both the employee and the target have options to spare. Returns
+    (employees, targets) arrays ordered by decreasing distance."""
+    num_targets = distances.shape[1]
+    employees, targets = np.nonzero(allowed)
+    order = np.argsort(-distances[employees, targets], kind="stable")
+    employees = employees[order]
+    targets = targets[order]
+    employee_options = allowed.sum(1)
+    target_options = allowed.sum(0)
+    keep = np.ones(len(employees), dtype=bool)
+    # Option counts only decrease, so later options can only be dropped
+    # if their employee has too many options to begin with
+    for i in np.nonzero(employee_options[employees] > num_targets)[0]:
+        e = employees[i]
+        t = targets[i]
+        if employee_options[e] > num_targets and target_options[t] > number_needed[t]:
+            employee_options[e] -= 1
+            target_options[t] -= 1
+            keep[i] = False
+    return employees[keep], targets[keep]
@@ -0,0 +1,258 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import Counter, namedtuple, OrderedDict
+from functools import partial
+import hmac
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+
+from lsgraph import models
+from lsgraph.models._shared import run_after_commit
+from lsgraph.utils.access_key import AccessKey
+
+CachedCustomer = namedtuple("CachedCustomer", ["id", "name", "email"])
+CachedOrganization = namedtuple(
+    "CachedOrganization", ["id", "name", "customer_id", "root_skill_id"]
+)
+Credentials = namedtuple("Credentials", ["secret_key", "customer", "organizations"])
+
+
+class CredentialCache:
+    """Credentials of API access keys kept in process memory
+
+    Entries hold the secret key, the customer and its organizations by
+    ID string. They are discarded when a change to the access key or one
+    of the customer's organizations is committed in this process, or
+    after ACCESS_KEY_CACHE_TTL seconds, which bounds how stale an entry
+    can be when another process changes them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.credentials = {}
+        self.loaded_at = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, access_key):
+        """Return the cached credentials of access_key"""
+        credentials = self.credentials.get(access_key)
+        ttl = current_app.config["ACCESS_KEY_CACHE_TTL"]
+        if credentials is not None and (
+            time.monotonic() - self.loaded_at.get(access_key, 0) > ttl
+        ):
+            self.invalidate(access_key)
+            credentials = None
+        if credentials is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return credentials
+
+    def age(self, access_key):
+        """Seconds since the credentials of access_key were loaded
+
+        None when they are not cached"""
+        loaded_at = self.loaded_at.get(access_key)
+        if loaded_at is None:
+            return None
+        return time.monotonic() - loaded_at
+
+    def add(self, access_key, credentials):
+        with self.lock:
+            self.credentials[access_key] = credentials
+            self.loaded_at[access_key] = time.monotonic()
+
+    def invalidate(self, access_key):
+        with self.lock:
+            self.credentials.pop(access_key, None)
+            self.loaded_at.pop(access_key, None)
+
+    def invalidate_customer(self, customer_id):
+        """Drop the credentials of every access key of a customer"""
+        with self.lock:
+            for access_key, credentials in list(self.credentials.items()):
+                if credentials.customer.id == customer_id:
+                    del self.credentials[access_key]
+                    self.loaded_at.pop(access_key, None)
+
+    def clear(self):
+        with self.lock:
+            self.credentials.clear()
+            self.loaded_at.clear()
+
+    def stats(self):
+        """Hit and miss counts since the process started"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.credentials)}
+
+
+credential_cache = CredentialCache()
+
+
+class RejectedKeyCache:
+    """Access keys recently found not to exist
+
+    Holds at most ACCESS_KEY_REJECTED_CACHE_SIZE keys, dropping the
+    least recently rejected first, each for ACCESS_KEY_REJECTED_CACHE_TTL
+    seconds. Repeated requests with an unknown key are rejected without
+    a query."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rejected_at = OrderedDict()
+
+    def __contains__(self, access_key):
+        rejected_at = self.rejected_at.get(access_key)
+        if rejected_at is None:
+            return False
+        ttl = current_app.config["ACCESS_KEY_REJECTED_CACHE_TTL"]
+        if time.monotonic() - rejected_at > ttl:
+            self.discard(access_key)
+            return False
+        return True
+
+    def add(self, access_key):
+        size = current_app.config["ACCESS_KEY_REJECTED_CACHE_SIZE"]
+        with self.lock:
+            self.rejected_at.pop(access_key, None)
+            self.rejected_at[access_key] = time.monotonic()
+            while len(self.rejected_at) > size:
+                self.rejected_at.popitem(last=False)
+
+    def discard(self, access_key):
+        with self.lock:
+            self.rejected_at.pop(access_key, None)
+
+    def clear(self):
+        with self.lock:
+            self.rejected_at.clear()
+
+
+rejected_key_cache = RejectedKeyCache()
+# Rejected requests by the stage that rejected them
+rejections = Counter()
+
+
+def query_credentials(access_key):
+    """Load the credentials of access_key, None for unknown keys"""
+    record = models.AccessKey.query.filter_by(access_key=access_key).first()
+    if record is None:
+        return None
+    customer = models.Customer.query.filter_by(id=record.customer_id).one()
+    organizations = models.Organization.query.filter_by(customer_id=customer.id)
+    return Credentials(
+        record.secret_key,
+        CachedCustomer(customer.id, customer.name, customer.email),
+        {
+            str(i.id): CachedOrganization(i.id, i.name, i.customer_id, i.root_skill_id)
+            for i in organizations
+        },
+    )
+
+
+def get_credentials(access_key):
+    """Get the credentials of access_key, None for unknown keys
+
+    Unknown keys are remembered in the rejected key cache"""
+    credentials = credential_cache.get(access_key)
+    if credentials is None:
+        if access_key in rejected_key_cache:
+            rejections["rejected_cache"] += 1
+            return None
+        credentials = query_credentials(access_key)
+        if credentials is None:
+            rejections["database"] += 1
+            rejected_key_cache.add(access_key)
+            return None
+        credential_cache.add(access_key, credentials)
+    return credentials
+
+
+def authenticate(access_key, access_secret):
+    """Get the credentials of a key pair, None when it is rejected
+
+    Pairs are checked in order of cost: the checksum of the pair, the
+    rejected key cache, the credential cache and last the database."""
+    if not AccessKey(current_app.config["SECRET_KEY"]).validate_pair(
+        access_key, access_secret
+    ):
+        rejections["checksum"] += 1
+        return None
+    credentials = get_credentials(access_key)
+    if credentials is None:
+        return None
+    if not hmac.compare_digest(credentials.secret_key.encode(), access_secret.encode()):
+        rejections["secret"] += 1
+        return None
+    return credentials
+
+
+def reload_credentials(access_key):
+    """Load the credentials of access_key bypassing the cache
+
+    Used when the cached credentials may be stale, for example when
+    another process added an organization. The cache is updated with the
+    result. Credentials loaded less than ACCESS_KEY_RELOAD_INTERVAL
+    seconds ago are returned from the cache, so that requests for
+    organizations the customer does not own can't each cause a query."""
+    age = credential_cache.age(access_key)
+    if age is not None and age < current_app.config["ACCESS_KEY_RELOAD_INTERVAL"]:
+        return credential_cache.credentials.get(access_key)
+    credentials = query_credentials(access_key)
+    if credentials is None:
+        credential_cache.invalidate(access_key)
+        rejected_key_cache.add(access_key)
+    else:
+        credential_cache.add(access_key, credentials)
+    return credentials
+
+
+def forget_access_key(access_key):
+    credential_cache.invalidate(access_key)
+    rejected_key_cache.discard(access_key)
+
+
+def clear_credentials():
+    credential_cache.clear()
+    rejected_key_cache.clear()
+
+
+@event.listens_for(models.AccessKey, "after_insert")
+@event.listens_for(models.AccessKey, "after_delete")
+def invalidate_access_key(mapper, connection, target):
+    """Drop the cached credentials of an added or revoked access key"""
+    run_after_commit(target, partial(forget_access_key, target.access_key))
+
+
+@event.listens_for(models.Organization, "after_insert")
+@event.listens_for(models.Organization, "after_delete")
+def invalidate_organization(mapper, connection, target):
+    """Drop cached credentials of the customer of an organization"""
+    run_after_commit(
+        target, partial(credential_cache.invalidate_customer, target.customer_id)
+    )
+
+
+@event.listens_for(models.AccessKey, "after_update")
+@event.listens_for(models.Organization, "after_update")
+def invalidate_credentials(mapper, connection, target):
+    """Drop every cached credential
+
+    Updates can move keys and organizations between customers, they
+    are rare enough for the whole cache to be reloaded"""
+    run_after_commit(target, clear_credentials)
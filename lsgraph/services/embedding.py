@@ -0,0 +1,218 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import Counter, OrderedDict
+import hashlib
+import math
+import threading
+import zlib
+
+from flask import current_app
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from lsgraph import models
+from lsgraph.models import db
+
+
+class UniversalSentenceEncoder:
+    """Universal Sentence Encoder loaded from TensorFlow Hub
+
+    The model is downloaded on first load unless it is already in the
+    TensorFlow Hub cache."""
+
+    name = "universal-sentence-encoder"
+
+    def __init__(self, url="https://tfhub.dev/google/universal-sentence-encoder/4"):
+        import tensorflow_hub
+
+        self.version = url
+        self.model = tensorflow_hub.load(url)
+
+    def __call__(self, texts):
+        return np.asarray(self.model(list(texts)), dtype=np.float32)
+
+
+class HashingEncoder:
+    """Character n-gram encoder that runs locally with NumPy
+
+    Words and character n-grams are weighted by 1 + log(count) and hashed
+    straight into a sparse random projection, each feature adding +1 or -1
+    to `density` of the output dimensions picked by its hash. No vocabulary
+    or download is needed and the output only depends on the seed. Vectors
+    are L2 normalized."""
+
+    name = "hashing"
+
+    def __init__(self, dimensions=512, ngram_range=(2, 4), density=4, seed=0):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.version = "hashing-{}-{}-{}-{}-{}".format(
+            dimensions, ngram_range[0], ngram_range[1], density, seed
+        )
+        rng = np.random.default_rng(seed)
+        # Odd multipliers for multiply-shift hashing of the feature hashes
+        self.multipliers = rng.integers(
+            0, 2**64 - 1, size=density, dtype=np.uint64, endpoint=True
+        ) | np.uint64(1)
+        self.offsets = rng.integers(
+            0, 2**64 - 1, size=density, dtype=np.uint64, endpoint=True
+        )
+
+    def features(self, text):
+        """Words and character n-grams of text"""
+        words = text.lower().split()
+        if not words:
+            return []
+        text = " ".join(words)
+        output = ["w:" + i for i in words]
+        padded = " " + text + " "
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            output.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+        return output
+
+    def __call__(self, texts):
+        texts = list(texts)
+        rows = []
+        hashes = []
+        weights = []
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self.features(text)).items():
+                rows.append(row)
+                hashes.append(zlib.crc32(feature.encode("utf-8")))
+                weights.append(1 + math.log(count))
+        size = len(texts) * self.dimensions
+        if not rows:
+            return np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        hashes = np.array(hashes, dtype=np.uint64)[:, None]
+        with np.errstate(over="ignore"):
+            mixed = hashes * self.multipliers + self.offsets
+        columns = (mixed >> np.uint64(32)) % np.uint64(self.dimensions)
+        signs = 1.0 - 2.0 * ((mixed >> np.uint64(31)) & np.uint64(1))
+        flat = np.array(rows, dtype=np.int64)[:, None] * self.dimensions
+        flat = flat + columns.astype(np.int64)
+        output = np.bincount(
+            flat.ravel(),
+            weights=(signs * np.array(weights)[:, None]).ravel(),
+            minlength=size,
+        ).reshape(len(texts), self.dimensions)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return (output / norms).astype(np.float32)
+
+
+EMBEDDERS = {i.name: i for i in (UniversalSentenceEncoder, HashingEncoder)}
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(name=None):
+    """Get the embedder selected by SKILL_EMBEDDER, loading it on first use
+
+    Embeddings from different backends are not comparable, so existing
+    embeddings must be regenerated after changing SKILL_EMBEDDER."""
+    if name is None:
+        name = current_app.config["SKILL_EMBEDDER"]
+    embedder = _embedders.get(name)
+    if embedder is None:
+        with _embedders_lock:
+            embedder = _embedders.get(name)
+            if embedder is None:
+                embedder = EMBEDDERS[name]()
+                _embedders[name] = embedder
+    return embedder
+
+
+class EmbeddingLRU:
+    """Least recently used embeddings kept in process memory
+
+    Holds at most SKILL_EMBEDDING_CACHE_SIZE embeddings"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get_many(self, keys):
+        output = {}
+        with self.lock:
+            for key in keys:
+                value = self.items.get(key)
+                if value is not None:
+                    self.items.move_to_end(key)
+                    output[key] = value
+        return output
+
+    def put_many(self, items):
+        size = current_app.config["SKILL_EMBEDDING_CACHE_SIZE"]
+        with self.lock:
+            for key, value in items.items():
+                self.items[key] = value
+                self.items.move_to_end(key)
+            while len(self.items) > size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+embedding_lru = EmbeddingLRU()
+
+
+def embedding_key(version, text):
+    """Content address of text encoded by the embedder version"""
+    return hashlib.sha256(
+        version.encode("utf-8") + b"\0" + text.encode("utf-8")
+    ).hexdigest()
+
+
+def embed_texts(texts, embedder=None):
+    """Embed texts, only running the embedder for texts not seen before
+
+    Embeddings are looked up in the in-process LRU, then the
+    embedding_cache table. New embeddings are added to both, the table
+    rows are committed with the caller's transaction."""
+    if embedder is None:
+        embedder = get_embedder()
+    keys = [embedding_key(embedder.version, i) for i in texts]
+    found = embedding_lru.get_many(keys)
+    missing = [i for i in dict.fromkeys(keys) if i not in found]
+    if missing:
+        rows = (
+            db.session.query(models.EmbeddingCache.key, models.EmbeddingCache.embedding)
+            .filter(models.EmbeddingCache.key.in_(missing))
+            .all()
+        )
+        stored = dict(rows)
+        embedding_lru.put_many(stored)
+        found.update(stored)
+    new_texts = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            new_texts[key] = text
+    if new_texts:
+        vectors = embedder(list(new_texts.values()))
+        new = dict(zip(new_texts, vectors))
+        db.session.execute(
+            insert(models.EmbeddingCache.__table__).on_conflict_do_nothing(),
+            [{"key": key, "embedding": value} for key, value in new.items()],
+        )
+        embedding_lru.put_many(new)
+        found.update(new)
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([found[i] for i in keys])
@@ -0,0 +1,196 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+from flask import current_app
+import numpy as np
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.organization import get_skill_data_version
+
+
+class EmbeddingStore:
+    """Skill embeddings of an organization mapped read-only from disk
+
+    A store directory holds ids.npy, the 16 byte skill UUIDs, and
+    embeddings.npy, the float32 embedding of each skill. Every process
+    maps the same files, so pages are shared rather than copied."""
+
+    def __init__(self, path):
+        self.path = path
+        ids = np.load(os.path.join(path, "ids.npy"))
+        self.index = {uuid.UUID(bytes=j.tobytes()): i for i, j in enumerate(ids)}
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.index)
+
+    def rows(self, skill_ids):
+        """float64 embedding matrix for skill_ids
+
+        Skills without an embedding in the store become rows of NaN"""
+        positions = np.array([self.index.get(i, -1) for i in skill_ids], dtype=np.intp)
+        output = np.full((len(skill_ids), self.embeddings.shape[1]), np.nan)
+        found = positions >= 0
+        output[found] = self.embeddings[positions[found]]
+        return output
+
+
+def store_path(directory, org_id, version):
+    """Directory of an organization's store for a skill data version"""
+    return os.path.join(directory, str(org_id), str(version))
+
+
+def publish_embedding_store(path, skill_ids, embeddings):
+    """Write a store to path
+
+    Files are written to a temporary directory that is renamed into
+    place, so readers never see a partial store. When another process
+    published the same path first its store is kept."""
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    temp_path = tempfile.mkdtemp(dir=parent, prefix=".publish-")
+    try:
+        ids = np.array([i.bytes for i in skill_ids], dtype="V16").view(np.uint8)
+        np.save(os.path.join(temp_path, "ids.npy"), ids.reshape(-1, 16))
+        np.save(
+            os.path.join(temp_path, "embeddings.npy"),
+            np.asarray(embeddings, dtype="<f4"),
+        )
+        os.rename(temp_path, path)
+    except OSError:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def remove_old_stores(directory, org_id, version):
+    """Remove an organization's stores older than version
+
+    Processes that still map an old store keep their open files"""
+    org_path = os.path.join(directory, str(org_id))
+    for name in os.listdir(org_path):
+        if name.isdigit() and int(name) < version:
+            shutil.rmtree(os.path.join(org_path, name), ignore_errors=True)
+
+
+def remove_deleted_stores(directory):
+    """Remove the stores of organizations that no longer exist"""
+    names = {}
+    for name in os.listdir(directory):
+        try:
+            names[uuid.UUID(name)] = name
+        except ValueError:
+            continue
+    if not names:
+        return
+    existing = {
+        i
+        for i, in db.session.query(models.Organization.id).filter(
+            models.Organization.id.in_(list(names))
+        )
+    }
+    for org_id, name in names.items():
+        if org_id not in existing:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class EmbeddingStoreCache:
+    """Stores mapped by this process, one per organization
+
+    Each store is tagged with the skill data version it was published
+    for and is only returned for that version."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stores = {}
+
+    def get(self, org_id, version):
+        version_store = self.stores.get(org_id)
+        if version_store is None or version_store[0] != version:
+            return None
+        return version_store[1]
+
+    def add(self, org_id, version, store):
+        with self.lock:
+            self.stores[org_id] = (version, store)
+
+    def clear(self):
+        with self.lock:
+            self.stores.clear()
+
+
+embedding_store_cache = EmbeddingStoreCache()
+
+
+def query_embedding_rows(org_id):
+    """Get (skill_id, embedding) of the skills of an organization's profiles"""
+    skill_ids = (
+        db.session.query(models.ProfileSkill.skill_id)
+        .join(models.Profile, models.Profile.id == models.ProfileSkill.profile_id)
+        .filter(models.Profile.organization_id == org_id)
+    )
+    return (
+        db.session.query(models.Skill.id, models.Skill.skill_embedding)
+        .filter(models.Skill.id.in_(skill_ids.subquery().select()))
+        .filter(models.Skill.skill_embedding.isnot(None))
+        .all()
+    )
+
+
+def get_embedding_store(org_id):
+    """Get the embedding store of an organization
+
+    The store for the organization's current skill data version is
+    mapped when another process already published it, otherwise it is
+    built from the database and published for the other processes.
+
+    Stores give the distances between skills whose stored neighbor
+    lists were cut at SKILL_NEIGHBOR_LIMIT, and every distance when the
+    skill neighbor table does not cover the multiplier threshold."""
+    org_id = uuid.UUID(str(org_id))
+    version = get_skill_data_version(org_id)
+    store = embedding_store_cache.get(org_id, version)
+    if store is not None:
+        return store
+    directory = current_app.config["SKILL_EMBEDDING_STORE_DIR"]
+    for attempt in range(3):
+        path = store_path(directory, org_id, version)
+        if not os.path.isdir(path):
+            rows = query_embedding_rows(org_id)
+            # One column when nothing is embedded, so that rows are still NaN
+            dimensions = len(rows[0][1]) if rows else 1
+            embeddings = np.zeros((len(rows), dimensions), dtype="<f4")
+            for i, (_, embedding) in enumerate(rows):
+                embeddings[i] = embedding
+            publish_embedding_store(path, [i for i, _ in rows], embeddings)
+            remove_old_stores(directory, org_id, version)
+            remove_deleted_stores(directory)
+        try:
+            store = EmbeddingStore(path)
+            break
+        except FileNotFoundError:
+            # Removed by a process that published a newer version
+            if attempt == 2:
+                raise
+            version = get_skill_data_version(org_id)
+    embedding_store_cache.add(org_id, version, store)
+    return store
@@ -0,0 +1,90 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+
+def embedding_matrix(embeddings):
+    """Stack embeddings into a contiguous float64 matrix
+
+    Missing embeddings become rows of NaN"""
+    # One column when nothing is embedded, so that rows are still NaN
+    dimensions = next((len(i) for i in embeddings if i is not None), 1)
+    output = np.full((len(embeddings), dimensions), np.nan)
+    for row, embedding in enumerate(embeddings):
+        if embedding is not None:
+            output[row] = embedding
+    return output
+
+
+def pairwise_distances(a, b):
+    """Euclidean distances between the rows of a and b
+
+    Expands |a - b|^2 = |a|^2 + |b|^2 - 2 a.b so that the work is a
+    single matrix product"""
+    squared = np.einsum("ij,ij->i", a, a)[:, None] + np.einsum("ij,ij->i", b, b)
+    squared -= 2 * (a @ b.T)
+    np.maximum(squared, 0, out=squared)
+    return np.sqrt(squared)
+
+
+def learning_multipliers(distances, threshold, baseline, offset, power):
+    """Convert embedding distances to learning speed multipliers
+
+    Distances above threshold, or NaN for missing embeddings, give the
+    baseline multiplier"""
+    output = ((offset - distances) / offset) ** power
+    output[~(distances <= threshold)] = baseline
+    return output
+
+
+def top_k_positions(values, k):
+    """Positions of the k largest values in each row, largest first
+
+    Equal values are ordered by position, so the selection matches a
+    stable descending sort of each row. Selection uses argpartition and
+    only the k chosen values are sorted."""
+    rows, columns = values.shape
+    k = min(k, columns)
+    if k == 0:
+        return np.zeros((rows, 0), dtype=np.intp)
+    if k < columns:
+        kth = -np.partition(-values, k - 1, axis=1)[:, k - 1 : k]
+        greater = values > kth
+        # Fill the remaining places with the first values equal to the kth
+        remaining = k - greater.sum(axis=1, keepdims=True)
+        equal = values == kth
+        chosen = greater | (equal & (np.cumsum(equal, axis=1) <= remaining))
+        positions = np.nonzero(chosen)[1].reshape(rows, k)
+    else:
+        positions = np.broadcast_to(np.arange(columns), (rows, columns))
+    order = np.argsort(
+        -np.take_along_axis(values, positions, axis=1), axis=1, kind="stable"
+    )
+    return np.take_along_axis(positions, order, axis=1)
+
+
+def reduce_gaps(gaps, target_levels, source_levels, multipliers, levels, max_gap):
+    """Reduce skill gaps by the learning multipliers of close skills
+
+    Row i of multipliers and levels holds the multipliers and source skill
+    levels of the close skills for gap i, in the order they are applied"""
+    output = gaps.astype(float)
+    level_multipliers = np.minimum(target_levels[:, None], levels)
+    level_multipliers -= np.minimum(source_levels[:, None], levels)
+    level_multipliers /= max_gap
+    for column in range(multipliers.shape[1]):
+        output -= multipliers[:, column] * output * level_multipliers[:, column]
+    return output
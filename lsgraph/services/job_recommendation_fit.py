@@ -0,0 +1,162 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from lsgraph import models
+from lsgraph.models import db
+
+
+def get_fit_profiles(org_id):
+    """Get the user profiles and target profiles of the fit table
+
+    Targets are the profiles of the JOB_RECOMMENDATION_FIT_PROFILE_TYPES"""
+    query = models.Profile.query.filter_by(organization_id=org_id)
+    user_profiles = query.filter(models.Profile.user_id.isnot(None)).all()
+    types = current_app.config["JOB_RECOMMENDATION_FIT_PROFILE_TYPES"]
+    target_profiles = query.filter(models.Profile.type.in_(types)).all()
+    return user_profiles, target_profiles
+
+
+def store_fits(org_id, user_profile_ids, profile_ids, distances, fits, computed_at):
+    """Store the fit of every user profile to every target profile
+
+    distances and fits are (user profiles, targets) matrices computed from
+    skills read at computed_at. Rows marked stale after computed_at are
+    kept stale"""
+    table = models.JobRecommendationFit.__table__
+    rows = [
+        {
+            "user_profile_id": user_profile_id,
+            "profile_id": profile_id,
+            "organization_id": org_id,
+            "distance": float(distances[i, j]),
+            "fit": float(fits[i, j]),
+            "computed_at": computed_at,
+            "stale_at": None,
+        }
+        for i, user_profile_id in enumerate(user_profile_ids)
+        for j, profile_id in enumerate(profile_ids)
+    ]
+    if not rows:
+        return
+    statement = insert(table)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.user_profile_id, table.c.profile_id],
+            set_={
+                "distance": statement.excluded.distance,
+                "fit": statement.excluded.fit,
+                "computed_at": statement.excluded.computed_at,
+                "stale_at": None,
+            },
+            where=db.or_(
+                table.c.stale_at.is_(None),
+                table.c.stale_at <= statement.excluded.computed_at,
+            ),
+        ),
+        rows,
+    )
+
+
+def delete_other_fits(org_id, user_profile_ids, profile_ids):
+    """Delete fits of the organization between profiles not listed"""
+    fit = models.JobRecommendationFit
+    db.session.query(fit).filter(fit.organization_id == org_id).filter(
+        db.or_(
+            fit.user_profile_id.notin_(user_profile_ids),
+            fit.profile_id.notin_(profile_ids),
+        )
+    ).delete(synchronize_session=False)
+
+
+def delete_profile_fits(profile_ids):
+    """Delete the fits from or to profile_ids"""
+    fit = models.JobRecommendationFit
+    db.session.query(fit).filter(
+        db.or_(fit.user_profile_id.in_(profile_ids), fit.profile_id.in_(profile_ids))
+    ).delete(synchronize_session=False)
+
+
+def mark_profiles_stale(profile_ids):
+    """Mark the fits from or to profile_ids as stale
+
+    Called with the caller's transaction whenever profile skills change"""
+    fit = models.JobRecommendationFit
+    db.session.query(fit).filter(
+        db.or_(fit.user_profile_id.in_(profile_ids), fit.profile_id.in_(profile_ids))
+    ).update({"stale_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def mark_skills_stale(skill_ids):
+    """Mark fits stale when the embeddings of skill_ids change
+
+    Profiles with the skills or with their neighbors are affected, as
+    neighbors speed up learning"""
+    neighbor = models.SkillNeighbor
+    neighbor_ids = (
+        db.session.query(neighbor.neighbor_id)
+        .filter(neighbor.skill_id.in_(skill_ids))
+        .union(
+            db.session.query(neighbor.skill_id).filter(
+                neighbor.neighbor_id.in_(skill_ids)
+            )
+        )
+    )
+    profile_ids = (
+        db.session.query(models.ProfileSkill.profile_id)
+        .filter(
+            db.or_(
+                models.ProfileSkill.skill_id.in_(skill_ids),
+                models.ProfileSkill.skill_id.in_(neighbor_ids.subquery().select()),
+            )
+        )
+        .distinct()
+    )
+    mark_profiles_stale(profile_ids.subquery().select())
+
+
+def get_stale_fits(org_id):
+    """Get (user_profile_id, profile_id) of the organization's stale fits"""
+    fit = models.JobRecommendationFit
+    return (
+        db.session.query(fit.user_profile_id, fit.profile_id)
+        .filter(fit.organization_id == org_id)
+        .filter(fit.stale_at.isnot(None))
+        .all()
+    )
+
+
+def get_fresh_fits(user_profile_id, profile_ids, max_age):
+    """Get {profile_id: (distance, fit)} of a user profile
+
+    Returns None unless every profile has a fit that is not stale and was
+    computed at most max_age seconds ago"""
+    fit = models.JobRecommendationFit
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    rows = (
+        db.session.query(fit.profile_id, fit.distance, fit.fit)
+        .filter(fit.user_profile_id == user_profile_id)
+        .filter(fit.profile_id.in_(profile_ids))
+        .filter(fit.stale_at.is_(None))
+        .filter(fit.computed_at >= cutoff)
+        .all()
+    )
+    if len(rows) != len(set(profile_ids)):
+        return None
+    return {i: (j, k) for i, j, k in rows}
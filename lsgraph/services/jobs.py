@@ -0,0 +1,138 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import hashlib
+import json
+import zlib
+
+from flask import current_app
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.organization import get_skill_data_version
+
+
+def parameters_hash(kind, parameters, version=None):
+    """Hash of a job's kind, JSON parameters and the skill data version it
+    is computed from, independent of key order"""
+    text = json.dumps(
+        [kind, parameters, version], sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_result(result):
+    return zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+
+
+def decompress_result(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def submit_job(org_id, kind, parameters):
+    """Get a job computing kind with parameters, creating it if needed
+
+    A job with the same parameters hash created within JOB_REUSE_TTL
+    seconds is reused unless it failed. The hash includes the
+    organization's skill data version, so jobs submitted after profile
+    skills or embeddings change are not answered with stale results.
+    Returns (job, created), the caller queues the tasks of new jobs."""
+    digest = parameters_hash(kind, parameters, get_skill_data_version(org_id))
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config["JOB_REUSE_TTL"])
+    job = (
+        models.Job.query.filter_by(
+            organization_id=org_id, kind=kind, parameters_hash=digest
+        )
+        .filter(models.Job.status != "failure")
+        .filter(models.Job.created_at >= cutoff)
+        .order_by(models.Job.created_at.desc())
+        .first()
+    )
+    if job is not None:
+        return job, False
+    job = models.Job(
+        organization_id=org_id,
+        kind=kind,
+        parameters=parameters,
+        parameters_hash=digest,
+        created_at=datetime.utcnow(),
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job, True
+
+
+def get_job(job_id, org_id, kind):
+    """Get a job of an organization, None if there is no such job"""
+    return models.Job.query.filter_by(
+        id=job_id, organization_id=org_id, kind=kind
+    ).first()
+
+
+def start_job(job_id):
+    """Mark a pending job as running"""
+    models.Job.query.filter_by(id=job_id, status="pending").update(
+        {"status": "running", "started_at": datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def advance_job(job_id, amount):
+    """Add amount to the progress of a job
+
+    The increment is done by the database so that concurrent tasks of the
+    same job do not overwrite each other's progress"""
+    models.Job.query.filter_by(id=job_id).update(
+        {"progress": db.func.least(models.Job.progress + amount, 1)},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def finish_job(job_id, result):
+    """Store the result of a job and mark it as succeeded"""
+    models.Job.query.filter_by(id=job_id).update(
+        {
+            "status": "success",
+            "progress": 1,
+            "result": compress_result(result),
+            "finished_at": datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def fail_job(job_id, error):
+    """Mark a job as failed so that it is not reused"""
+    models.Job.query.filter_by(id=job_id).update(
+        {"status": "failure", "error": error, "finished_at": datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+@contextmanager
+def recording_failure(job_id):
+    """Mark the job as failed when the enclosed task raises"""
+    try:
+        yield
+    except Exception as error:
+        db.session.rollback()
+        fail_job(job_id, repr(error))
+        raise
@@ -0,0 +1,52 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.skill_tree import query_root_ids
+
+
+def get_skill_data_version(org_id):
+    """Current skill data version of an organization"""
+    return (
+        db.session.query(models.Organization.skill_data_version)
+        .filter(models.Organization.id == org_id)
+        .scalar()
+    )
+
+
+def bump_skill_data_version(org_ids):
+    """Mark results derived from the organizations' skill data as stale
+
+    Called with the caller's transaction whenever profile skills or skill
+    embeddings change"""
+    org_ids = list(org_ids)
+    if not org_ids:
+        return
+    models.Organization.query.filter(models.Organization.id.in_(org_ids)).update(
+        {"skill_data_version": models.Organization.skill_data_version + 1},
+        synchronize_session=False,
+    )
+
+
+def get_skill_organizations(skill_ids):
+    """IDs of the organizations whose skill graphs contain skill_ids"""
+    roots = set(query_root_ids(skill_ids).values()) | set(skill_ids)
+    return [
+        i
+        for i, in db.session.query(models.Organization.id).filter(
+            models.Organization.root_skill_id.in_(roots)
+        )
+    ]
@@ -0,0 +1,147 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import threading
+import uuid
+
+from flask import current_app
+import numpy as np
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.organization import get_skill_data_version
+
+
+class ProfileSkillMatrix:
+    """Skill levels of an organization's profiles in CSR form
+
+    Row i holds the skills of profile_ids[i], columns[indptr[i] :
+    indptr[i + 1]] are their positions in skill_ids and levels holds the
+    matching levels. The skills of a profile keep the order in which they
+    were loaded."""
+
+    def __init__(self, rows):
+        """Build from (profile_id, skill_id, level) rows"""
+        self.profile_ids = _object_array(dict.fromkeys(i for i, _, _ in rows))
+        self.skill_ids = _object_array(dict.fromkeys(j for _, j, _ in rows))
+        self.profile_index = {j: i for i, j in enumerate(self.profile_ids)}
+        self.skill_index = {j: i for i, j in enumerate(self.skill_ids)}
+        profile_rows = np.fromiter(
+            (self.profile_index[i] for i, _, _ in rows), dtype=np.int32, count=len(rows)
+        )
+        order = np.argsort(profile_rows, kind="stable")
+        columns = np.fromiter(
+            (self.skill_index[j] for _, j, _ in rows), dtype=np.int32, count=len(rows)
+        )
+        self.columns = columns[order]
+        self.levels = np.array([k for _, _, k in rows], dtype=float)[order]
+        self.indptr = np.zeros(len(self.profile_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(profile_rows, minlength=len(self.profile_ids)),
+            out=self.indptr[1:],
+        )
+
+    def __contains__(self, profile_id):
+        return profile_id in self.profile_index
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def _row(self, profile_id):
+        position = self.profile_index.get(profile_id)
+        if position is None:
+            return slice(0, 0)
+        return slice(self.indptr[position], self.indptr[position + 1])
+
+    def skills(self, profile_id):
+        """{skill_id: level} of a profile, empty for profiles without skills"""
+        row = self._row(profile_id)
+        return dict(
+            zip(self.skill_ids[self.columns[row]].tolist(), self.levels[row].tolist())
+        )
+
+    def profile_skill_ids(self, profile_ids):
+        """IDs of the skills of any of profile_ids"""
+        columns = [self.columns[self._row(i)] for i in profile_ids]
+        columns = np.unique(np.concatenate([np.zeros(0, dtype=np.int32)] + columns))
+        return self.skill_ids[columns].tolist()
+
+
+def _object_array(values):
+    output = np.empty(len(values), dtype=object)
+    output[:] = list(values)
+    return output
+
+
+class ProfileMatrixCache:
+    """Per-organization profile skill matrices kept in process memory
+
+    Each matrix is tagged with the organization's skill data version it
+    was built from and is only returned for that version, so a change in
+    any process invalidates it. At most PROFILE_MATRIX_CACHE_SIZE
+    organizations are kept, dropping the least recently used first."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.matrices = OrderedDict()
+
+    def get(self, org_id, version):
+        with self.lock:
+            version_matrix = self.matrices.get(org_id)
+            if version_matrix is None or version_matrix[0] != version:
+                return None
+            self.matrices.move_to_end(org_id)
+            return version_matrix[1]
+
+    def add(self, org_id, version, matrix):
+        size = current_app.config["PROFILE_MATRIX_CACHE_SIZE"]
+        with self.lock:
+            self.matrices[org_id] = (version, matrix)
+            self.matrices.move_to_end(org_id)
+            while len(self.matrices) > size:
+                self.matrices.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.matrices.clear()
+
+
+profile_matrix_cache = ProfileMatrixCache()
+
+
+def query_profile_skill_rows(org_id):
+    """Get (profile_id, skill_id, level) of every profile skill of an organization"""
+    skill = models.ProfileSkill
+    return (
+        db.session.query(skill.profile_id, skill.skill_id, skill.level)
+        .join(models.Profile, models.Profile.id == skill.profile_id)
+        .filter(models.Profile.organization_id == org_id)
+        .all()
+    )
+
+
+def get_profile_matrix(org_id):
+    """Get the profile skill matrix of an organization
+
+    The cached matrix is used while the organization's skill data version
+    is unchanged"""
+    org_id = uuid.UUID(str(org_id))
+    version = get_skill_data_version(org_id)
+    matrix = profile_matrix_cache.get(org_id, version)
+    if matrix is None:
+        matrix = ProfileSkillMatrix(query_profile_skill_rows(org_id))
+        profile_matrix_cache.add(org_id, version, matrix)
+    return matrix
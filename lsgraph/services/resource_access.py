@@ -0,0 +1,142 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from sqlalchemy import union
+from sqlalchemy.dialects.postgresql import insert
+import uuid
+
+from lsgraph import models
+from lsgraph.models import db
+
+
+def query_access(user_ids, resource_ids=None):
+    """Select (user_id, resource_id) of the resources users can access
+
+    Access is through collections users are members of, directly or
+    through a group. With resource_ids only those resources are selected."""
+    member = models.CollectionMember
+    group_member = models.GroupMember
+    resource = models.CollectionResource
+    direct = (
+        db.select(member.user_id, resource.resource_id)
+        .join(resource, resource.collection_id == member.collection_id)
+        .where(member.user_id.in_(user_ids))
+    )
+    grouped = (
+        db.select(group_member.user_id, resource.resource_id)
+        .join(member, member.group_id == group_member.group_id)
+        .join(resource, resource.collection_id == member.collection_id)
+        .where(group_member.user_id.in_(user_ids))
+    )
+    if resource_ids is not None:
+        direct = direct.where(resource.resource_id.in_(resource_ids))
+        grouped = grouped.where(resource.resource_id.in_(resource_ids))
+    return union(direct, grouped)
+
+
+def lock_resource_access(org_id):
+    """Serialize changes to an organization's resource access until the
+    transaction ends
+
+    Take it before reading the members whose access a change affects,
+    so that concurrent changes see each other's committed rows"""
+    key = int.from_bytes(uuid.UUID(str(org_id)).bytes[:8], "big", signed=True)
+    db.session.execute(db.select([db.func.pg_advisory_xact_lock(key)]))
+
+
+def refresh_user_access(org_id, user_ids, group_ids=()):
+    """Rebuild the user resource access rows of user_ids and the members
+    of group_ids
+
+    Must be called with the caller's transaction whenever collection
+    members or group members change, with every user whose access may
+    have changed"""
+    lock_resource_access(org_id)
+    db.session.flush()
+    user_ids = set(user_ids)
+    if group_ids:
+        user_ids.update(get_group_users(group_ids))
+    if not user_ids:
+        return
+    user_ids = list(user_ids)
+    access = models.UserResourceAccess
+    access.query.filter(access.user_id.in_(user_ids)).delete(synchronize_session=False)
+    db.session.execute(
+        insert(access.__table__)
+        .from_select(["user_id", "resource_id"], query_access(user_ids))
+        .on_conflict_do_nothing()
+    )
+
+
+def add_collection_access(org_id, collection_id, resource_ids):
+    """Give the users of a collection access to resources added to it
+
+    Only the new (user, resource) pairs are written, the access of the
+    users to other resources is unchanged"""
+    lock_resource_access(org_id)
+    db.session.flush()
+    rows = [
+        {"user_id": i, "resource_id": j}
+        for i in set(get_collection_users([collection_id]))
+        for j in set(resource_ids)
+    ]
+    if rows:
+        db.session.execute(
+            insert(models.UserResourceAccess.__table__).on_conflict_do_nothing(), rows
+        )
+
+
+def remove_collection_access(org_id, collection_id, resource_ids):
+    """Remove access to resources removed from a collection
+
+    Users keep access to the resources they still reach through another
+    collection"""
+    lock_resource_access(org_id)
+    db.session.flush()
+    user_ids = list(set(get_collection_users([collection_id])))
+    if not user_ids or not resource_ids:
+        return
+    access = models.UserResourceAccess
+    reachable = query_access(user_ids, resource_ids).subquery().select()
+    stale = (
+        access.query.filter(access.user_id.in_(user_ids))
+        .filter(access.resource_id.in_(resource_ids))
+        .filter(db.tuple_(access.user_id, access.resource_id).notin_(reachable))
+    )
+    stale.delete(synchronize_session=False)
+
+
+def get_group_users(group_ids):
+    """IDs of the members of groups"""
+    group_member = models.GroupMember
+    return [
+        i
+        for i, in db.session.query(group_member.user_id).filter(
+            group_member.group_id.in_(group_ids), group_member.user_id.isnot(None)
+        )
+    ]
+
+
+def get_collection_users(collection_ids):
+    """IDs of the users that are members of collections, directly or through
+    a group"""
+    member = models.CollectionMember
+    members = (
+        db.session.query(member.user_id, member.group_id)
+        .filter(member.collection_id.in_(collection_ids))
+        .all()
+    )
+    user_ids = [i for i, _ in members if i is not None]
+    return user_ids + get_group_users([j for _, j in members if j is not None])
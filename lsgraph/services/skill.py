@@ -15,125 +15,463 @@
 
 from celery import shared_task
 from collections import defaultdict
+from flask import current_app
+import numpy as np
 import pdb
+from sqlalchemy.dialects.postgresql import UUID, insert
 import uuid
 
 from lsgraph import models
 from lsgraph.models import db
+from lsgraph.models._shared import Float32Vector
+from lsgraph.services.embedding import embed_texts
+from lsgraph.services.job_recommendation import embedding_matrix, pairwise_distances
+from lsgraph.services.job_recommendation_fit import mark_skills_stale
+from lsgraph.services.organization import (
+    bump_skill_data_version,
+    get_skill_organizations,
+)
+from lsgraph.services.skill_tree import (
+    get_cached_skill_trees,
+    get_skill_trees,
+    query_ancestors,
+    query_root_ids,
+)
 
 
 def get_descendant_skills(skill_id):
-    """Get all skills that originate from skill_id"""
+    """Get all skills that originate from skill_id
+
+    Descendants are lists of skill IDs in pre-order, read from the cached
+    skill tree"""
     if not isinstance(skill_id, (list, tuple)):
         skill_id = [
             skill_id,
         ]
-    topq = db.session.query(models.SkillInclude).filter(
-        models.SkillInclude.parent_id.in_(skill_id)
-    )
-    topq = topq.cte("cte", recursive=True)
-    bottomq = db.session.query(models.SkillInclude)
-    bottomq = bottomq.join(topq, models.SkillInclude.parent_id == topq.c.child_id)
-    recursive_q = topq.union(bottomq)
-    final_q = db.session.query(recursive_q)
-    children = defaultdict(list)
-    for _, parent, child in final_q.all():
-        children[parent].append(child)
-    descendants = defaultdict(list)
-
-    def collect_descendants(skill_id, children):
-        output = []
-        if skill_id not in children:
-            return output
-        output.extend(children[skill_id])
-        for s_id in children[skill_id]:
-            output.extend(collect_descendants(s_id, children))
-        return output
-
-    all_descendants = {s_id: collect_descendants(s_id, children) for s_id in skill_id}
-    direct_children = {k: v for k, v in children.items() if k in skill_id}
+    trees = get_skill_trees(skill_id)
+    all_descendants = {
+        s_id: trees[s_id].descendants(s_id).tolist() for s_id in skill_id
+    }
+    direct_children = {}
+    for s_id in skill_id:
+        children = trees[s_id].child_skills(s_id)
+        if children:
+            direct_children[s_id] = children
     return all_descendants, direct_children
 
 
+def get_child_skills(skill_id):
+    """Get the skills directly included by each skill in skill_id"""
+    if not isinstance(skill_id, (list, tuple)):
+        skill_id = [
+            skill_id,
+        ]
+    trees = get_skill_trees(skill_id)
+    return {s_id: trees[s_id].child_skills(s_id) for s_id in skill_id}
+
+
+def count_descendant_skills(skill_id):
+    """Get the number of skills that originate from each skill in skill_id"""
+    if not isinstance(skill_id, (list, tuple)):
+        skill_id = [
+            skill_id,
+        ]
+    trees = get_skill_trees(skill_id)
+    return {s_id: trees[s_id].num_descendants(s_id) for s_id in skill_id}
+
+
 def get_ancestor_skills(skill_id):
     """Get all skills connecting root_id to skill_id"""
     if not isinstance(skill_id, (list, tuple)):
         skill_id = [
             skill_id,
         ]
-    topq = db.session.query(models.SkillInclude).filter(
-        models.SkillInclude.child_id.in_(skill_id)
-    )
-    topq = topq.cte("cte", recursive=True)
-    bottomq = db.session.query(models.SkillInclude)
-    bottomq = bottomq.join(topq, models.SkillInclude.child_id == topq.c.parent_id)
-    recursive_q = topq.union(bottomq)
-    final_q = db.session.query(recursive_q)
-    parents = {child: parent for _, parent, child in final_q.all()}
+    trees = get_cached_skill_trees(skill_id)
     output = defaultdict(list)
-
-    def build_path(output, skill_id, parents):
-        extended = False
-        for s_id in skill_id:
-            if s_id in output:
-                current = output[s_id][-1]
-            else:
-                current = s_id
-            if current in parents:
-                extended = True
-                output[s_id].append(parents[current])
-        if extended:
-            build_path(output, skill_id, parents)
-
-    build_path(output, skill_id, parents)
+    missing = [i for i in skill_id if i not in trees]
+    if missing:
+        output.update(query_ancestors(missing))
+    for s_id, tree in trees.items():
+        ancestors = tree.ancestors(s_id)
+        if ancestors:
+            output[s_id] = ancestors
     return output
 
 
 def get_root_id(skill_id):
     """Get the root IDs for a collection of skills"""
-    output = get_ancestor_skills(skill_id)
-    output = {k: v[-1] for k, v in output.items()}
-    return output
+    if not isinstance(skill_id, (list, tuple)):
+        skill_id = [
+            skill_id,
+        ]
+    trees = get_cached_skill_trees(skill_id)
+    output = {}
+    missing = [i for i in skill_id if i not in trees]
+    if missing:
+        output.update(query_root_ids(missing))
+    for s_id, tree in trees.items():
+        output[s_id] = tree.root_id
+    return {k: v for k, v in output.items() if k != v}
+
+
+def add_skill_closure(parent_id, child_id):
+    """Link a new skill to its parent and ancestors in the skill closure"""
+    closure = models.SkillClosure.__table__
+    db.session.execute(
+        closure.insert().values(ancestor_id=child_id, descendant_id=child_id, depth=0)
+    )
+    if parent_id is None:
+        return
+    ancestors = db.select(
+        [
+            closure.c.ancestor_id,
+            db.literal(child_id, UUID(as_uuid=True)),
+            closure.c.depth + 1,
+        ]
+    ).where(closure.c.descendant_id == parent_id)
+    db.session.execute(
+        closure.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"], ancestors
+        )
+    )
+
 
+def bulk_add_skill_closure(parent_id, skill_ids, parent_positions):
+    """Link many new skills below parent_id in the skill closure
 
-module_url = "https://tfhub.dev/google/universal-sentence-encoder/4"
+    skill_ids must list parents before their children, parent_positions
+    gives the position of each skill's parent within skill_ids or -1 for
+    skills attached directly to parent_id"""
+    closure = models.SkillClosure
+    existing = (
+        db.session.query(closure.ancestor_id, closure.depth)
+        .filter(closure.descendant_id == parent_id)
+        .all()
+    )
+    rows = []
+    for position, skill_id in enumerate(skill_ids):
+        rows.append({"ancestor_id": skill_id, "descendant_id": skill_id, "depth": 0})
+        depth = 0
+        ancestor = parent_positions[position]
+        while ancestor >= 0:
+            depth += 1
+            rows.append(
+                {
+                    "ancestor_id": skill_ids[ancestor],
+                    "descendant_id": skill_id,
+                    "depth": depth,
+                }
+            )
+            ancestor = parent_positions[ancestor]
+        for ancestor_id, ancestor_depth in existing:
+            rows.append(
+                {
+                    "ancestor_id": ancestor_id,
+                    "descendant_id": skill_id,
+                    "depth": depth + ancestor_depth + 1,
+                }
+            )
+    if rows:
+        db.session.execute(closure.__table__.insert(), rows)
 
 
 class SkillProcessor:
-    embed = None
+    """Convert skill paths to embeddings with the configured embedder
+
+    Paths encoded before, by any organization, come from the embedding cache"""
 
     @classmethod
     def process(cls, x):
-        if not cls.embed:
-            import tensorflow_hub
+        return embed_texts(x)
+
+
+def build_skill_paths(skill_ids):
+    """Get the comma separated names from below the root to each skill
+
+    All paths come from a single fetch of the skills' ancestors"""
+    closure = models.SkillClosure
+    rows = (
+        db.session.query(closure.descendant_id, models.Skill.name)
+        .join(models.Skill, models.Skill.id == closure.ancestor_id)
+        .filter(closure.descendant_id.in_(skill_ids))
+        .order_by(closure.descendant_id, closure.depth.desc())
+        .all()
+    )
+    names = defaultdict(list)
+    for skill_id, name in rows:
+        names[skill_id].append(name)
+    # The first name of each chain is the organization root
+    return {i: ", ".join(names[i][1:]) for i in skill_ids}
+
+
+def update_skill_embeddings(skill_ids, vectors):
+    """Store embeddings for many skills with a single UPDATE"""
+    skill = models.Skill.__table__
+    new_values = db.values(
+        db.column("id", UUID(as_uuid=True)),
+        db.column("skill_embedding", Float32Vector),
+        name="new_values",
+    ).data(list(zip(skill_ids, vectors)))
+    db.session.execute(
+        skill.update()
+        .where(skill.c.id == new_values.c.id)
+        .values(skill_embedding=new_values.c.skill_embedding)
+    )
 
-            cls.embed = tensorflow_hub.load(module_url)
-        message_embeddings = cls.embed(x)
-        return message_embeddings
+
+def query_organization_embeddings(root_id):
+    """Get (skill_id, embedding) for embedded skills below root_id"""
+    closure = models.SkillClosure
+    return (
+        db.session.query(models.Skill.id, models.Skill.skill_embedding)
+        .join(closure, closure.descendant_id == models.Skill.id)
+        .filter(closure.ancestor_id == root_id)
+        .filter(models.Skill.skill_embedding.isnot(None))
+        .all()
+    )
+
+
+class OrganizationEmbeddings:
+    """Embedded skills below one root, loaded incrementally
+
+    Skill embeddings are written once, so after the first load refresh
+    only fetches the embeddings of skills embedded since, identified by a
+    query for IDs alone"""
+
+    def __init__(self, root_id):
+        self.root_id = root_id
+        self.ids = []
+        self.index = {}
+        self.embeddings = []
+        self.matrix = embedding_matrix([])
+
+    def refresh(self):
+        if not self.ids:
+            self._set(query_organization_embeddings(self.root_id))
+            return
+        closure = models.SkillClosure
+        current = {
+            i
+            for i, in db.session.query(models.Skill.id)
+            .join(closure, closure.descendant_id == models.Skill.id)
+            .filter(closure.ancestor_id == self.root_id)
+            .filter(models.Skill.skill_embedding.isnot(None))
+        }
+        new = [i for i in current if i not in self.index]
+        # Skills deleted since the last refresh are dropped
+        rows = [(i, j) for i, j in zip(self.ids, self.embeddings) if i in current]
+        if not new and len(rows) == len(self.ids):
+            return
+        if new:
+            rows.extend(
+                db.session.query(models.Skill.id, models.Skill.skill_embedding)
+                .filter(models.Skill.id.in_(new))
+                .all()
+            )
+        self._set(rows)
+
+    def _set(self, rows):
+        self.ids = [i for i, _ in rows]
+        self.index = {j: i for i, j in enumerate(self.ids)}
+        self.embeddings = [i for _, i in rows]
+        self.matrix = embedding_matrix(self.embeddings)
+
+
+def lock_organization_neighbors(root_ids):
+    """Serialize neighbor updates per organization until the transaction ends
+
+    Without the lock, batches embedded concurrently would each miss the
+    pairs with the other's uncommitted embeddings"""
+    for root_id in sorted(root_ids):
+        key = int.from_bytes(root_id.bytes[:8], "big", signed=True)
+        db.session.execute(db.select([db.func.pg_advisory_xact_lock(key)]))
+
+
+def nearest_neighbors(embeddings, positions, threshold, limit):
+    """Neighbor lists of the skills at positions of an OrganizationEmbeddings
+
+    Returns the (skill_id, neighbor_id, distance) rows of the at most
+    limit nearest neighbors within threshold of each skill, the IDs of
+    the skills that had more neighbors within threshold and the positions
+    of every skill within threshold of one of them"""
+    batch_size = current_app.config["SKILL_EMBEDDING_BATCH_SIZE"]
+    rows = []
+    truncated = set()
+    close = set()
+    for start in range(0, len(positions), batch_size):
+        batch = positions[start : start + batch_size]
+        distances = pairwise_distances(embeddings.matrix[batch], embeddings.matrix)
+        for row, position in enumerate(batch):
+            skill_id = embeddings.ids[position]
+            columns = np.flatnonzero(distances[row] <= threshold)
+            columns = columns[columns != position]
+            close.update(columns.tolist())
+            if len(columns) > limit:
+                truncated.add(skill_id)
+                order = np.argpartition(distances[row, columns], limit - 1)
+                columns = columns[order[:limit]]
+            rows.extend(
+                (skill_id, embeddings.ids[i], float(distances[row, i])) for i in columns
+            )
+    return rows, truncated, close
+
+
+def update_skill_neighbors(skill_ids, organizations=None, affected=True):
+    """Recompute the stored neighbors of skill_ids
+
+    Must run whenever the embeddings of skill_ids change. Each skill
+    lists its own nearest SKILL_NEIGHBOR_LIMIT neighbors within
+    SKILL_NEIGHBOR_THRESHOLD and is marked truncated when it had more.
+    With affected, the lists of the other skills within the threshold of
+    skill_ids, or listing one of them, are recomputed too so that every
+    list stays the nearest neighbors of its skill. rebuild_skill_neighbors
+    computes every list and skips them. organizations maps root IDs to
+    OrganizationEmbeddings kept between calls."""
+    threshold = current_app.config["SKILL_NEIGHBOR_THRESHOLD"]
+    limit = current_app.config["SKILL_NEIGHBOR_LIMIT"]
+    if organizations is None:
+        organizations = {}
+    neighbor = models.SkillNeighbor
+    roots = query_root_ids(skill_ids)
+    batches = defaultdict(list)
+    for skill_id in skill_ids:
+        batches[roots.get(skill_id, skill_id)].append(skill_id)
+    lock_organization_neighbors(batches)
+    listing = set()
+    if affected:
+        listing = {
+            i
+            for i, in db.session.query(neighbor.skill_id).filter(
+                neighbor.neighbor_id.in_(skill_ids)
+            )
+        }
+    updated = set(skill_ids) | listing
+    rows = []
+    truncated = set()
+    for root_id, ids in batches.items():
+        if root_id not in organizations:
+            organizations[root_id] = OrganizationEmbeddings(root_id)
+        embeddings = organizations[root_id]
+        embeddings.refresh()
+        positions = [embeddings.index[i] for i in ids if i in embeddings.index]
+        batch_rows, batch_truncated, close = nearest_neighbors(
+            embeddings, positions, threshold, limit
+        )
+        rows.extend(batch_rows)
+        truncated |= batch_truncated
+        if not affected:
+            continue
+        close |= {embeddings.index[i] for i in listing if i in embeddings.index}
+        others = sorted(close - set(positions))
+        batch_rows, batch_truncated, _ = nearest_neighbors(
+            embeddings, others, threshold, limit
+        )
+        rows.extend(batch_rows)
+        truncated |= batch_truncated
+        updated.update(embeddings.ids[i] for i in others)
+    db.session.query(neighbor).filter(neighbor.skill_id.in_(updated)).delete(
+        synchronize_session=False
+    )
+    if rows:
+        db.session.execute(
+            insert(neighbor.__table__).on_conflict_do_nothing(),
+            [{"skill_id": i, "neighbor_id": j, "distance": d} for i, j, d in rows],
+        )
+    skill = models.Skill
+    db.session.query(skill).filter(skill.id.in_(updated)).update(
+        {skill.neighbors_truncated: skill.id.in_(truncated)},
+        synchronize_session=False,
+    )
+
+
+def get_skill_neighbors(skill_ids):
+    """Get (skill_id, neighbor_id, distance) for neighbor pairs within skill_ids"""
+    neighbor = models.SkillNeighbor
+    return (
+        db.session.query(neighbor.skill_id, neighbor.neighbor_id, neighbor.distance)
+        .filter(neighbor.skill_id.in_(skill_ids))
+        .filter(neighbor.neighbor_id.in_(skill_ids))
+        .all()
+    )
+
+
+def get_truncated_skills(skill_ids):
+    """IDs of skill_ids with more neighbors than their stored list"""
+    skill = models.Skill
+    return {
+        i
+        for i, in db.session.query(skill.id)
+        .filter(skill.id.in_(skill_ids))
+        .filter(skill.neighbors_truncated)
+    }
+
+
+@shared_task
+def embed_pending_skills(skill_ids=None):
+    """Generate embeddings for skills that do not have one yet
+
+    Skills are claimed in batches of SKILL_EMBEDDING_BATCH_SIZE with
+    SKIP LOCKED, so concurrent or repeated tasks coalesce rather than
+    embedding the same skill twice. Without skill_ids every pending skill
+    is processed. Organization roots have no path and are never embedded."""
+    if skill_ids is not None:
+        skill_ids = [uuid.UUID(str(i)) for i in skill_ids]
+    batch_size = current_app.config["SKILL_EMBEDDING_BATCH_SIZE"]
+    organizations = {}
+    closure = models.SkillClosure
+    has_parent = (
+        db.session.query(closure.descendant_id)
+        .filter(closure.descendant_id == models.Skill.id)
+        .filter(closure.depth > 0)
+        .exists()
+    )
+    while True:
+        query = (
+            db.session.query(models.Skill.id)
+            .filter(models.Skill.skill_embedding.is_(None))
+            .filter(has_parent)
+        )
+        if skill_ids is not None:
+            query = query.filter(models.Skill.id.in_(skill_ids))
+        batch = query.limit(batch_size).with_for_update(skip_locked=True).all()
+        batch = [i for i, in batch]
+        if not batch:
+            break
+        paths = build_skill_paths(batch)
+        vectors = SkillProcessor.process([paths[i] for i in batch])
+        update_skill_embeddings(batch, np.asarray(vectors))
+        update_skill_neighbors(batch, organizations)
+        bump_skill_data_version(get_skill_organizations(batch))
+        mark_skills_stale(batch)
+        db.session.commit()
 
 
 @shared_task
 def skill_embedding(skill_id):
-    """Generate a new skill embedding"""
-    # Get full path for skill
-    if isinstance(skill_id, str):
-        skill_id = uuid.UUID(skill_id)
-    ancestors = get_ancestor_skills(skill_id)[skill_id]
-    skill_chain = [
-        skill_id,
+    """Generate a new skill embedding
+
+    Kept for tasks queued before batching, use embed_pending_skills"""
+    embed_pending_skills([skill_id])
+
+
+@shared_task
+def rebuild_skill_neighbors():
+    """Recompute the whole skill neighbor table
+
+    Needed after changing SKILL_NEIGHBOR_THRESHOLD or SKILL_NEIGHBOR_LIMIT"""
+    batch_size = current_app.config["SKILL_EMBEDDING_BATCH_SIZE"]
+    skill_ids = [
+        i
+        for i, in db.session.query(models.Skill.id)
+        .filter(models.Skill.skill_embedding.isnot(None))
+        .order_by(models.Skill.id)
     ]
-    skill_chain.extend(ancestors)
-    all_skills = models.Skill.query.filter(models.Skill.id.in_(skill_chain)).all()
-    all_skills = {i.id: i for i in all_skills}
-    skill_path = ", ".join([all_skills[i].name for i in reversed(skill_chain[:-1])])
-    # Compute embedding for skill path
-    vector = SkillProcessor.process(
-        [
-            skill_path,
-        ]
-    )
-    vector = vector.numpy()[0].tolist()
-    # Store embedding in database
-    all_skills[skill_id].skill_embedding = vector
-    db.session.add(all_skills[skill_id])
+    organizations = {}
+    # Skills embedded meanwhile update the lists they affect themselves
+    models.SkillNeighbor.query.delete(synchronize_session=False)
+    for i in range(0, len(skill_ids), batch_size):
+        update_skill_neighbors(skill_ids[i : i + batch_size], organizations, False)
+        mark_skills_stale(skill_ids[i : i + batch_size])
+        db.session.commit()
+    bump_skill_data_version(i for i, in db.session.query(models.Organization.id))
     db.session.commit()
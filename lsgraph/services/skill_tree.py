@@ -0,0 +1,357 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import defaultdict
+from functools import partial
+import threading
+import time
+
+from flask import current_app
+import numpy as np
+from sqlalchemy import event
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.models._shared import run_after_commit
+
+_EXIT = object()
+
+
+def euler_tour(children, roots):
+    """Number the skills below roots in a single depth-first pass
+
+    The traversal is iterative, so depth is not limited by the recursion
+    limit. Roots nested below other requested roots are not walked again,
+    their descendants are a sub-range of the enclosing root's range.
+    Returns (ids, index, parent, end, post) where ids lists skills in
+    pre-order, index maps skill IDs to positions, parent holds the
+    position of each skill's parent (-1 for roots), ids[i + 1 : end[i]]
+    are the descendants of ids[i] and post is the post-order number of
+    each skill."""
+    roots = list(dict.fromkeys(roots))
+    if len(roots) > 1:
+        roots = _outermost_roots(children, roots)
+    ids = []
+    index = {}
+    parent = []
+    end = []
+    post = []
+    counter = 0
+    for root_id in roots:
+        if root_id in index:
+            continue
+        # Skill IDs and their parent positions are kept on separate stacks,
+        # a negative position marks the exit from the skill at ~position
+        stack = [root_id]
+        positions = [-1]
+        while stack:
+            skill_id = stack.pop()
+            position = positions.pop()
+            if skill_id is _EXIT:
+                end[~position] = len(ids)
+                post[~position] = counter
+                counter += 1
+                continue
+            if skill_id in index:
+                # Skills are only indexed through their first parent
+                continue
+            new_position = len(ids)
+            index[skill_id] = new_position
+            ids.append(skill_id)
+            parent.append(position)
+            child_ids = children.get(skill_id)
+            if child_ids:
+                end.append(0)
+                post.append(0)
+                stack.append(_EXIT)
+                positions.append(~new_position)
+                stack.extend(reversed(child_ids))
+                positions.extend([new_position] * len(child_ids))
+            else:
+                # Leaves are closed immediately rather than via the stack
+                end.append(new_position + 1)
+                post.append(counter)
+                counter += 1
+    ids_array = np.empty(len(ids), dtype=object)
+    ids_array[:] = ids
+    return (
+        ids_array,
+        index,
+        np.array(parent, dtype=np.int32),
+        np.array(end, dtype=np.int32),
+        np.array(post, dtype=np.int32),
+    )
+
+
+def _outermost_roots(children, roots):
+    """Drop roots that lie below another requested root"""
+    requested = set(roots)
+    parents = {}
+    for parent_id, child_ids in children.items():
+        for child_id in child_ids:
+            parents.setdefault(child_id, parent_id)
+    # Whether each skill has a requested root above it, filled in as
+    # paths towards the top of the graph are walked
+    covered = {}
+    for root_id in roots:
+        path = [root_id]
+        seen = {root_id}
+        skill_id = root_id
+        while True:
+            parent_id = parents.get(skill_id)
+            if parent_id is None or parent_id in seen:
+                result = False
+                break
+            if parent_id in requested:
+                result = True
+                break
+            if parent_id in covered:
+                result = covered[parent_id]
+                break
+            path.append(parent_id)
+            seen.add(parent_id)
+            skill_id = parent_id
+        for i in path:
+            covered[i] = result
+    return [i for i in roots if not covered[i]]
+
+
+def collect_descendants(children, skill_ids):
+    """Get the descendants of every skill in skill_ids
+
+    All subtrees come from one traversal, and each result is a view into
+    the same pre-order array, so overlapping subtrees share storage."""
+    ids, index, _, end, _ = euler_tour(children, skill_ids)
+    return {i: ids[index[i] + 1 : end[index[i]]] for i in skill_ids}
+
+
+class SkillTree:
+    """Flattened skills graph below a single root skill
+
+    Skills are numbered by their position in a pre-order traversal so that
+    the descendants of any skill form a contiguous run of the ordering.
+    Entry (pre) and exit (post) numbers from the same traversal answer
+    ancestor checks without walking the tree."""
+
+    def __init__(self, root_id, children):
+        """Build the index from a mapping of parent ID to child IDs"""
+        self.root_id = root_id
+        self.ids, self.index, self.parent, self.end, self.post = euler_tour(
+            children, [root_id]
+        )
+        # Child positions grouped by parent, in pre-order
+        self.child_order = np.argsort(self.parent[1:], kind="stable").astype(np.int32)
+        self.child_order += 1
+        self.child_start = np.searchsorted(
+            self.parent[self.child_order], np.arange(len(self.ids) + 1)
+        ).astype(np.int32)
+
+    def __contains__(self, skill_id):
+        return skill_id in self.index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def descendants(self, skill_id):
+        """All skills below skill_id in pre-order"""
+        position = self.index[skill_id]
+        return self.ids[position + 1 : self.end[position]]
+
+    def num_descendants(self, skill_id):
+        """Number of skills below skill_id"""
+        position = self.index[skill_id]
+        return int(self.end[position]) - position - 1
+
+    def child_skills(self, skill_id):
+        """Skills directly included by skill_id"""
+        position = self.index[skill_id]
+        children = self.child_order[
+            self.child_start[position] : self.child_start[position + 1]
+        ]
+        return self.ids[children].tolist()
+
+    def ancestors(self, skill_id):
+        """Skills from the parent of skill_id up to the root"""
+        output = []
+        position = self.parent[self.index[skill_id]]
+        while position >= 0:
+            output.append(self.ids[position])
+            position = self.parent[position]
+        return output
+
+    def is_ancestor(self, ancestor_id, skill_id):
+        """Check whether ancestor_id is above skill_id"""
+        a = self.index[ancestor_id]
+        s = self.index[skill_id]
+        return a < s and self.post[s] < self.post[a]
+
+
+class SkillTreeCache:
+    """Per-organization skill trees kept in process memory
+
+    Trees are keyed by root skill and discarded when any of their skill
+    includes change or after SKILL_TREE_CACHE_TTL seconds, which bounds
+    how stale a tree can be when another process edits the graph."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.trees = {}
+        self.loaded_at = {}
+        self.skill_roots = {}
+
+    def get(self, skill_id):
+        """Return the cached tree containing skill_id"""
+        root_id = self.skill_roots.get(skill_id)
+        if root_id is None:
+            return None
+        ttl = current_app.config["SKILL_TREE_CACHE_TTL"]
+        if time.monotonic() - self.loaded_at.get(root_id, 0) > ttl:
+            self.invalidate(root_id)
+            return None
+        return self.trees.get(root_id)
+
+    def add(self, tree):
+        with self.lock:
+            self._remove(tree.root_id)
+            self.trees[tree.root_id] = tree
+            self.loaded_at[tree.root_id] = time.monotonic()
+            for skill_id in tree.ids:
+                self.skill_roots[skill_id] = tree.root_id
+
+    def invalidate(self, root_id):
+        with self.lock:
+            self._remove(root_id)
+
+    def invalidate_skills(self, skill_ids):
+        """Drop every tree containing any of skill_ids"""
+        with self.lock:
+            for skill_id in skill_ids:
+                root_id = self.skill_roots.get(skill_id)
+                if root_id is not None:
+                    self._remove(root_id)
+
+    def clear(self):
+        with self.lock:
+            self.trees.clear()
+            self.loaded_at.clear()
+            self.skill_roots.clear()
+
+    def _remove(self, root_id):
+        tree = self.trees.pop(root_id, None)
+        self.loaded_at.pop(root_id, None)
+        if tree is None:
+            return
+        for skill_id in tree.ids:
+            if self.skill_roots.get(skill_id) == root_id:
+                del self.skill_roots[skill_id]
+
+
+skill_tree_cache = SkillTreeCache()
+
+
+def query_root_ids(skill_ids):
+    """Get the root skill above each of skill_ids from the skill closure"""
+    closure = models.SkillClosure
+    rows = (
+        db.session.query(closure.descendant_id, closure.ancestor_id)
+        .filter(closure.descendant_id.in_(skill_ids))
+        .distinct(closure.descendant_id)
+        .order_by(closure.descendant_id, closure.depth.desc())
+        .all()
+    )
+    return dict(rows)
+
+
+def query_ancestors(skill_ids):
+    """Get the ancestors of skill_ids, nearest first, from the skill closure"""
+    closure = models.SkillClosure
+    rows = (
+        db.session.query(closure.descendant_id, closure.ancestor_id)
+        .filter(closure.descendant_id.in_(skill_ids))
+        .filter(closure.depth > 0)
+        .order_by(closure.descendant_id, closure.depth)
+        .all()
+    )
+    output = defaultdict(list)
+    for skill_id, ancestor_id in rows:
+        output[skill_id].append(ancestor_id)
+    return output
+
+
+def query_tree_edges(root_id):
+    """Get (parent_id, child_id) links below root_id from the skill closure"""
+    closure = models.SkillClosure
+    return (
+        db.session.query(models.SkillInclude.parent_id, models.SkillInclude.child_id)
+        .join(closure, closure.descendant_id == models.SkillInclude.child_id)
+        .filter(closure.ancestor_id == root_id)
+        .all()
+    )
+
+
+def load_skill_tree(root_id):
+    """Build the tree below root_id from the database"""
+    children = defaultdict(list)
+    for parent, child in query_tree_edges(root_id):
+        children[parent].append(child)
+    return SkillTree(root_id, children)
+
+
+def get_cached_skill_trees(skill_ids):
+    """Map skill IDs to cached trees, skipping skills not in the cache"""
+    output = {}
+    for skill_id in skill_ids:
+        tree = skill_tree_cache.get(skill_id)
+        if tree is not None:
+            output[skill_id] = tree
+    return output
+
+
+def get_skill_trees(skill_ids):
+    """Map each skill ID to the tree containing it
+
+    Skills missing from the cache cost one query to find their roots and
+    one query per root to load the tree."""
+    output = get_cached_skill_trees(skill_ids)
+    missing = [i for i in skill_ids if i not in output]
+    if not missing:
+        return output
+    roots = query_root_ids(missing)
+    trees = {}
+    for root_id in set(roots.get(i, i) for i in missing):
+        tree = load_skill_tree(root_id)
+        if len(tree) > 1:
+            # Isolated skills are not worth caching
+            skill_tree_cache.add(tree)
+        trees[root_id] = tree
+    for skill_id in missing:
+        output[skill_id] = trees[roots.get(skill_id, skill_id)]
+    return output
+
+
+@event.listens_for(models.SkillInclude, "after_insert")
+@event.listens_for(models.SkillInclude, "after_update")
+@event.listens_for(models.SkillInclude, "after_delete")
+def invalidate_skill_include(mapper, connection, target):
+    """Drop cached trees affected by a changed skill include
+
+    Trees are dropped at flush for the changing transaction, and again
+    when it ends since trees built in between may hold uncommitted or
+    pre-commit rows"""
+    skill_ids = [target.parent_id, target.child_id]
+    skill_tree_cache.invalidate_skills(skill_ids)
+    run_after_commit(
+        target, partial(skill_tree_cache.invalidate_skills, skill_ids), rollback=True
+    )
@@ -0,0 +1,104 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import io
+
+from flask import current_app
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from lsgraph import models
+from lsgraph.models import db
+
+
+def distances_key(source_ids, target_ids):
+    """Content address of a source population and target profile set
+
+    Independent of the order of either list, the stored matrices record
+    the order of their rows and columns"""
+    text = ",".join(sorted(str(i) for i in source_ids))
+    text += "|" + ",".join(sorted(str(i) for i in target_ids))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_matrices(source_ids, target_ids, distances, fits):
+    output = io.BytesIO()
+    np.savez_compressed(
+        output,
+        sources=np.array([str(i) for i in source_ids], dtype=str),
+        targets=np.array([str(i) for i in target_ids], dtype=str),
+        distances=distances,
+        fits=fits,
+    )
+    return output.getvalue()
+
+
+def unpack_matrices(data, source_ids, target_ids):
+    """Distance and fit matrices with rows and columns in the requested order"""
+    archive = np.load(io.BytesIO(data), allow_pickle=False)
+    rows = {j: i for i, j in enumerate(archive["sources"])}
+    columns = {j: i for i, j in enumerate(archive["targets"])}
+    rows = [rows[str(i)] for i in source_ids]
+    columns = [columns[str(i)] for i in target_ids]
+    index = np.ix_(rows, columns)
+    return archive["distances"][index], archive["fits"][index]
+
+
+def load_cached_distances(org_id, version, source_ids, target_ids):
+    """Cached (distances, fits) for the skill data version, None if missing"""
+    cached = models.WorkforceDistances.query.filter_by(
+        organization_id=org_id,
+        key=distances_key(source_ids, target_ids),
+        skill_data_version=version,
+    ).first()
+    if cached is None:
+        return None
+    return unpack_matrices(cached.matrices, source_ids, target_ids)
+
+
+def store_cached_distances(org_id, version, source_ids, target_ids, distances, fits):
+    """Cache matrices computed from the skill data version
+
+    Entries from older versions are dropped, and only the most recent
+    WORKFORCE_DISTANCE_CACHE_SIZE entries are kept per organization"""
+    table = models.WorkforceDistances.__table__
+    values = {
+        "organization_id": org_id,
+        "key": distances_key(source_ids, target_ids),
+        "skill_data_version": version,
+        "matrices": pack_matrices(source_ids, target_ids, distances, fits),
+        "created_at": db.func.now(),
+    }
+    db.session.execute(
+        insert(table)
+        .values(values)
+        .on_conflict_do_update(
+            index_elements=[table.c.organization_id, table.c.key], set_=values
+        )
+    )
+    cached = models.WorkforceDistances
+    db.session.query(cached).filter(cached.organization_id == org_id).filter(
+        cached.skill_data_version < version
+    ).delete(synchronize_session=False)
+    keep = (
+        db.session.query(cached.key)
+        .filter(cached.organization_id == org_id)
+        .order_by(cached.created_at.desc())
+        .limit(current_app.config["WORKFORCE_DISTANCE_CACHE_SIZE"])
+    )
+    db.session.query(cached).filter(cached.organization_id == org_id).filter(
+        cached.key.notin_(keep.subquery().select())
+    ).delete(synchronize_session=False)
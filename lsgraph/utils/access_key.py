@@ -37,4 +37,6 @@ class AccessKey:
         """Verify that key pair is well-formed"""
         check_text = self.secret_key + access_id + access_secret[:-2]
         check = access_secret[-2:]
+        if len(access_secret) <= 2 or not check_text.isascii():
+            return False
         return check == hashlib.sha512(check_text.encode("ascii")).hexdigest()[:2]
@@ -0,0 +1,29 @@
+"""Add embedding cache table
+
+Revision ID: 0d8e5b3f71c2
+Revises: a41c7e09d2b5
+Create Date: 2026-10-18 11:20:36.914702
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0d8e5b3f71c2'
+down_revision = 'a41c7e09d2b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('embedding_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('embedding', postgresql.ARRAY(sa.Float()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('embedding_cache')
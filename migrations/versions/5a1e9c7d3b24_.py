@@ -0,0 +1,23 @@
+"""Add resource page index
+
+Revision ID: 5a1e9c7d3b24
+Revises: b83f0c6d2e97
+Create Date: 2026-10-18 19:42:11.318506
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5a1e9c7d3b24'
+down_revision = 'b83f0c6d2e97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_resource_organization_name', 'resource', ['organization_id', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_resource_organization_name', table_name='resource')
@@ -0,0 +1,49 @@
+"""Add skill closure table
+
+Revision ID: 6308e1d1236d
+Revises: 6fa9e98b26df
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '6308e1d1236d'
+down_revision = '6fa9e98b26df'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('skill_closure',
+    sa.Column('ancestor_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('descendant_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['skill.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['skill.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_skill_closure_descendant_id_depth', 'skill_closure', ['descendant_id', 'depth'], unique=False)
+    # Populate closure from existing skill includes
+    op.execute(
+        """
+        INSERT INTO skill_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM skill
+            UNION
+            SELECT closure.ancestor_id, skill_include.child_id, closure.depth + 1
+            FROM closure
+            JOIN skill_include ON skill_include.parent_id = closure.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, MIN(depth)
+        FROM closure
+        GROUP BY ancestor_id, descendant_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_index('ix_skill_closure_descendant_id_depth', table_name='skill_closure')
+    op.drop_table('skill_closure')
@@ -0,0 +1,75 @@
+"""Store embeddings as packed float32
+
+Revision ID: 7b2f9d4c0e18
+Revises: 0d8e5b3f71c2
+Create Date: 2026-10-18 12:41:08.337215
+
+"""
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '7b2f9d4c0e18'
+down_revision = '0d8e5b3f71c2'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# (table, primary key, column, nullable)
+COLUMNS = [
+    ('skill', 'id', 'skill_embedding', True),
+    ('skill', 'id', 'resource_recommendation_vector', True),
+    ('resource', 'id', 'resource_recommendation_vector', True),
+    ('embedding_cache', 'key', 'embedding', False),
+]
+
+
+def convert_column(table, key, column, nullable, new_type, convert):
+    """Replace column with a new_type column, converting values in batches"""
+    connection = op.get_bind()
+    op.add_column(table, sa.Column(column + '_new', new_type, nullable=True))
+    update = sa.text(f'UPDATE {table} SET {column}_new = :value WHERE {key} = :key')
+    last = None
+    while True:
+        query = f'SELECT {key}, {column} FROM {table} WHERE {column} IS NOT NULL'
+        if last is not None:
+            query += f' AND {key} > :last'
+        query += f' ORDER BY {key} LIMIT {BATCH_SIZE}'
+        rows = connection.execute(sa.text(query), {'last': last}).all()
+        if not rows:
+            break
+        connection.execute(update, [{'key': k, 'value': convert(v)} for k, v in rows])
+        last = rows[-1][0]
+    op.drop_column(table, column)
+    op.alter_column(table, column + '_new', new_column_name=column, nullable=nullable)
+
+
+def to_float32(value):
+    return np.asarray(value, dtype='<f4').tobytes()
+
+
+def to_float_array(value):
+    return np.frombuffer(value, dtype='<f4').tolist()
+
+
+def upgrade():
+    for table, key, column, nullable in COLUMNS:
+        convert_column(table, key, column, nullable, sa.LargeBinary(), to_float32)
+    # Dropped with the old column
+    op.create_index('ix_skill_pending_embedding', 'skill', ['id'], unique=False, postgresql_where=sa.text('skill_embedding IS NULL'))
+
+
+def downgrade():
+    for table, key, column, nullable in COLUMNS:
+        convert_column(
+            table,
+            key,
+            column,
+            nullable,
+            postgresql.ARRAY(sa.Float()),
+            to_float_array,
+        )
+    op.create_index('ix_skill_pending_embedding', 'skill', ['id'], unique=False, postgresql_where=sa.text('skill_embedding IS NULL'))
@@ -0,0 +1,34 @@
+"""Add workforce distance cache
+
+Revision ID: 7d0c52e8a1f6
+Revises: 3e6a91d0b7c4
+Create Date: 2026-10-18 15:21:37.604219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '7d0c52e8a1f6'
+down_revision = '3e6a91d0b7c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('workforce_distances',
+    sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('skill_data_version', sa.Integer(), nullable=False),
+    sa.Column('matrices', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+    sa.PrimaryKeyConstraint('organization_id', 'key')
+    )
+    op.add_column('organization', sa.Column('skill_data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('organization', 'skill_data_version')
+    op.drop_table('workforce_distances')
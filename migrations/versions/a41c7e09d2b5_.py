@@ -0,0 +1,24 @@
+"""Index skills waiting for an embedding
+
+Revision ID: a41c7e09d2b5
+Revises: 6308e1d1236d
+Create Date: 2026-10-18 10:04:17.286540
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e09d2b5'
+down_revision = '6308e1d1236d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_skill_pending_embedding', 'skill', ['id'], unique=False, postgresql_where=sa.text('skill_embedding IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_skill_pending_embedding', table_name='skill', postgresql_where=sa.text('skill_embedding IS NULL'))
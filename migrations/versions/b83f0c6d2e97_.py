@@ -0,0 +1,40 @@
+"""Add job recommendation fit table
+
+Revision ID: b83f0c6d2e97
+Revises: 7d0c52e8a1f6
+Create Date: 2026-10-18 16:02:44.918372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b83f0c6d2e97'
+down_revision = '7d0c52e8a1f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_recommendation_fit',
+    sa.Column('user_profile_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('profile_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('organization_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('fit', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.Column('stale_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+    sa.ForeignKeyConstraint(['profile_id'], ['profile.id'], ),
+    sa.ForeignKeyConstraint(['user_profile_id'], ['profile.id'], ),
+    sa.PrimaryKeyConstraint('user_profile_id', 'profile_id')
+    )
+    op.create_index(op.f('ix_job_recommendation_fit_organization_id'), 'job_recommendation_fit', ['organization_id'], unique=False)
+    op.create_index(op.f('ix_job_recommendation_fit_profile_id'), 'job_recommendation_fit', ['profile_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_job_recommendation_fit_profile_id'), table_name='job_recommendation_fit')
+    op.drop_index(op.f('ix_job_recommendation_fit_organization_id'), table_name='job_recommendation_fit')
+    op.drop_table('job_recommendation_fit')
@@ -0,0 +1,27 @@
+"""Mark skills with truncated neighbor lists
+
+Revision ID: b8d3f6a2c519
+Revises: e91d4b6a7c38
+Create Date: 2026-10-18 22:41:09.318562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f6a2c519'
+down_revision = 'e91d4b6a7c38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('skill', sa.Column('neighbors_truncated', sa.Boolean(), server_default='false', nullable=False))
+    # Lists stored before may have been cut, so distances come from
+    # embeddings until the rebuild_skill_neighbors task is run
+    op.execute('UPDATE skill SET neighbors_truncated = true WHERE skill_embedding IS NOT NULL')
+
+
+def downgrade():
+    op.drop_column('skill', 'neighbors_truncated')
@@ -0,0 +1,32 @@
+"""Weight resource search vector fields
+
+Revision ID: c4f7a2e91b05
+Revises: 5a1e9c7d3b24
+Create Date: 2026-10-18 20:17:52.064113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import lsgraph
+
+# revision identifiers, used by Alembic.
+revision = 'c4f7a2e91b05'
+down_revision = '5a1e9c7d3b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Generated column expressions cannot be altered, the column is rebuilt
+    op.drop_index('ix_name_desc_ts_vector__', table_name='resource')
+    op.drop_column('resource', '__ts_vector__')
+    op.add_column('resource', sa.Column('__ts_vector__', lsgraph.models._shared.TSVECTOR(), sa.Computed("setweight(to_tsvector('english', coalesce(name, '')), 'A') || setweight(to_tsvector('english', coalesce(short_description, '')), 'B') || setweight(to_tsvector('english', coalesce(description, '')), 'C')", persisted=True), nullable=True))
+    op.create_index('ix_name_desc_ts_vector__', 'resource', ['__ts_vector__'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_name_desc_ts_vector__', table_name='resource')
+    op.drop_column('resource', '__ts_vector__')
+    op.add_column('resource', sa.Column('__ts_vector__', lsgraph.models._shared.TSVECTOR(), sa.Computed("to_tsvector('english', name || ' ' || short_description || ' ' || description)", persisted=True), nullable=True))
+    op.create_index('ix_name_desc_ts_vector__', 'resource', ['__ts_vector__'], unique=False, postgresql_using='gin')
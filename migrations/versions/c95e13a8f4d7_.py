@@ -0,0 +1,35 @@
+"""Add skill neighbor table
+
+Revision ID: c95e13a8f4d7
+Revises: 7b2f9d4c0e18
+Create Date: 2026-10-18 14:02:55.170834
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c95e13a8f4d7'
+down_revision = '7b2f9d4c0e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('skill_neighbor',
+    sa.Column('skill_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('neighbor_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['skill.id'], ),
+    sa.ForeignKeyConstraint(['skill_id'], ['skill.id'], ),
+    sa.PrimaryKeyConstraint('skill_id', 'neighbor_id')
+    )
+    op.create_index(op.f('ix_skill_neighbor_neighbor_id'), 'skill_neighbor', ['neighbor_id'], unique=False)
+    # Left empty, run the rebuild_skill_neighbors task after upgrading to
+    # list the neighbors of existing embeddings with the configured limit
+
+
+def downgrade():
+    op.drop_index(op.f('ix_skill_neighbor_neighbor_id'), table_name='skill_neighbor')
+    op.drop_table('skill_neighbor')
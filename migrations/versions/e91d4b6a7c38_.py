@@ -0,0 +1,48 @@
+"""Add user resource access table
+
+Revision ID: e91d4b6a7c38
+Revises: c4f7a2e91b05
+Create Date: 2026-10-18 20:58:06.731942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e91d4b6a7c38'
+down_revision = 'c4f7a2e91b05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_resource_access',
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('resource_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.ForeignKeyConstraint(['resource_id'], ['resource.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'resource_id')
+    )
+    # Access of existing collections
+    op.execute(
+        """
+        INSERT INTO user_resource_access (user_id, resource_id)
+        SELECT collection_member.user_id, collection_resource.resource_id
+        FROM collection_member
+        JOIN collection_resource
+            ON collection_resource.collection_id = collection_member.collection_id
+        WHERE collection_member.user_id IS NOT NULL
+        UNION
+        SELECT group_member.user_id, collection_resource.resource_id
+        FROM collection_member
+        JOIN group_member ON group_member.group_id = collection_member.group_id
+        JOIN collection_resource
+            ON collection_resource.collection_id = collection_member.collection_id
+        WHERE group_member.user_id IS NOT NULL
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('user_resource_access')
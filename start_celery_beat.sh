@@ -0,0 +1,3 @@
+#!/bin/bash
+
+celery -A celery_app.celery beat --loglevel=info
@@ -18,7 +18,7 @@ import pdb
 from datetime import datetime
 import pytest
 
-from lsgraph import create_app
+from lsgraph import create_app, ext_celery
 from lsgraph.config import SECRET_KEY
 from lsgraph.models import AccessKey, Customer, db
 from lsgraph.utils.access_key import AccessKey as AccessKeyGen
@@ -137,6 +137,18 @@ def test_data_2org(lsgraph_client):
     return ((customer1, org1, collection1), (customer2, org2, collection2))
 
 
+@pytest.fixture
+def eager_celery():
+    celery = ext_celery.celery
+    previous = {
+        "task_always_eager": celery.conf.task_always_eager,
+        "task_eager_propagates": celery.conf.task_eager_propagates,
+    }
+    celery.conf.update(task_always_eager=True, task_eager_propagates=True)
+    yield celery
+    celery.conf.update(previous)
+
+
 @pytest.fixture(scope="module")
 def lsgraph_admin_user():
     app = create_app()
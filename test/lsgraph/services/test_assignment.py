@@ -0,0 +1,80 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import itertools
+
+import numpy as np
+import pytest
+
+from lsgraph.services.assignment import greedy_pairs, min_cost_assignment
+
+
+def brute_force_assignment(costs, allowed, capacities):
+    """Best (assigned count, total cost) over every possible assignment"""
+    num_persons, num_targets = costs.shape
+    best = None
+    for targets in itertools.product(range(-1, num_targets), repeat=num_persons):
+        counts = np.zeros(num_targets, dtype=int)
+        total = 0
+        assigned = 0
+        for person, target in enumerate(targets):
+            if target < 0:
+                continue
+            if not allowed[person, target]:
+                break
+            counts[target] += 1
+            total += round(costs[person, target] * 100)
+            assigned += 1
+        else:
+            if (counts <= capacities).all():
+                key = (-assigned, total)
+                if best is None or key < best:
+                    best = key
+    return best
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_min_cost_assignment(seed):
+    rng = np.random.default_rng(seed)
+    num_persons = rng.integers(1, 6)
+    num_targets = rng.integers(1, 4)
+    costs = np.round(rng.random((num_persons, num_targets)) * 10, 2)
+    if seed % 3 == 0:
+        # Many equal costs
+        costs = np.round(costs)
+    allowed = rng.random((num_persons, num_targets)) < 0.7
+    capacities = rng.integers(0, 3, num_targets)
+    output = min_cost_assignment(costs, allowed, capacities)
+    persons = np.nonzero(output >= 0)[0]
+    assert allowed[persons, output[persons]].all()
+    assert (np.bincount(output[persons], minlength=num_targets) <= capacities).all()
+    total = sum(round(costs[i, output[i]] * 100) for i in persons)
+    assert (-len(persons), total) == brute_force_assignment(costs, allowed, capacities)
+
+
+def test_min_cost_assignment_prefers_more_assignments():
+    # Assigning the first person to the cheap target would leave the
+    # second person without a place
+    costs = np.array([[1.0, 9.0], [2.0, np.nan]])
+    allowed = np.array([[True, True], [True, False]])
+    output = min_cost_assignment(costs, allowed, [1, 1])
+    assert output.tolist() == [1, 0]
+
+
+def test_greedy_pairs():
+    distances = np.array([[1.0, 5.0], [2.0, 3.0]])
+    allowed = distances <= 4
+    employees, targets = greedy_pairs(distances, allowed, np.array([1, 1]))
+    assert list(zip(employees, targets)) == [(1, 1), (1, 0), (0, 0)]
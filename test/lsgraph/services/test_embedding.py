@@ -0,0 +1,99 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+import uuid
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.embedding import (
+    EmbeddingLRU,
+    HashingEncoder,
+    embed_texts,
+    embedding_key,
+    embedding_lru,
+)
+
+
+class CountingEncoder(HashingEncoder):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.encoded = []
+
+    def __call__(self, texts):
+        self.encoded.extend(texts)
+        return super().__call__(texts)
+
+
+def test_hashing_encoder_shape():
+    encoder = HashingEncoder()
+    vectors = encoder(["Python", "Software, Python", ""])
+    assert vectors.shape == (3, 512)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1)
+    assert not vectors[2].any()
+
+
+def test_hashing_encoder_deterministic():
+    texts = ["Data analysis", "Project management"]
+    assert np.array_equal(HashingEncoder()(texts), HashingEncoder()(texts))
+    assert not np.array_equal(HashingEncoder(seed=1)(texts), HashingEncoder()(texts))
+
+
+def test_hashing_encoder_similarity():
+    a, b, c = HashingEncoder()(
+        [
+            "Software, Programming languages, Python",
+            "Software, Programming languages, Python 3",
+            "Cooking, Baking bread",
+        ]
+    )
+    assert a @ b > a @ c
+
+
+def test_embedding_cache(lsgraph_client):
+    encoder = CountingEncoder(seed=7)
+    prefix = str(uuid.uuid4())
+    texts = [f"{prefix}, First", f"{prefix}, Second", f"{prefix}, First"]
+    with lsgraph_client.application.app_context():
+        first = embed_texts(texts, encoder)
+        db.session.commit()
+        assert encoder.encoded == texts[:2]
+        assert np.array_equal(first[0], first[2])
+        assert np.allclose(first, HashingEncoder(seed=7)(texts))
+        # Served from memory
+        assert np.array_equal(embed_texts(texts, encoder), first)
+        # Served from the database
+        embedding_lru.clear()
+        assert np.allclose(embed_texts(texts[::-1], encoder), first[::-1])
+        assert len(encoder.encoded) == 2
+        key = embedding_key(encoder.version, texts[1])
+        assert models.EmbeddingCache.query.get(key) is not None
+
+
+def test_embedding_lru_size(lsgraph_client):
+    app = lsgraph_client.application
+    lru = EmbeddingLRU()
+    with app.app_context():
+        size = app.config["SKILL_EMBEDDING_CACHE_SIZE"]
+        app.config["SKILL_EMBEDDING_CACHE_SIZE"] = 2
+        try:
+            lru.put_many({"a": 1, "b": 2})
+            assert lru.get_many(["a"]) == {"a": 1}
+            lru.put_many({"c": 3})
+        finally:
+            app.config["SKILL_EMBEDDING_CACHE_SIZE"] = size
+        # The least recently used key is dropped
+        assert lru.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
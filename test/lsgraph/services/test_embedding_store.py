@@ -0,0 +1,101 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import uuid
+
+import numpy as np
+
+from lsgraph.services import embedding_store
+from lsgraph.services.embedding_store import (
+    EmbeddingStore,
+    embedding_store_cache,
+    get_embedding_store,
+    publish_embedding_store,
+    remove_deleted_stores,
+    remove_old_stores,
+    store_path,
+)
+
+
+def test_embedding_store(tmp_path):
+    skill_ids = [uuid.uuid4() for _ in range(3)]
+    embeddings = np.arange(12, dtype=float).reshape(3, 4)
+    path = store_path(tmp_path, uuid.uuid4(), 1)
+    publish_embedding_store(path, skill_ids, embeddings)
+    store = EmbeddingStore(path)
+    assert len(store) == 3
+    assert not store.embeddings.flags.writeable
+    missing = uuid.uuid4()
+    rows = store.rows([skill_ids[2], missing, skill_ids[0]])
+    assert rows.dtype == np.float64
+    assert np.array_equal(rows[0], embeddings[2])
+    assert np.isnan(rows[1]).all()
+    assert np.array_equal(rows[2], embeddings[0])
+
+
+def test_embedding_store_publish_once(tmp_path):
+    path = store_path(tmp_path, uuid.uuid4(), 1)
+    skill_id = uuid.uuid4()
+    publish_embedding_store(path, [skill_id], np.ones((1, 2)))
+    # A later publication of the same version keeps the first store
+    publish_embedding_store(path, [skill_id], np.zeros((1, 2)))
+    assert np.array_equal(EmbeddingStore(path).rows([skill_id]), np.ones((1, 2)))
+    assert os.listdir(os.path.dirname(path)) == ["1"]
+
+
+def test_embedding_store_remove_old(tmp_path):
+    org_id = uuid.uuid4()
+    for version in range(3):
+        publish_embedding_store(
+            store_path(tmp_path, org_id, version), [], np.zeros((0, 2))
+        )
+    old_store = EmbeddingStore(store_path(tmp_path, org_id, 0))
+    remove_old_stores(tmp_path, org_id, 2)
+    assert os.listdir(os.path.join(tmp_path, str(org_id))) == ["2"]
+    # Stores that are already mapped stay readable
+    assert old_store.rows([uuid.uuid4()]).shape == (1, 2)
+
+
+def test_embedding_store_remove_deleted(lsgraph_client, test_data_2org, tmp_path):
+    org_id = test_data_2org[0][1]["id"]
+    deleted_id = uuid.uuid4()
+    for name in (org_id, str(deleted_id), "other"):
+        os.makedirs(os.path.join(tmp_path, name))
+    with lsgraph_client.application.app_context():
+        remove_deleted_stores(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == sorted([org_id, "other"])
+
+
+def test_embedding_store_removed_while_mapping(
+    lsgraph_client, test_data_2org, tmp_path, monkeypatch
+):
+    org_id = test_data_2org[0][1]["id"]
+    app = lsgraph_client.application
+    opened = []
+
+    def removed_once(path):
+        opened.append(path)
+        if len(opened) == 1:
+            raise FileNotFoundError(path)
+        return EmbeddingStore(path)
+
+    monkeypatch.setattr(embedding_store, "EmbeddingStore", removed_once)
+    monkeypatch.setitem(app.config, "SKILL_EMBEDDING_STORE_DIR", str(tmp_path))
+    embedding_store_cache.clear()
+    with app.app_context():
+        store = get_embedding_store(org_id)
+    assert len(opened) == 2
+    assert store.path == opened[1]
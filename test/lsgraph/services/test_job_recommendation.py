@@ -0,0 +1,251 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import namedtuple
+import numpy as np
+import pytest
+import uuid
+
+from lsgraph.api_v1.views.users import JobRecommendation
+from lsgraph.services.job_recommendation import top_k_positions
+
+LEVELS = [("Beginner", 1), ("Intermediate", 2), ("Advanced", 3)]
+
+Profile = namedtuple("Profile", ["id", "name", "description", "user_id", "type"])
+ProfileSkill = namedtuple("ProfileSkill", ["profile_id", "skill_id", "level"])
+Skill = namedtuple("Skill", ["id", "skill_embedding"])
+
+
+def reference_learning_speed(rec, embed1, embed2):
+    if (embed1 is None) or (embed2 is None):
+        return rec.multiplier_baseline
+    d = np.linalg.norm(embed1 - embed2)
+    if d > rec.multiplier_threshold:
+        return rec.multiplier_baseline
+    y = (rec.multiplier_offset - d) / rec.multiplier_offset
+    y = y**rec.multiplier_power
+    return y
+
+
+def reference_job_by_distance(rec, skills, source_skills, target_skills):
+    """Per skill loop previously used by JobRecommendation.job_by_distance"""
+    total_distance = 0
+    profile_sum = 0
+    for t_id, t_level in target_skills.items():
+        profile_sum += t_level
+        s_level = source_skills.get(t_id, 0)
+        if s_level >= t_level:
+            continue
+        all_multipliers = [
+            (reference_learning_speed(rec, skills[t_id], skills[i]), j)
+            for i, j in source_skills.items()
+            if (t_id != i)
+        ]
+        all_multipliers.sort(key=lambda x: x[0], reverse=True)
+        d = t_level - s_level
+        for multiplier, level in all_multipliers[: rec.max_skills]:
+            level_multiplier = min(t_level, level) - min(s_level, level)
+            level_multiplier /= rec.max_skill_gap
+            d -= multiplier * d * level_multiplier
+        total_distance += d
+    if profile_sum == 0:
+        fit = 100
+    else:
+        fit = 100 * (profile_sum - total_distance) / profile_sum
+    return round(total_distance, 2), round(fit, 2)
+
+
+def random_profiles(seed, num_profiles=40, num_skills=60, dimensions=8):
+    rng = np.random.default_rng(seed)
+    skill_ids = [uuid.uuid4() for _ in range(num_skills)]
+    embeddings = rng.standard_normal((num_skills // 2, dimensions))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    skills = {}
+    for i, skill_id in enumerate(skill_ids):
+        if i % 10 == 9:
+            skills[skill_id] = None
+        else:
+            # Pairs of skills share an embedding to exercise ties
+            skills[skill_id] = embeddings[i // 2]
+    profiles = [
+        Profile(uuid.uuid4(), f"Profile {i}", "", None, "job_profile")
+        for i in range(num_profiles + 1)
+    ]
+    profile_skills = []
+    for profile in profiles:
+        for skill_index in rng.choice(num_skills, rng.integers(0, 12), replace=False):
+            profile_skills.append(
+                ProfileSkill(
+                    profile.id, skill_ids[skill_index], float(rng.integers(1, 4))
+                )
+            )
+    return profiles, profile_skills, skills
+
+
+@pytest.mark.parametrize(
+    "seed,parameters",
+    [
+        (0, {}),
+        (1, {"multiplier_baseline": 0.1}),
+        (2, {"multiplier_threshold": 2.0, "max_skills": 3}),
+        (3, {"multiplier_threshold": 2.0, "max_skills": 20}),
+    ],
+)
+def test_job_recommendation_parity(seed, parameters):
+    profiles, profile_skills, skills = random_profiles(seed)
+    source, targets = profiles[0], profiles[1:]
+    rec = JobRecommendation(LEVELS, **parameters)
+    results = rec.multiple_jobs_by_distance(
+        source,
+        targets,
+        profile_skills,
+        [Skill(i, j) for i, j in skills.items()],
+    )
+    assert len(results) == len(targets)
+    for result in results:
+        expected = reference_job_by_distance(
+            rec,
+            skills,
+            rec.profile_skills[source.id],
+            rec.profile_skills[result["profile"]["id"]],
+        )
+        assert (result["distance"], result["fit"]) == expected
+
+
+@pytest.mark.parametrize("seed", [4, 5])
+def test_job_recommendation_neighbors(seed):
+    profiles, profile_skills, skills = random_profiles(seed)
+    source, targets = profiles[0], profiles[1:]
+    skill_list = [Skill(i, j) for i, j in skills.items()]
+    expected = JobRecommendation(LEVELS).multiple_jobs_by_distance(
+        source, targets, profile_skills, skill_list
+    )
+    # Neighbors within a wider threshold than the recommendation uses
+    neighbors = [
+        (i, j, np.linalg.norm(a - b))
+        for i, a in skills.items()
+        for j, b in skills.items()
+        if i != j and a is not None and b is not None
+    ]
+    rec = JobRecommendation(LEVELS)
+    rec.add_neighbors([i for i in neighbors if i[2] <= 1.5])
+    results = rec.multiple_jobs_by_distance(source, targets, profile_skills, [])
+    assert [(i["profile"]["id"], i["distance"], i["fit"]) for i in results] == [
+        (i["profile"]["id"], i["distance"], i["fit"]) for i in expected
+    ]
+
+
+@pytest.mark.parametrize("seed", [4, 5])
+def test_job_recommendation_truncated_neighbors(seed):
+    profiles, profile_skills, skills = random_profiles(seed)
+    source, targets = profiles[0], profiles[1:]
+    skill_list = [Skill(i, j) for i, j in skills.items()]
+    expected = JobRecommendation(LEVELS).multiple_jobs_by_distance(
+        source, targets, profile_skills, skill_list
+    )
+    # Lists cut at two neighbors, distances between skills with cut lists
+    # come from their embeddings
+    neighbors = []
+    truncated = []
+    for i, a in skills.items():
+        if a is None:
+            continue
+        close = [(np.linalg.norm(a - b), j) for j, b in skills.items() if b is not None]
+        close = sorted((d, j) for d, j in close if j != i and d <= 1.0)
+        neighbors.extend((i, j, d) for d, j in close[:2])
+        if len(close) > 2:
+            truncated.append(i)
+    assert truncated
+    rec = JobRecommendation(LEVELS)
+    rec.add_neighbors(neighbors, truncated)
+    results = rec.multiple_jobs_by_distance(source, targets, profile_skills, skill_list)
+    assert [(i["profile"]["id"], i["distance"], i["fit"]) for i in results] == [
+        (i["profile"]["id"], i["distance"], i["fit"]) for i in expected
+    ]
+    # Without the fallback the pairs missing from both lists would differ
+    rec = JobRecommendation(LEVELS)
+    rec.add_neighbors(neighbors)
+    results = rec.multiple_jobs_by_distance(source, targets, profile_skills, [])
+    assert [(i["distance"], i["fit"]) for i in results] != [
+        (i["distance"], i["fit"]) for i in expected
+    ]
+
+
+@pytest.mark.parametrize(
+    "seed,parameters",
+    [
+        (6, {}),
+        (7, {"multiplier_baseline": 0.1, "max_skills": 20}),
+        (8, {"multiplier_threshold": 2.0, "max_skills": 3}),
+    ],
+)
+def test_distance_matrices(seed, parameters):
+    profiles, profile_skills, skills = random_profiles(seed)
+    sources, targets = profiles[:20], profiles[20:]
+    rec = JobRecommendation(LEVELS, **parameters)
+    rec.add_profiles(profile_skills, [Skill(i, j) for i, j in skills.items()])
+    # Small chunks to cover more than one chunk
+    distances, fits = rec.distance_matrices(sources, targets, chunk_size=7)
+    assert distances.shape == fits.shape == (len(sources), len(targets))
+    for row, source in enumerate(sources):
+        expected = rec.jobs_by_distance(source, targets)
+        assert distances[row].tolist() == [i["distance"] for i in expected]
+        assert fits[row].tolist() == [i["fit"] for i in expected]
+    # Sources without skills
+    empty = Profile(uuid.uuid4(), "Empty", "", None, "user_profile")
+    distances, fits = rec.distance_matrices([empty], targets)
+    expected = rec.jobs_by_distance(empty, targets)
+    assert distances[0].tolist() == [i["distance"] for i in expected]
+
+
+@pytest.mark.parametrize(
+    "seed,parameters",
+    [
+        (9, {}),
+        (10, {"multiplier_baseline": 0.1, "max_skills": 20}),
+        (11, {"multiplier_threshold": 2.0, "max_skills": 3}),
+    ],
+)
+def test_job_recommendation_top(seed, parameters):
+    profiles, profile_skills, skills = random_profiles(seed)
+    source, targets = profiles[0], profiles[1:]
+    skill_list = [Skill(i, j) for i, j in skills.items()]
+    rec = JobRecommendation(LEVELS, **parameters)
+    expected = rec.multiple_jobs_by_distance(
+        source, targets, profile_skills, skill_list
+    )
+    lower, upper = rec.fit_bounds(source, targets)
+    fits = {i["profile"]["id"]: i["fit"] for i in expected}
+    for target, low, high in zip(targets, lower, upper):
+        assert low - 0.01 <= fits[target.id] <= high + 0.01
+    for limit, min_fit in [(1, None), (10, None), (None, 50), (5, 60), (100, None)]:
+        results = rec.multiple_jobs_by_distance(
+            source, targets, profile_skills, skill_list, limit, min_fit
+        )
+        top = [i for i in expected if min_fit is None or i["fit"] >= min_fit]
+        assert results == top[:limit]
+
+
+def test_top_k_positions_ties():
+    values = np.array(
+        [
+            [0.5, 0.9, 0.5, 0.1, 0.5],
+            [0.0, 0.0, 0.0, 0.0, 0.0],
+            [0.3, -np.inf, 0.7, 0.7, 0.2],
+        ]
+    )
+    assert top_k_positions(values, 3).tolist() == [[1, 0, 2], [0, 1, 2], [2, 3, 0]]
+    assert top_k_positions(values, 10).shape == (3, 5)
+    assert top_k_positions(values, 0).shape == (3, 0)
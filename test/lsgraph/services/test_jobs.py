@@ -0,0 +1,35 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from lsgraph.models import db
+from lsgraph.services.jobs import submit_job
+from lsgraph.services.organization import bump_skill_data_version
+
+
+def test_submit_job_reuse(lsgraph_client, test_data_2org):
+    org_id = test_data_2org[0][1]["id"]
+    parameters = {"profiles": ["a", "b"], "mode": "fit"}
+    with lsgraph_client.application.app_context():
+        job, created = submit_job(org_id, "test", parameters)
+        assert created
+        reused, created = submit_job(org_id, "test", dict(reversed(parameters.items())))
+        assert not created
+        assert reused.id == job.id
+        # Changed skill data is not answered with the earlier result
+        bump_skill_data_version([org_id])
+        db.session.commit()
+        new_job, created = submit_job(org_id, "test", parameters)
+        assert created
+        assert new_job.id != job.id
@@ -0,0 +1,76 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import uuid
+
+from lsgraph.services.profile_matrix import ProfileMatrixCache, ProfileSkillMatrix
+
+
+def test_profile_skill_matrix():
+    p1, p2, p3 = (uuid.uuid4() for _ in range(3))
+    s1, s2, s3 = (uuid.uuid4() for _ in range(3))
+    rows = [(p1, s1, 1), (p2, s2, 3), (p1, s3, 2), (p2, s1, 2), (p1, s2, 3)]
+    matrix = ProfileSkillMatrix(rows)
+    assert len(matrix) == 2
+    assert p1 in matrix
+    assert p3 not in matrix
+    assert matrix.indptr.tolist() == [0, 3, 5]
+    assert list(matrix.skills(p1).items()) == [(s1, 1), (s3, 2), (s2, 3)]
+    assert list(matrix.skills(p2).items()) == [(s2, 3), (s1, 2)]
+    assert matrix.skills(p3) == {}
+    assert set(matrix.profile_skill_ids([p2, p3])) == {s1, s2}
+    assert matrix.profile_skill_ids([p3]) == []
+
+
+def test_profile_skill_matrix_empty():
+    matrix = ProfileSkillMatrix([])
+    assert len(matrix) == 0
+    assert matrix.skills(uuid.uuid4()) == {}
+    assert matrix.profile_skill_ids([uuid.uuid4()]) == []
+
+
+def test_profile_matrix_cache(lsgraph_client):
+    app = lsgraph_client.application
+    cache = ProfileMatrixCache()
+    org_id = uuid.uuid4()
+    matrix = ProfileSkillMatrix([])
+    with app.app_context():
+        assert cache.get(org_id, 0) is None
+        cache.add(org_id, 0, matrix)
+        assert cache.get(org_id, 0) is matrix
+        assert cache.get(org_id, 1) is None
+        cache.clear()
+        assert cache.get(org_id, 0) is None
+
+
+def test_profile_matrix_cache_size(lsgraph_client):
+    app = lsgraph_client.application
+    cache = ProfileMatrixCache()
+    org_ids = [uuid.uuid4() for _ in range(3)]
+    matrix = ProfileSkillMatrix([])
+    with app.app_context():
+        size = app.config["PROFILE_MATRIX_CACHE_SIZE"]
+        app.config["PROFILE_MATRIX_CACHE_SIZE"] = 2
+        try:
+            cache.add(org_ids[0], 0, matrix)
+            cache.add(org_ids[1], 0, matrix)
+            assert cache.get(org_ids[0], 0) is matrix
+            cache.add(org_ids[2], 0, matrix)
+        finally:
+            app.config["PROFILE_MATRIX_CACHE_SIZE"] = size
+    # The least recently used organization is dropped
+    assert cache.get(org_ids[0], 0) is matrix
+    assert cache.get(org_ids[1], 0) is None
+    assert cache.get(org_ids[2], 0) is matrix
@@ -0,0 +1,80 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+import uuid
+
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.resource_access import refresh_user_access
+from ..shared import (
+    add_members_to_collection,
+    add_resources_to_collection,
+    create_collection,
+    create_resource,
+    create_user,
+)
+
+
+def test_refresh_user_access_concurrent(lsgraph_client, test_data_2org):
+    org_id = test_data_2org[0][1]["id"]
+    user_id = create_user(lsgraph_client, test_data_2org[0])["id"]
+    resource = create_resource(lsgraph_client, test_data_2org[0])
+    collection = create_collection(lsgraph_client, test_data_2org[0])
+    add_resources_to_collection(
+        lsgraph_client,
+        test_data_2org[0],
+        collection,
+        resources={"resources": [{"resource_id": resource["id"]}]},
+    )
+    add_members_to_collection(
+        lsgraph_client,
+        test_data_2org[0],
+        collection,
+        members={"members": [{"user_id": user_id, "edit": False}]},
+    )
+    app = lsgraph_client.application
+    refreshed = threading.Event()
+    errors = []
+
+    def refresh(first):
+        with app.app_context():
+            try:
+                if not first:
+                    refreshed.wait()
+                refresh_user_access(org_id, [user_id])
+                if first:
+                    # The second refresh runs while this one is uncommitted
+                    refreshed.set()
+                    time.sleep(0.2)
+                db.session.commit()
+            except Exception as error:
+                errors.append(error)
+                db.session.rollback()
+            finally:
+                refreshed.set()
+
+    threads = [threading.Thread(target=refresh, args=(i,)) for i in (True, False)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with app.app_context():
+        access = models.UserResourceAccess.query.filter_by(
+            user_id=uuid.UUID(user_id)
+        ).all()
+        assert [i.resource_id for i in access] == [uuid.UUID(resource["id"])]
@@ -0,0 +1,83 @@
+# Copyright (C) 2021  Learnershape and contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from lsgraph.services.skill_tree import SkillTree, collect_descendants
+
+
+def build_tree():
+    children = {
+        "root": ["a", "b"],
+        "a": ["a1", "a2"],
+        "a2": ["a21"],
+        "b": ["b1"],
+    }
+    return SkillTree("root", children)
+
+
+def test_descendants():
+    tree = build_tree()
+    assert list(tree.descendants("root")) == ["a", "a1", "a2", "a21", "b", "b1"]
+    assert list(tree.descendants("a")) == ["a1", "a2", "a21"]
+    assert list(tree.descendants("a21")) == []
+    assert tree.num_descendants("root") == 6
+    assert tree.num_descendants("a2") == 1
+
+
+def test_ancestors():
+    tree = build_tree()
+    assert tree.ancestors("a21") == ["a2", "a", "root"]
+    assert tree.ancestors("root") == []
+    assert tree.is_ancestor("a", "a21")
+    assert not tree.is_ancestor("b", "a21")
+    assert not tree.is_ancestor("a21", "a21")
+
+
+def test_child_skills():
+    tree = build_tree()
+    assert tree.child_skills("root") == ["a", "b"]
+    assert tree.child_skills("b1") == []
+    assert "b1" in tree
+    assert "c" not in tree
+
+
+def test_deep_tree():
+    depth = 5000
+    children = {i: [i + 1] for i in range(depth)}
+    tree = SkillTree(0, children)
+    assert tree.num_descendants(0) == depth
+    assert len(tree.ancestors(depth)) == depth
+
+
+def test_collect_descendants_overlapping():
+    children = {
+        "root": ["a", "b"],
+        "a": ["a1", "a2"],
+        "a2": ["a21"],
+        "b": ["b1"],
+    }
+    output = collect_descendants(children, ["a2", "root", "a", "missing"])
+    assert list(output["root"]) == ["a", "a1", "a2", "a21", "b", "b1"]
+    assert list(output["a"]) == ["a1", "a2", "a21"]
+    assert list(output["a2"]) == ["a21"]
+    assert list(output["missing"]) == []
+
+
+def test_collect_descendants_deep():
+    depth = 5000
+    children = {i: [i + 1] for i in range(depth)}
+    output = collect_descendants(children, [0, depth // 2])
+    assert len(output[0]) == depth
+    assert len(output[depth // 2]) == depth - depth // 2
@@ -17,6 +17,13 @@
 from datetime import datetime
 import pdb
 import pytest
+import uuid
+
+from lsgraph.config import SECRET_KEY
+from lsgraph.models import AccessKey, Organization, db
+from lsgraph.services.credentials import credential_cache, rejections
+from lsgraph.utils.access_key import AccessKey as AccessKeyGen
+from ..conftest import create_customer
 
 
 def test_access_no_headers(lsgraph_client):
@@ -32,6 +39,119 @@ def test_access_bad_headers(lsgraph_client):
     assert response.status_code == 403
 
 
+def test_access_cached_credentials(lsgraph_client):
+    time = datetime.now().strftime("%Y%M%d-%H%m%S-%f")
+    customer_id, access_id, access_secret = create_customer(
+        time, f"{time}@learnershape.com"
+    )
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    response = lsgraph_client.get("/api/v1/organizations/", headers=headers)
+    assert response.status_code == 200
+    hits = credential_cache.hits
+    response = lsgraph_client.get("/api/v1/organizations/", headers=headers)
+    assert response.status_code == 200
+    assert credential_cache.hits == hits + 1
+    # A cached key still needs its secret
+    response = lsgraph_client.get(
+        "/api/v1/organizations/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret[:-1]},
+    )
+    assert response.status_code == 403
+    # Revoking the key drops its cached credentials
+    with lsgraph_client.application.app_context():
+        db.session.delete(AccessKey.query.filter_by(access_key=access_id).one())
+        db.session.commit()
+    response = lsgraph_client.get("/api/v1/organizations/", headers=headers)
+    assert response.status_code == 403
+
+
+def test_access_invalidated_on_commit(lsgraph_client):
+    time = datetime.now().strftime("%Y%M%d-%H%m%S-%f")
+    customer_id, access_id, access_secret = create_customer(
+        time, f"{time}@learnershape.com"
+    )
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    response = lsgraph_client.get("/api/v1/organizations/", headers=headers)
+    assert response.status_code == 200
+    with lsgraph_client.application.app_context():
+        db.session.delete(AccessKey.query.filter_by(access_key=access_id).one())
+        db.session.flush()
+        # Flushed but uncommitted changes keep the cached credentials
+        assert access_id in credential_cache.credentials
+        db.session.rollback()
+        assert access_id in credential_cache.credentials
+        db.session.delete(AccessKey.query.filter_by(access_key=access_id).one())
+        db.session.commit()
+        assert access_id not in credential_cache.credentials
+
+
+def test_access_organization_added_elsewhere(lsgraph_client):
+    time = datetime.now().strftime("%Y%M%d-%H%m%S-%f")
+    customer_id, access_id, access_secret = create_customer(
+        time, f"{time}@learnershape.com"
+    )
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    response = lsgraph_client.get("/api/v1/organizations/", headers=headers)
+    assert response.status_code == 200
+    # Inserted without the ORM, as another process's change goes unnoticed
+    org_id = uuid.uuid4()
+    with lsgraph_client.application.app_context():
+        db.session.execute(
+            Organization.__table__.insert().values(
+                id=org_id, name=time, customer_id=customer_id
+            )
+        )
+        db.session.commit()
+    assert access_id in credential_cache.credentials
+    # Recently loaded credentials are not reloaded
+    response = lsgraph_client.get(f"/api/v1/organizations/{org_id}/", headers=headers)
+    assert response.status_code == 401
+    interval = lsgraph_client.application.config["ACCESS_KEY_RELOAD_INTERVAL"]
+    credential_cache.loaded_at[access_id] -= interval
+    response = lsgraph_client.get(f"/api/v1/organizations/{org_id}/", headers=headers)
+    assert response.status_code == 200
+    # Organizations the customer does not own are still rejected, and
+    # requests for them don't reload the credentials again
+    loaded_at = credential_cache.loaded_at[access_id]
+    for _ in range(2):
+        response = lsgraph_client.get(
+            f"/api/v1/organizations/{uuid.uuid4()}/", headers=headers
+        )
+        assert response.status_code == 401
+    assert credential_cache.loaded_at[access_id] == loaded_at
+
+
+def test_access_rejection_stages(lsgraph_client):
+    def get_organizations(access_id, access_secret):
+        return lsgraph_client.get(
+            "/api/v1/organizations/",
+            headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        )
+
+    counts = rejections.copy()
+    response = get_organizations("LSdummy", "dummy")
+    assert response.status_code == 403
+    assert rejections["checksum"] == counts["checksum"] + 1
+    # A well-formed unknown pair is looked up once
+    access_id, access_secret = AccessKeyGen(SECRET_KEY).generate_pair()
+    for _ in range(2):
+        response = get_organizations(access_id, access_secret)
+        assert response.status_code == 403
+    assert rejections["database"] == counts["database"] + 1
+    assert rejections["rejected_cache"] == counts["rejected_cache"] + 1
+    # Adding the key drops it from the rejected keys
+    customer_id, _, _ = create_customer(access_id, f"{access_id}@learnershape.com")
+    with lsgraph_client.application.app_context():
+        db.session.add(
+            AccessKey(
+                access_key=access_id, secret_key=access_secret, customer_id=customer_id
+            )
+        )
+        db.session.commit()
+    response = get_organizations(access_id, access_secret)
+    assert response.status_code == 200
+
+
 def test_organization_get(lsgraph_client, lsgraph_admin_user):
     customer_id, access_id, access_secret = lsgraph_admin_user
     response = lsgraph_client.get(
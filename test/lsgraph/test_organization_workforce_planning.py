@@ -18,6 +18,8 @@ from datetime import datetime
 import pdb
 import pytest
 
+from lsgraph import models
+from lsgraph.api_v1.views import organizations
 from .test_profile import create_profile
 from .test_user_job_recommendations import update_profile
 
@@ -132,3 +134,248 @@ def test_workforce_planning_group(lsgraph_client, test_data_2org):
         assert i["user"] in user_ids
         for j in i["recommendations"]:
             assert j["profile"] in profile_ids
+
+
+@pytest.mark.parametrize("mode", ["optimal", "greedy"])
+def test_workforce_planning_mode(lsgraph_client, test_data_2org, mode):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    profiles = []
+    for i in range(2):
+        new_profile = create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": i["id"], "level_name": "Beginner"}
+                for i in collection1["skills"][-2 - i :]
+            ],
+        )
+        profiles.append(new_profile)
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        json={
+            "users": [i["id"] for i in collection1["users"]],
+            "targets": [
+                {"profile": i["id"], "number_needed": 1, "max_training": 100}
+                for i in profiles
+            ],
+            "mode": mode,
+        },
+    )
+    assert response.status_code == 200
+    num_users = len(collection1["users"])
+    assigned = [len(i["recommendations"]) for i in response.json["targets_by_user"]]
+    filled = [len(i["recommendations"]) for i in response.json["users_by_target"]]
+    if mode == "optimal":
+        assert max(assigned) == 1
+        assert filled == [1, 1]
+    else:
+        assert assigned == [2] * num_users
+        assert filled == [num_users, num_users]
+
+
+def test_workforce_planning_invalid_mode(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org1['id']}/workforce_planning/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        json={"users": [], "targets": [], "mode": "fastest"},
+    )
+    assert response.status_code == 422
+
+
+def test_workforce_planning_job(lsgraph_client, test_data_2org, eager_celery):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    org_id = org1["id"]
+    profiles = [
+        create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": j["id"], "level_name": "Beginner"}
+                for j in collection1["skills"][-2 - i :]
+            ],
+        )
+        for i in range(3)
+    ]
+    query = {
+        "users": [i["id"] for i in collection1["users"]],
+        "targets": [
+            {"profile": i["id"], "number_needed": 1, "max_training": 100}
+            for i in profiles
+        ],
+    }
+    expected = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/",
+        headers=headers,
+        json=query,
+    )
+    # One source profile per distance task
+    config = lsgraph_client.application.config
+    chunk_size = config["WORKFORCE_PLANNING_CHUNK_SIZE"]
+    config["WORKFORCE_PLANNING_CHUNK_SIZE"] = 1
+    try:
+        response = lsgraph_client.post(
+            f"/api/v1/organizations/{org_id}/workforce_planning/jobs/",
+            headers=headers,
+            json=query,
+        )
+    finally:
+        config["WORKFORCE_PLANNING_CHUNK_SIZE"] = chunk_size
+    assert response.status_code == 202
+    job_id = response.json["id"]
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org_id}/workforce_planning/jobs/{job_id}/",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json["status"] == "success"
+    assert response.json["progress"] == 1
+    # The same query reuses the finished job
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/jobs/",
+        headers=headers,
+        json=query,
+    )
+    assert response.status_code == 202
+    assert response.json["id"] == job_id
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org_id}/workforce_planning/jobs/{job_id}/result/",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json == expected.json
+    # Jobs are only visible to their organization
+    _, access_id2, access_secret2 = c2
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org2['id']}/workforce_planning/jobs/{job_id}/result/",
+        headers={"X-API-Key": access_id2, "X-Auth-Token": access_secret2},
+    )
+    assert response.status_code == 404
+
+
+def test_workforce_replanning(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    org_id = org1["id"]
+    profiles = [
+        create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": j["id"], "level_name": "Beginner"}
+                for j in collection1["skills"][-2 - i :]
+            ],
+        )
+        for i in range(2)
+    ]
+    query = {
+        "users": [i["id"] for i in collection1["users"]],
+        "targets": [
+            {"profile": i["id"], "number_needed": 1, "max_training": 100}
+            for i in profiles
+        ],
+    }
+    # Nothing is cached before a first plan
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/replan/",
+        headers=headers,
+        json=query,
+    )
+    assert response.status_code == 409
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/",
+        headers=headers,
+        json=query,
+    )
+    assert response.status_code == 200
+    # Re-planning with unchanged constraints gives the same plan
+    expected = response.json
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/replan/",
+        headers=headers,
+        json=query,
+    )
+    assert response.status_code == 200
+    assert response.json == expected
+    # Only the constraints change for a re-plan
+    for target in query["targets"]:
+        target["max_training"] = 0
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/replan/",
+        headers=headers,
+        json=query,
+    )
+    assert response.status_code == 200
+    for i in response.json["users_by_target"]:
+        for j in i["recommendations"]:
+            assert j["distance"] <= 0
+    # Changing profile skills discards the cached distances
+    update_profile(
+        lsgraph_client,
+        test_data_2org[0],
+        profiles[0]["id"],
+        [{"skill": collection1["skills"][0]["id"], "level_name": "Beginner"}],
+    )
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/replan/",
+        headers=headers,
+        json=query,
+    )
+    assert response.status_code == 409
+
+
+def test_workforce_planning_job_failures(lsgraph_client, test_data_2org, monkeypatch):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    org_id = org1["id"]
+    other = create_profile(lsgraph_client, test_data_2org[1], skills=[])
+    profile = create_profile(lsgraph_client, test_data_2org[0], skills=[])
+
+    def query(profile_id):
+        return {
+            "users": [i["id"] for i in collection1["users"]],
+            "targets": [
+                {"profile": profile_id, "number_needed": 1, "max_training": 100}
+            ],
+        }
+
+    # Profiles of other organizations are rejected without creating a job
+    app = lsgraph_client.application
+    with app.app_context():
+        jobs = models.Job.query.filter_by(organization_id=org_id).count()
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/jobs/",
+        headers=headers,
+        json=query(other["id"]),
+    )
+    assert response.status_code == 403
+    with app.app_context():
+        assert models.Job.query.filter_by(organization_id=org_id).count() == jobs
+
+    # Jobs whose tasks cannot be queued are failed rather than left pending
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("Broker unavailable")
+
+    monkeypatch.setattr(organizations, "chord", unavailable)
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/workforce_planning/jobs/",
+        headers=headers,
+        json=query(profile["id"]),
+    )
+    assert response.status_code == 500
+    with app.app_context():
+        job = (
+            models.Job.query.filter_by(organization_id=org_id)
+            .order_by(models.Job.created_at.desc())
+            .first()
+        )
+        assert job.status == "failure"
+        assert "Broker unavailable" in job.error
@@ -146,6 +146,12 @@ def test_profile_update_levels(lsgraph_client, test_data_2org):
     )
     profile_id = new_profile["id"]
     skill_id = collection1["skills"][-1]["id"]
+    # Cache the profile skill matrix before the update
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org_id}/profiles/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+    )
+    assert response.status_code == 200
     skills_update = {"skills": [{"skill": skill_id, "level_name": "Intermediate"}]}
     response = lsgraph_client.post(
         f"/api/v1/organizations/{org_id}/profiles/{profile_id}/skills/",
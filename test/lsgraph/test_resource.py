@@ -14,12 +14,15 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import base64
 from datetime import datetime, timedelta, timezone
+import json
 import pdb
 import pytest
 
 from .shared import (
     create_collection,
+    create_user,
     add_resources_to_collection,
     add_members_to_collection,
     create_resource,
@@ -43,6 +46,54 @@ def test_resources_get(lsgraph_client, test_data_2org):
     assert "resources" in response.json.keys()
 
 
+def test_resources_get_pages(lsgraph_client, test_data_2org):
+    """Get resource list page by page"""
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    for name in ["page b", "page a", "page b", "page c"]:
+        create_resource(lsgraph_client, test_data_2org[0], resource_name=name)
+    url = f"/api/v1/organizations/{org_id}/resources/"
+    response = lsgraph_client.get(f"{url}?limit=1000", headers=headers)
+    assert response.status_code == 200
+    assert response.json["next_cursor"] is None
+    expected = response.json["resources"]
+    names = [i["name"] for i in expected if i["name"].startswith("page ")]
+    assert names == ["page a", "page b", "page b", "page c"]
+    resources = []
+    cursor = ""
+    while cursor is not None:
+        response = lsgraph_client.get(f"{url}?limit=2{cursor}", headers=headers)
+        assert response.status_code == 200
+        assert len(response.json["resources"]) <= 2
+        resources.extend(response.json["resources"])
+        cursor = response.json["next_cursor"]
+        if cursor is not None:
+            cursor = f"&cursor={cursor}"
+    assert [i["id"] for i in resources] == [i["id"] for i in expected]
+    response = lsgraph_client.get(f"{url}?cursor=invalid", headers=headers)
+    assert response.status_code == 422
+    # Well-formed cursors with values of the wrong type or made for the
+    # other ordering
+    resource_id = expected[0]["id"]
+    for query, cursor in [
+        ("", ["page a", resource_id]),
+        ("", ["name", 5, 6]),
+        ("", ["name", "a", 6]),
+        ("", ["name", 5, resource_id]),
+        ("", ["name", "a", "not a uuid"]),
+        ("", ["rank", 1.5, resource_id]),
+        ("query=page&", ["name", "x", resource_id]),
+        ("query=page&", ["rank", "x", resource_id]),
+        ("query=page&", ["rank", True, resource_id]),
+    ]:
+        text = json.dumps(cursor).encode("utf-8")
+        cursor = base64.urlsafe_b64encode(text).decode("ascii")
+        response = lsgraph_client.get(f"{url}?{query}cursor={cursor}", headers=headers)
+        assert response.status_code == 422
+
+
 def test_resources_get_query(lsgraph_client, test_data_2org):
     """Get resource list for query"""
     (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
@@ -63,6 +114,45 @@ def test_resources_get_query(lsgraph_client, test_data_2org):
     assert resources["pear"]["id"] not in [i["id"] for i in response.json["resources"]]
 
 
+def test_resources_search_ranked(lsgraph_client, test_data_2org):
+    """Search resources by rank"""
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    # Names outrank descriptions, more matches outrank fewer
+    names = ["mango", "mango mango", "about fruit", "another fruit", "a fruit"]
+    resources = [
+        create_resource(lsgraph_client, test_data_2org[0], resource_name=i)
+        for i in names
+    ]
+    url = f"/api/v1/organizations/{org_id}/resources/?query=mango"
+    response = lsgraph_client.get(url, headers=headers)
+    assert response.status_code == 200
+    found = [i["id"] for i in response.json["resources"]]
+    assert found.index(resources[1]["id"]) < found.index(resources[0]["id"])
+    ranks = [i["rank"] for i in response.json["resources"]]
+    assert ranks == sorted(ranks, reverse=True)
+    assert "headline" not in response.json["resources"][0]
+    # Pages of ranked results
+    url = f"/api/v1/organizations/{org_id}/resources/?query=fruit&highlight=true"
+    response = lsgraph_client.get(f"{url}&limit=1000", headers=headers)
+    expected = [i["id"] for i in response.json["resources"]]
+    assert {i["id"] for i in resources[2:]} <= set(expected)
+    found = []
+    cursor = ""
+    while cursor is not None:
+        response = lsgraph_client.get(f"{url}&limit=2{cursor}", headers=headers)
+        assert response.status_code == 200
+        for resource in response.json["resources"]:
+            assert "<b>fruit</b>" in resource["headline"]
+        found.extend(i["id"] for i in response.json["resources"])
+        cursor = response.json["next_cursor"]
+        if cursor is not None:
+            cursor = f"&cursor={cursor}"
+    assert found == expected
+
+
 def test_resources_get_user_collection(lsgraph_client, test_data_2org):
     """Get resource list for user"""
     (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
@@ -158,6 +248,119 @@ def test_resources_get_group_collection(lsgraph_client, test_data_2org):
     ]
 
 
+def test_resources_user_access_changes(lsgraph_client, test_data_2org):
+    """User resource list follows collection and group changes"""
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    user = create_user(lsgraph_client, test_data_2org[0])
+    user_id = user["id"]
+    resource = create_resource(lsgraph_client, test_data_2org[0])
+    collection = create_collection(lsgraph_client, test_data_2org[0])
+    group = create_group(lsgraph_client, test_data_2org[0], members=[{"id": user_id}])
+    add_resources_to_collection(
+        lsgraph_client,
+        test_data_2org[0],
+        collection,
+        resources={"resources": [{"resource_id": resource["id"]}]},
+    )
+
+    def user_resources():
+        response = lsgraph_client.get(
+            f"/api/v1/organizations/{org_id}/resources/?user={user_id}",
+            headers=headers,
+        )
+        assert response.status_code == 200
+        return [i["id"] for i in response.json["resources"]]
+
+    assert user_resources() == []
+    # Access directly and through a group is listed once
+    add_members_to_collection(
+        lsgraph_client,
+        test_data_2org[0],
+        collection,
+        members={
+            "members": [
+                {"user_id": user_id, "edit": False},
+                {"group_id": group["id"], "edit": False},
+            ]
+        },
+    )
+    assert user_resources() == [resource["id"]]
+    collection_url = f"/api/v1/organizations/{org_id}/collections/{collection['id']}"
+    response = lsgraph_client.delete(
+        f"{collection_url}/members/{user_id}/", headers=headers
+    )
+    assert response.status_code == 204
+    assert user_resources() == [resource["id"]]
+    response = lsgraph_client.delete(
+        f"/api/v1/organizations/{org_id}/groups/{group['id']}/members/{user_id}/",
+        headers=headers,
+    )
+    assert response.status_code == 204
+    assert user_resources() == []
+    # Access through a group follows the collection's resources
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/groups/{group['id']}/members/",
+        headers=headers,
+        json={"members": [{"id": user_id}]},
+    )
+    assert response.status_code == 200
+    assert user_resources() == [resource["id"]]
+    response = lsgraph_client.delete(
+        f"{collection_url}/resources/{resource['id']}/", headers=headers
+    )
+    assert response.status_code == 204
+    assert user_resources() == []
+
+
+def test_resources_user_access_other_collection(lsgraph_client, test_data_2org):
+    """Removing a resource from a collection keeps access through another"""
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    user_id = create_user(lsgraph_client, test_data_2org[0])["id"]
+    resource = create_resource(lsgraph_client, test_data_2org[0])
+    collections = [create_collection(lsgraph_client, test_data_2org[0]) for _ in "ab"]
+    for collection in collections:
+        add_members_to_collection(
+            lsgraph_client,
+            test_data_2org[0],
+            collection,
+            members={"members": [{"user_id": user_id, "edit": False}]},
+        )
+        add_resources_to_collection(
+            lsgraph_client,
+            test_data_2org[0],
+            collection,
+            resources={"resources": [{"resource_id": resource["id"]}]},
+        )
+
+    def user_resources():
+        response = lsgraph_client.get(
+            f"/api/v1/organizations/{org_id}/resources/?user={user_id}",
+            headers=headers,
+        )
+        assert response.status_code == 200
+        return [i["id"] for i in response.json["resources"]]
+
+    def remove_resource(collection):
+        response = lsgraph_client.delete(
+            f"/api/v1/organizations/{org_id}/collections/{collection['id']}"
+            f"/resources/{resource['id']}/",
+            headers=headers,
+        )
+        assert response.status_code == 204
+
+    assert user_resources() == [resource["id"]]
+    remove_resource(collections[0])
+    assert user_resources() == [resource["id"]]
+    remove_resource(collections[1])
+    assert user_resources() == []
+
+
 def test_resources_post(lsgraph_client, test_data_2org):
     """Create a new resource"""
     (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
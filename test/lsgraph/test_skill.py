@@ -13,10 +13,39 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from datetime import datetime
 import pdb
+import numpy as np
 import pytest
+import uuid
 
+from lsgraph import models
+from lsgraph.models import db
+from lsgraph.services.skill import (
+    OrganizationEmbeddings,
+    build_skill_paths,
+    embed_pending_skills,
+    get_descendant_skills,
+    get_skill_neighbors,
+    get_truncated_skills,
+    update_skill_embeddings,
+    update_skill_neighbors,
+)
+from lsgraph.services.skill_tree import get_skill_trees, skill_tree_cache
 from .shared import create_skills
+from ..conftest import create_customer, create_organization
+
+
+@pytest.fixture
+def vector_org(lsgraph_client):
+    """An organization of its own for tests that store hand-made embeddings
+
+    Their vectors do not match the embedder's dimension, so they must not
+    share an organization with skills embedded by other tests"""
+    time = datetime.now().strftime("%Y%M%d-%H%m%S-%f")
+    customer = create_customer(time, f"{time}@learnershape.com")
+    org = create_organization(f"{time}_org", customer, lsgraph_client)
+    return customer, org, {}
 
 
 def test_skill_get(lsgraph_client, test_data_2org):
@@ -80,3 +109,213 @@ def test_skill_post(lsgraph_client, test_data_2org):
     )
     assert response.status_code == 200
     assert response.json["name"] == "Skill 1"
+
+
+def test_skill_nested_details(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    # Create a chain of skills
+    parent = create_skills(lsgraph_client, test_data_2org[0], skills=["chain 0"])[0]
+    chain = [parent]
+    for i in range(1, 4):
+        chain.extend(
+            create_skills(
+                lsgraph_client,
+                test_data_2org[0],
+                root_skill=chain[-1]["id"],
+                skills=[f"chain {i}"],
+            )
+        )
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org_id}/skills/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+    )
+    assert response.status_code == 200
+    skills = {i["id"]: i for i in response.json["skills"]}
+    for depth, skill in enumerate(chain):
+        details = skills[skill["id"]]
+        assert details["path"] == "|".join(
+            ["Root"] + [f"chain {i}" for i in range(depth)]
+        )
+        assert details["num_descendants"] == len(chain) - depth - 1
+    with lsgraph_client.application.app_context():
+        descendants, children = get_descendant_skills(uuid.UUID(chain[0]["id"]))
+    assert descendants[uuid.UUID(chain[0]["id"])] == [
+        uuid.UUID(i["id"]) for i in chain[1:]
+    ]
+
+
+def test_skill_tree_invalidated_on_commit(lsgraph_client, test_data_2org):
+    parent = create_skills(lsgraph_client, test_data_2org[0], skills=["commit 0"])[0]
+    child = create_skills(
+        lsgraph_client,
+        test_data_2org[0],
+        root_skill=parent["id"],
+        skills=["commit 1"],
+    )[0]
+    child_id = uuid.UUID(child["id"])
+    with lsgraph_client.application.app_context():
+        tree = get_skill_trees([child_id])[child_id]
+        assert skill_tree_cache.get(child_id) is tree
+        db.session.delete(models.SkillInclude.query.filter_by(child_id=child_id).one())
+        db.session.flush()
+        assert skill_tree_cache.get(child_id) is None
+        # A concurrent request rebuilding the tree before the commit
+        skill_tree_cache.add(tree)
+        db.session.commit()
+        assert skill_tree_cache.get(child_id) is None
+
+
+def test_skill_embedding_batch(lsgraph_client, vector_org):
+    parent = create_skills(lsgraph_client, vector_org, skills=["batch 0"])[0]
+    chain = [parent]
+    for i in range(1, 3):
+        chain.extend(
+            create_skills(
+                lsgraph_client,
+                vector_org,
+                root_skill=chain[-1]["id"],
+                skills=[f"batch {i}"],
+            )
+        )
+    skill_ids = [uuid.UUID(i["id"]) for i in chain]
+    with lsgraph_client.application.app_context():
+        paths = build_skill_paths(skill_ids)
+        assert [paths[i] for i in skill_ids] == [
+            "batch 0",
+            "batch 0, batch 1",
+            "batch 0, batch 1, batch 2",
+        ]
+        vectors = np.arange(len(skill_ids) * 4, dtype=float).reshape(-1, 4)
+        update_skill_embeddings(skill_ids, vectors)
+        db.session.commit()
+        for skill_id, vector in zip(skill_ids, vectors):
+            skill = models.Skill.query.get(skill_id)
+            assert np.array_equal(skill.skill_embedding, vector)
+        # Only the first two skills are within the neighbor threshold
+        vectors = np.array([[1.0, 0, 0, 0], [1.0, 0.5, 0, 0], [0, 0, 0, 1.0]])
+        update_skill_embeddings(skill_ids, vectors)
+        update_skill_neighbors(skill_ids)
+        db.session.commit()
+        neighbors = get_skill_neighbors(skill_ids)
+        assert sorted((i, j) for i, j, _ in neighbors) == sorted(
+            [(skill_ids[0], skill_ids[1]), (skill_ids[1], skill_ids[0])]
+        )
+        assert [d for _, _, d in neighbors] == pytest.approx([0.5, 0.5])
+        # Each skill lists its nearest neighbor. Lists of the skills near
+        # an updated skill are recomputed, the first and last skills are
+        # paired in neither list
+        config = lsgraph_client.application.config
+        limit = config["SKILL_NEIGHBOR_LIMIT"]
+        config["SKILL_NEIGHBOR_LIMIT"] = 1
+        try:
+            update_skill_neighbors(skill_ids)
+            db.session.commit()
+            assert get_truncated_skills(skill_ids) == set()
+            update_skill_embeddings(skill_ids[2:], np.array([[1.0, 0.8, 0, 0]]))
+            update_skill_neighbors(skill_ids[2:])
+        finally:
+            config["SKILL_NEIGHBOR_LIMIT"] = limit
+        db.session.commit()
+        neighbors = get_skill_neighbors(skill_ids)
+        assert sorted((i, j) for i, j, _ in neighbors) == sorted(
+            [
+                (skill_ids[0], skill_ids[1]),
+                (skill_ids[1], skill_ids[2]),
+                (skill_ids[2], skill_ids[1]),
+            ]
+        )
+        assert get_truncated_skills(skill_ids) == set(skill_ids)
+
+
+def test_organization_embeddings_refresh(lsgraph_client, vector_org):
+    skills = create_skills(
+        lsgraph_client, vector_org, skills=["refresh 0", "refresh 1"]
+    )
+    skill_ids = [uuid.UUID(i["id"]) for i in skills]
+    org_id = vector_org[1]["id"]
+    with lsgraph_client.application.app_context():
+        root_id = models.Organization.query.get(org_id).root_skill_id
+        embeddings = OrganizationEmbeddings(root_id)
+        update_skill_embeddings(skill_ids[:1], np.array([[0, 1.0, 0, 0]]))
+        embeddings.refresh()
+        assert skill_ids[0] in embeddings.index
+        assert skill_ids[1] not in embeddings.index
+        # Only the newly embedded skill is added
+        update_skill_embeddings(skill_ids[1:], np.array([[0, 0, 1.0, 0]]))
+        embeddings.refresh()
+        row = embeddings.index[skill_ids[1]]
+        assert np.array_equal(embeddings.matrix[row], [0, 0, 1.0, 0])
+        assert len(embeddings.ids) == len(embeddings.matrix)
+        db.session.rollback()
+
+
+def test_skill_embedding_sweep_skips_roots(lsgraph_client, test_data_2org):
+    skill = create_skills(lsgraph_client, test_data_2org[0], skills=["sweep"])[0]
+    org_id = test_data_2org[0][1]["id"]
+    with lsgraph_client.application.app_context():
+        root_id = models.Organization.query.get(org_id).root_skill_id
+        embed_pending_skills([root_id, skill["id"]])
+        assert models.Skill.query.get(root_id).skill_embedding is None
+        assert models.Skill.query.get(skill["id"]).skill_embedding is not None
+
+
+def test_skill_import_graph(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    parent = create_skills(lsgraph_client, test_data_2org[0], skills=["imported"])[0]
+    graph = {
+        "software": {"languages": {"python": {}, "rust": {}}, "testing": {}},
+        "design": {},
+    }
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/skills/import/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        json={"parent": parent["id"], "graph": graph},
+    )
+    assert response.status_code == 200
+    assert response.json["count"] == 6
+    imported = {i["key"]: i for i in response.json["skills"]}
+    assert imported["software|languages|python"]["parent"] == "software|languages"
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org_id}/skills/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+    )
+    skills = {i["id"]: i for i in response.json["skills"]}
+    python = skills[imported["software|languages|python"]["id"]]
+    assert python["path"] == "Root|imported|software|languages"
+    assert skills[parent["id"]]["num_descendants"] == 6
+
+
+def test_skill_import_list(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    root_skill_id = org1["root_skill"]["id"]
+    skills = [
+        {"key": "b", "parent": "a", "name": "list b"},
+        {"key": "a", "parent": None, "name": "list a"},
+        {"key": "c", "parent": "b", "name": "list c"},
+    ]
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/skills/import/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        json={"parent": root_skill_id, "skills": skills},
+    )
+    assert response.status_code == 200
+    assert [i["key"] for i in response.json["skills"]] == ["a", "b", "c"]
+    # Unknown parents and parents outside the organization are rejected
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/skills/import/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        json={"parent": root_skill_id, "skills": [skills[0]]},
+    )
+    assert response.status_code == 403
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org_id}/skills/import/",
+        headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+        json={"parent": org2["root_skill"]["id"], "graph": {"a": {}}},
+    )
+    assert response.status_code == 403
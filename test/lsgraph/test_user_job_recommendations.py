@@ -17,7 +17,20 @@
 from datetime import datetime
 import pdb
 import pytest
+import uuid
 
+from lsgraph import models
+from lsgraph.api_v1.views.users import (
+    precompute_job_recommendations,
+    refresh_job_recommendations,
+)
+from lsgraph.services.embedding_store import embedding_store_cache, get_embedding_store
+from lsgraph.services.skill import (
+    embed_pending_skills,
+    get_truncated_skills,
+    update_skill_neighbors,
+)
+from .shared import create_group
 from .test_profile import create_profile
 
 
@@ -123,3 +136,257 @@ def test_job_recommendation_type(lsgraph_client, test_data_2org):
         assert i["id"] == j["profile"]["id"]
         assert j["fit"] <= last_fit
         last_fit = j["fit"]
+
+
+def test_job_recommendation_job(lsgraph_client, test_data_2org, eager_celery):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    org_id = org1["id"]
+    profiles = [
+        create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": j["id"], "level_name": "Beginner"}
+                for j in collection1["skills"][-2 - i :]
+            ],
+        )
+        for i in range(3)
+    ]
+    user_id = collection1["users"][1]["id"]
+    url = f"/api/v1/organizations/{org_id}/users/{user_id}/job_recommendations/"
+    query = {"profiles": [i["id"] for i in profiles]}
+    expected = lsgraph_client.post(url, headers=headers, json=query)
+    assert expected.status_code == 200
+    response = lsgraph_client.post(f"{url}jobs/", headers=headers, json=query)
+    assert response.status_code == 202
+    job_id = response.json["id"]
+    response = lsgraph_client.get(f"{url}jobs/{job_id}/", headers=headers)
+    assert response.status_code == 200
+    assert response.json["kind"] == "job_recommendation"
+    assert response.json["status"] == "success"
+    response = lsgraph_client.get(f"{url}jobs/{job_id}/result/", headers=headers)
+    assert response.status_code == 200
+    assert response.json == expected.json
+    # Identical parameters reuse the job, different ones queue a new job
+    response = lsgraph_client.post(f"{url}jobs/", headers=headers, json=query)
+    assert response.json["id"] == job_id
+    response = lsgraph_client.post(
+        f"{url}jobs/", headers=headers, json={"profiles": query["profiles"][:1]}
+    )
+    assert response.status_code == 202
+    assert response.json["id"] != job_id
+    # Jobs are only visible for their user
+    other_id = collection1["users"][0]["id"]
+    response = lsgraph_client.get(
+        f"/api/v1/organizations/{org_id}/users/{other_id}/job_recommendations/"
+        f"jobs/{job_id}/",
+        headers=headers,
+    )
+    assert response.status_code == 404
+
+
+def test_job_recommendation_precomputed(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    org_id = org1["id"]
+    profiles = [
+        create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": j["id"], "level_name": "Beginner"}
+                for j in collection1["skills"][-2 - i :]
+            ],
+        )
+        for i in range(3)
+    ]
+    user = collection1["users"][-1]
+    update_profile(
+        lsgraph_client,
+        test_data_2org[0],
+        user["profile"],
+        [
+            {"skill": i["id"], "level_name": "Beginner"}
+            for i in collection1["skills"][-3:]
+        ],
+    )
+    url = f"/api/v1/organizations/{org_id}/users/{user['id']}/job_recommendations/"
+    query = {"profiles": [i["id"] for i in profiles]}
+    expected = lsgraph_client.post(url, headers=headers, json=query)
+    assert expected.status_code == 200
+    app = lsgraph_client.application
+    with app.app_context():
+        precompute_job_recommendations(org_id)
+        fits = models.JobRecommendationFit.query.filter_by(
+            user_profile_id=user["profile"]
+        ).all()
+        assert set(str(i.profile_id) for i in fits) >= set(query["profiles"])
+        assert all(i.stale_at is None for i in fits)
+    response = lsgraph_client.post(
+        url, headers=headers, json={**query, "max_age": 3600}
+    )
+    assert response.status_code == 200
+    assert response.json == expected.json
+    # Changed skills mark the fits of the profile stale until refreshed
+    update_profile(
+        lsgraph_client,
+        test_data_2org[0],
+        user["profile"],
+        [{"skill": collection1["skills"][0]["id"], "level_name": "Beginner"}],
+    )
+    expected = lsgraph_client.post(url, headers=headers, json=query)
+    with app.app_context():
+        fits = models.JobRecommendationFit.query.filter_by(
+            user_profile_id=user["profile"]
+        ).all()
+        assert all(i.stale_at is not None for i in fits)
+    response = lsgraph_client.post(
+        url, headers=headers, json={**query, "max_age": 3600}
+    )
+    assert response.json == expected.json
+    with app.app_context():
+        refresh_job_recommendations(org_id)
+        fits = models.JobRecommendationFit.query.filter_by(
+            user_profile_id=user["profile"]
+        ).all()
+        assert all(i.stale_at is None for i in fits)
+    response = lsgraph_client.post(
+        url, headers=headers, json={**query, "max_age": 3600}
+    )
+    assert response.json == expected.json
+
+
+@pytest.mark.parametrize("query", [{}, {"limit": 2}, {"min_fit": 50}])
+def test_group_job_recommendations(lsgraph_client, test_data_2org, query):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    headers = {"X-API-Key": access_id, "X-Auth-Token": access_secret}
+    org_id = org1["id"]
+    profiles = [
+        create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": j["id"], "level_name": "Beginner"}
+                for j in collection1["skills"][-2 - i :]
+            ],
+        )
+        for i in range(3)
+    ]
+    query = {**query, "profiles": [i["id"] for i in profiles]}
+    users = collection1["users"]
+    group = create_group(
+        lsgraph_client, test_data_2org[0], members=[{"id": i["id"]} for i in users]
+    )
+    # Smaller chunks than the group to stream more than one
+    config = lsgraph_client.application.config
+    chunk_size = config["JOB_RECOMMENDATION_CHUNK_SIZE"]
+    config["JOB_RECOMMENDATION_CHUNK_SIZE"] = 1
+    try:
+        response = lsgraph_client.post(
+            f"/api/v1/organizations/{org_id}/groups/{group['id']}/job_recommendations/",
+            headers=headers,
+            json=query,
+        )
+    finally:
+        config["JOB_RECOMMENDATION_CHUNK_SIZE"] = chunk_size
+    assert response.status_code == 200
+    results = {i["user"]: i["recommendations"] for i in response.json["users"]}
+    assert set(results) == set(i["id"] for i in users)
+    for user in users:
+        expected = lsgraph_client.post(
+            f"/api/v1/organizations/{org_id}/users/{user['id']}/job_recommendations/",
+            headers=headers,
+            json=query,
+        )
+        assert results[user["id"]] == expected.json["recommendations"]
+    # Groups of other organizations are not found
+    response = lsgraph_client.post(
+        f"/api/v1/organizations/{org2['id']}/groups/{group['id']}/job_recommendations/",
+        headers={"X-API-Key": c2[1], "X-Auth-Token": c2[2]},
+        json=query,
+    )
+    assert response.status_code == 404
+
+
+def test_job_recommendation_embedding_store(lsgraph_client, test_data_2org):
+    (c1, org1, collection1), (c2, org2, collection2) = test_data_2org
+    customer_id, access_id, access_secret = c1
+    org_id = org1["id"]
+    profiles = [
+        create_profile(
+            lsgraph_client,
+            test_data_2org[0],
+            skills=[
+                {"skill": i["id"], "level_name": "Intermediate"}
+                for i in collection1["skills"][i : i + 3]
+            ],
+        )
+        for i in range(3)
+    ]
+    update_profile(
+        lsgraph_client,
+        test_data_2org[0],
+        collection1["users"][0]["profile"],
+        [
+            {"skill": i["id"], "level_name": "Beginner"}
+            for i in collection1["skills"][-3:]
+        ],
+    )
+    user_id = collection1["users"][0]["id"]
+    app = lsgraph_client.application
+    with app.app_context():
+        embed_pending_skills([i["id"] for i in collection1["skills"]])
+
+    def recommend():
+        response = lsgraph_client.post(
+            f"/api/v1/organizations/{org_id}/users/{user_id}/job_recommendations/",
+            headers={"X-API-Key": access_id, "X-Auth-Token": access_secret},
+            json={"profiles": [i["id"] for i in profiles]},
+        )
+        assert response.status_code == 200
+        return {i["profile"]["id"]: i["fit"] for i in response.json["recommendations"]}
+
+    embedding_store_cache.clear()
+    neighbor_fits = recommend()
+    # Lists within the limit are enough
+    assert uuid.UUID(org_id) not in embedding_store_cache.stores
+    # Without neighbor table coverage embeddings come from the store
+    config = app.config
+    threshold = config["SKILL_NEIGHBOR_THRESHOLD"]
+    config["SKILL_NEIGHBOR_THRESHOLD"] = 0.0
+    try:
+        store_fits = recommend()
+    finally:
+        config["SKILL_NEIGHBOR_THRESHOLD"] = threshold
+    with app.app_context():
+        store = get_embedding_store(org_id)
+    skills = collection1["skills"][:5] + collection1["skills"][-3:]
+    assert {uuid.UUID(i["id"]) for i in skills} <= store.index.keys()
+    assert store_fits.keys() == neighbor_fits.keys()
+    for profile_id, fit in neighbor_fits.items():
+        assert store_fits[profile_id] == pytest.approx(fit)
+    # Distances between skills with truncated neighbor lists also come
+    # from the store
+    skill_ids = [uuid.UUID(i["id"]) for i in collection1["skills"]]
+    embedding_store_cache.clear()
+    limit = config["SKILL_NEIGHBOR_LIMIT"]
+    config["SKILL_NEIGHBOR_LIMIT"] = 1
+    try:
+        with app.app_context():
+            update_skill_neighbors(skill_ids)
+            models.db.session.commit()
+            assert get_truncated_skills(skill_ids)
+        truncated_fits = recommend()
+    finally:
+        config["SKILL_NEIGHBOR_LIMIT"] = limit
+        with app.app_context():
+            update_skill_neighbors(skill_ids)
+            models.db.session.commit()
+    assert uuid.UUID(org_id) in embedding_store_cache.stores
+    assert truncated_fits.keys() == neighbor_fits.keys()
+    for profile_id, fit in neighbor_fits.items():
+        assert truncated_fits[profile_id] == pytest.approx(fit)
@@ -32,3 +32,11 @@ def test_validate_pair():
     assert ak.validate_pair(access_id, access_secret)
     ak2 = AccessKey("secret2")
     assert not ak2.validate_pair(access_id, access_secret)
+
+
+def test_validate_malformed_pair():
+    ak = AccessKey("secret")
+    access_id, access_secret = ak.generate_pair()
+    assert not ak.validate_pair(access_id, access_secret[-2:])
+    assert not ak.validate_pair(access_id, "")
+    assert not ak.validate_pair("LSé", access_secret)